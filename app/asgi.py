@@ -2,6 +2,18 @@
 ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The Server-Sent Events streams (customers.views_events) need it: under WSGI
+Django reads an async stream to the end before sending it. Run the app with
+uvicorn (requirements.txt):
+
+    uvicorn app.asgi:application --host 0.0.0.0 --port 8000
+
+With more than one process (``--workers N``) set
+``EVENTS_BACKEND=customers.events.FileBackend`` so every worker sees every
+event. uvicorn does not serve static files: in production they come from the
+web server in front, as with WSGI. ``manage.py runserver`` (WSGI) serves the
+pages but not the streams: they answer 204 and the pages simply do not update
+live. To try the streams in development, run uvicorn with ``--reload``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -24,9 +24,10 @@ urlpatterns = [
     path('customers/', include('customers.urls')),
 ]
 
+# Arquivos de MEDIA_ROOT não são servidos diretamente: o download passa pelas views
+# protegidas de customers/views_media.py, também em DEBUG
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 # Handler global de 403
 handler403 = custom_permission_denied_view
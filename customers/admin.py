@@ -12,6 +12,7 @@ from .models import (
     ComplianceAnalysis,
     StatusControl,
     EvaluationRecord,
+    StatusTransition,
 )
 
 @admin.register(Company)
@@ -42,6 +43,23 @@ class StatusControlAdmin(admin.ModelAdmin):
     search_fields = ("company__full_company_name",)
 
 
+@admin.register(StatusTransition)
+class StatusTransitionAdmin(admin.ModelAdmin):
+    list_display = ("company", "department", "decision", "from_owner", "to_owner", "duration_seconds", "actor", "created_at")
+    list_filter = ("department", "decision", "created_at")
+    search_fields = ("company__full_company_name",)
+
+    # Histórico somente inclusão
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ComplianceAnalysis)
 class ComplianceAnalysisAdmin(admin.ModelAdmin):
     list_display = ("company", "qualified", "risk_level", "performed_by", "created_at")
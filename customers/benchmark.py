@@ -0,0 +1,450 @@
+"""Query-count and latency benchmark for every route in ``customers/urls.py``.
+
+:func:`seed_dataset` builds a synthetic portfolio (companies with every step
+model, contacts, UBOs, shareholders, KYC documents, RDD threads,
+notifications and one user per role). :func:`run_benchmark` then requests
+every route as each role and records status, query count, wall time and
+response size. Each request runs inside a transaction that is rolled back,
+so POST-only routes (decisions, uploads) can be measured without changing
+the dataset. The ``benchmark_views`` management command wraps both and
+writes the results to JSON.
+
+:func:`benchmark_dossier` measures the throughput and memory of the
+streaming dossier ZIP (``benchmark_dossier`` command) on a company with a
+large synthetic set of files.
+"""
+
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import (
+    Company, IndividualContact, BusinessInformation, PriorBusinessRelationship,
+    OwnershipManagementInfo, ManagementAndKeyEmployees, BoardOfDirectors,
+    UltimateBeneficialOwner, MajorShareholder, GovernmentOfficialInteraction,
+    ComplianceInformation, InvestigationsSanctionsInfo, BankingInformation,
+    CertificationInformation, KYCDocument, ComplianceAnalysis, StatusControl,
+    EvaluationRecord, FinalAnalysisAttachment, ReverseDueDiligence,
+    ReverseDueDiligenceMessage, ReverseDueDiligenceAttachment, Notification,
+)
+from .progress import rebuild_progress
+from .search import rebuild_search_index
+from .parties import rebuild_party_index
+from .rdd import refresh_thread_stats
+from .utils import ONBOARDING_STEPS
+
+# Papel -> grupos do usuário sintético
+ROLES = {
+    'internal': ['Equipe'],
+    'client': ['Clientes'],
+    'compliance': ['Equipe', 'Compliance'],
+    'finance': ['Equipe', 'Financeiro'],
+    'trading': ['Equipe', 'Trading'],
+    'suprimentos': ['Equipe', 'Suprimentos'],
+}
+
+# Rotas cujo <pk> não é o de uma Company
+PK_SOURCES = {
+    'rdd_detail': 'rdd',
+    'final_analysis_attachment_approve': 'final_analysis_attachment',
+    'final_analysis_attachment_file': 'final_analysis_attachment',
+    'kyc_document_file': 'kyc_document',
+    'evaluation_record_file': 'evaluation_record',
+    'rdd_attachment_file': 'rdd_attachment',
+    'kyc_document_thumbnail': 'kyc_document',
+    'evaluation_record_thumbnail': 'evaluation_record',
+    'final_analysis_attachment_thumbnail': 'final_analysis_attachment',
+    'notification_open': 'notification',
+}
+
+# Conexões SSE de longa duração: não terminam, ficam fora da medição
+SKIPPED_ROUTES = {'rdd_events', 'notification_events'}
+
+# Rotas cujo <item_pk> aponta para um item da etapa Ownership & Management
+ITEM_SOURCES = {
+    'mke': 'mke',
+    'board': 'board',
+    'ubo': 'ubo',
+    'shareholder': 'shareholder',
+}
+
+# Querystrings extras medidas além da rota sem parâmetros
+QUERY_VARIANTS = {
+    'company_list': ['?q=sao paulo', '?q=12.345.678', '?q=benchmark 00001'],
+    'party_search': ['?q=executivo', '?q=conselheiro 1-0', '?q=P00001'],
+}
+
+KWARG_SOURCES = {
+    'contact_pk': 'contact',
+    'rel_pk': 'prior_relationship',
+    'doc_pk': 'kyc_document',
+}
+
+SAMPLE_PDF = b'%PDF-1.4\n1 0 obj<<>>endobj\ntrailer<<>>\n%%EOF\n'
+
+
+def _sample_file(upload_to):
+    name = f'{upload_to}benchmark-sample.pdf'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(SAMPLE_PDF))
+    return name
+
+
+def seed_dataset(companies=50, messages_per_thread=10, notifications_per_user=30):
+    """Create the synthetic dataset and return the objects used to build URLs."""
+    User = get_user_model()
+    users = {}
+    for role, group_names in ROLES.items():
+        user = User.objects.create_user(f'bench_{role}', password='bench')
+        user.groups.add(*[Group.objects.get_or_create(name=name)[0] for name in group_names])
+        users[role] = user
+
+    client_user = users['client']
+    internal_user = users['internal']
+    kyc_file = _sample_file('kyc_documents/')
+    evaluation_file = _sample_file('evaluations/')
+    final_file = _sample_file('final_analysis/')
+    rdd_file = _sample_file('rdd_attachments/')
+
+    company_objs = []
+    for i in range(companies):
+        national = i % 2 == 0
+        company_objs.append(Company(
+            full_company_name=f'Benchmark Company {i:05d} Ltda',
+            previous_names=f'Old Name {i}',
+            aliases_trade_names=f'Trade {i}',
+            registered_business_address=f'Av. Paulista, {i}, São Paulo',
+            tax_vat_number=f'VAT{i:08d}',
+            client_type='NATIONAL' if national else 'INTERNATIONAL',
+            cnpj=f'{i:02d}.345.678/0001-{i % 100:02d}' if national else None,
+            country_of_incorporation='Brasil' if national else 'Portugal',
+            company_registration_number=f'REG-{i:06d}',
+            next_evaluation_date=date.today() + timedelta(days=(i % 30) - 10),
+            created_by=client_user if i % 5 == 0 else internal_user,
+        ))
+    company_objs = Company.objects.bulk_create(company_objs)
+
+    owners = ['USER', 'COMPLIANCE', 'FINANCE', 'TRADING', 'SUPRIMENTOS', 'NONE']
+    StatusControl.objects.bulk_create([
+        StatusControl(
+            company=c,
+            min_requirements_met=True,
+            is_pending=i % 6 != 5,
+            pending_owner=owners[i % 6],
+            compliance_qualified=i % 3 == 0,
+            treasury_qualified=i % 4 == 0,
+            client_onboarding_finished=i % 6 == 5,
+            last_updated_by=internal_user,
+        )
+        for i, c in enumerate(company_objs)
+    ])
+    BusinessInformation.objects.bulk_create([
+        BusinessInformation(company=c, nature_of_proposed_contract='Compra e venda de óleo cru')
+        for c in company_objs
+    ])
+    PriorBusinessRelationship.objects.bulk_create([
+        PriorBusinessRelationship(business_information=bi, company_name='PRIO Subsidiária')
+        for bi in BusinessInformation.objects.filter(company__in=company_objs)
+    ])
+    OwnershipManagementInfo.objects.bulk_create([OwnershipManagementInfo(company=c) for c in company_objs])
+    oms = list(OwnershipManagementInfo.objects.filter(company__in=company_objs).select_related('company'))
+    mkes, boards, ubos, holders, gois = [], [], [], [], []
+    for om in oms:
+        n = om.company_id
+        for j in range(3):
+            mkes.append(ManagementAndKeyEmployees(
+                ownership_management=om, full_name=f'Executivo {n}-{j}', job_title='Diretor',
+                nationality='Brasileira', passport_number=f'P{n:05d}{j}', country_of_residence='Brasil'))
+            boards.append(BoardOfDirectors(
+                ownership_management=om, full_name=f'Conselheiro {n}-{j}', board_position='Membro',
+                nationality='Portuguesa', passport_number=f'B{n:05d}{j}', country_of_residence='Portugal'))
+        for j in range(2):
+            ubos.append(UltimateBeneficialOwner(
+                ownership_management=om, company_individual='Individual', full_name=f'Beneficiário {n}-{j}',
+                nationality_registered_country='Brasil', country_of_residence='Brasil', percentage_of_ownership=30))
+            holders.append(MajorShareholder(
+                ownership_management=om, company_individual='Company', name_of_individual_company=f'Holding {n}-{j}',
+                nationality_registered_country='Brasil', address_registered_business_address='Rio de Janeiro',
+                type_of_relationship='Acionista', percentage_of_ownership=40))
+        gois.append(GovernmentOfficialInteraction(ownership_management=om))
+    ManagementAndKeyEmployees.objects.bulk_create(mkes)
+    BoardOfDirectors.objects.bulk_create(boards)
+    UltimateBeneficialOwner.objects.bulk_create(ubos)
+    MajorShareholder.objects.bulk_create(holders)
+    GovernmentOfficialInteraction.objects.bulk_create(gois)
+
+    ComplianceInformation.objects.bulk_create([ComplianceInformation(company=c) for c in company_objs])
+    InvestigationsSanctionsInfo.objects.bulk_create([InvestigationsSanctionsInfo(company=c) for c in company_objs])
+    BankingInformation.objects.bulk_create([
+        BankingInformation(company=c, bank_name='Banco do Brasil', account_number_iban=f'{i:010d}')
+        for i, c in enumerate(company_objs)
+    ])
+    CertificationInformation.objects.bulk_create([
+        CertificationInformation(company=c, full_name='Responsável', company_name=c.full_company_name, position='CEO')
+        for c in company_objs
+    ])
+    ComplianceAnalysis.objects.bulk_create([ComplianceAnalysis(company=c) for c in company_objs])
+    IndividualContact.objects.bulk_create([
+        IndividualContact(company=c, first_name=f'Contato{j}', last_name=f'Empresa{i}')
+        for i, c in enumerate(company_objs) for j in range(2)
+    ])
+    KYCDocument.objects.bulk_create([
+        KYCDocument(company=c, document_type=doc_type, file=kyc_file, uploaded_by=client_user)
+        for c in company_objs for doc_type in ('COMMERCIAL_REGISTRATION', 'BANK_CERTIFICATE', 'FINANCIAL_STATEMENTS')
+    ])
+    EvaluationRecord.objects.bulk_create([
+        EvaluationRecord(company=c, evaluation_date=date.today(), file=evaluation_file, created_by=internal_user)
+        for c in company_objs
+    ])
+    FinalAnalysisAttachment.objects.bulk_create([
+        FinalAnalysisAttachment(company=c, file=final_file, uploaded_by=users['trading'])
+        for c in company_objs
+    ])
+
+    threads = ReverseDueDiligence.objects.bulk_create([
+        ReverseDueDiligence(company=c, created_by=client_user, subject=f'RDD {i}', description='Due diligence reversa',
+                            status=('OPEN', 'RESPONDED', 'CLOSED')[i % 3])
+        for i, c in enumerate(company_objs)
+    ])
+    ReverseDueDiligenceMessage.objects.bulk_create([
+        ReverseDueDiligenceMessage(thread=t, author=client_user if j % 2 == 0 else internal_user, body=f'Mensagem {j}')
+        for t in threads for j in range(messages_per_thread)
+    ])
+    ReverseDueDiligenceAttachment.objects.bulk_create([
+        ReverseDueDiligenceAttachment(message=m, file=rdd_file, uploaded_by=m.author)
+        for m in ReverseDueDiligenceMessage.objects.filter(thread__in=threads)[::3]
+    ])
+    # bulk_create não passa por ReverseDueDiligenceMessage.save(): recalcula os contadores
+    refresh_thread_stats([t.pk for t in threads])
+
+    notification_rows = []
+    for role, user in users.items():
+        audience = Notification.Audience.CLIENT if role == 'client' else Notification.Audience.INTERNAL
+        for j in range(notifications_per_user):
+            rdd = threads[j % len(threads)] if threads else None
+            notification_rows.append(Notification(
+                recipient=user, message=f'Notificação {j}', url=rdd.get_absolute_url() if rdd else None,
+                rdd=rdd, audience=audience, is_read=j % 3 == 0))
+    Notification.objects.bulk_create(notification_rows)
+
+    seeded = Company.objects.filter(pk__in=[c.pk for c in company_objs])
+    rebuild_progress(seeded)
+    rebuild_search_index(seeded)
+    rebuild_party_index()
+
+    client_company = next((c for c in company_objs if c.created_by_id == client_user.pk), company_objs[0])
+    om = OwnershipManagementInfo.objects.get(company=client_company)
+    bi = BusinessInformation.objects.get(company=client_company)
+    return {
+        'users': users,
+        'company': client_company,
+        'rdd': ReverseDueDiligence.objects.filter(company=client_company).first(),
+        'final_analysis_attachment': FinalAnalysisAttachment.objects.filter(company=client_company).first(),
+        'contact': IndividualContact.objects.filter(company=client_company).first(),
+        'prior_relationship': bi.prior_relationships.first(),
+        'kyc_document': KYCDocument.objects.filter(company=client_company).first(),
+        'evaluation_record': EvaluationRecord.objects.filter(company=client_company).first(),
+        'rdd_attachment': ReverseDueDiligenceAttachment.objects.filter(message__thread__company=client_company).first(),
+        'mke': om.management_and_key_employees.first(),
+        'board': om.board_of_directors.first(),
+        'ubo': om.ultimate_beneficial_owners.first(),
+        'shareholder': om.major_shareholders.first(),
+        'notification': {role: Notification.objects.filter(recipient=user).first() for role, user in users.items()},
+    }
+
+
+def _pattern_params(pattern):
+    regex = getattr(pattern.pattern, 'regex', None)
+    return list(regex.groupindex) if regex is not None else []
+
+
+def _resolve_param(route, param, data, role):
+    if param == 'pk':
+        source = PK_SOURCES.get(route, 'company')
+        obj = data.get(source)
+        if isinstance(obj, dict):
+            obj = obj.get(role)
+        return getattr(obj, 'pk', None)
+    if param == 'item_pk':
+        for marker, source in ITEM_SOURCES.items():
+            if route.endswith(f'_{marker}'):
+                return getattr(data.get(source), 'pk', None)
+        return None
+    if param == 'decision':
+        return 'approve'
+    if param in KWARG_SOURCES:
+        return getattr(data.get(KWARG_SOURCES[param]), 'pk', None)
+    return None
+
+
+def iter_routes(data, role, urlpatterns=None):
+    """Yield ``(route_name, url)`` for every named customers route."""
+    if urlpatterns is None:
+        from .urls import urlpatterns
+    for pattern in urlpatterns:
+        name = getattr(pattern, 'name', None)
+        if not name or name in SKIPPED_ROUTES:
+            continue
+        params = _pattern_params(pattern)
+        variants = [{}]
+        if 'step_slug' in params:
+            variants = [{'step_slug': slug} for slug in ONBOARDING_STEPS]
+        for variant in variants:
+            kwargs = dict(variant)
+            for param in params:
+                if param in kwargs:
+                    continue
+                value = _resolve_param(name, param, data, role)
+                if value is None:
+                    break
+                kwargs[param] = value
+            else:
+                url = reverse(f'customers:{name}', kwargs=kwargs)
+                yield name, url
+                for query in QUERY_VARIANTS.get(name, []):
+                    yield name, url + query
+
+
+def _measure(client, method, url):
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(client, method)(url)
+            elapsed = (time.perf_counter() - started) * 1000
+        body = b''.join(response) if response.streaming else response.content
+        transaction.set_rollback(True)
+    return response.status_code, len(ctx.captured_queries), elapsed, len(body)
+
+
+def run_benchmark(data, repeat=3, roles=None):
+    """Request every route as every role; return one result dict per request."""
+    results = []
+    for role in roles or ROLES:
+        client = Client(raise_request_exception=False)
+        client.force_login(data['users'][role])
+        for route, url in iter_routes(data, role):
+            method = 'get'
+            status, queries, elapsed, size = _measure(client, method, url)
+            if status == 405:
+                method = 'post'
+                status, queries, elapsed, size = _measure(client, method, url)
+            timings = [elapsed]
+            for _ in range(max(repeat - 1, 0)):
+                timings.append(_measure(client, method, url)[2])
+            results.append({
+                'route': route,
+                'url': url,
+                'role': role,
+                'method': method.upper(),
+                'status': status,
+                'queries': queries,
+                'time_ms': round(statistics.median(timings), 2),
+                'bytes': size,
+            })
+    return results
+
+
+def check_budgets(results, budgets):
+    """Return the results that exceed the query budget of their route.
+
+    ``budgets`` maps a route name (optionally ``route@role``) to the maximum
+    number of queries; the ``'*'`` key applies to every other route.
+    """
+    violations = []
+    for row in results:
+        budget = budgets.get(f"{row['route']}@{row['role']}", budgets.get(row['route'], budgets.get('*')))
+        if budget is not None and row['queries'] > budget:
+            violations.append(dict(row, budget=budget))
+    return violations
+
+
+def compare_results(previous, current):
+    """Pair rows of two runs by (route, url, role, method) and report query/time deltas."""
+    def key(row):
+        return row['route'], row['url'], row['role'], row['method']
+
+    before = {key(row): row for row in previous}
+    deltas = []
+    for row in current:
+        old = before.get(key(row))
+        if old is None:
+            continue
+        deltas.append({
+            'route': row['route'],
+            'url': row['url'],
+            'role': row['role'],
+            'queries_before': old['queries'],
+            'queries_after': row['queries'],
+            'time_ms_before': old['time_ms'],
+            'time_ms_after': row['time_ms'],
+        })
+    return deltas
+
+
+def seed_dossier_files(company, user, total_mb=500, file_mb=25):
+    """Attach ``total_mb`` of random (non-deduplicable) PDFs to the company as KYC documents."""
+    created = 0
+    index = 0
+    while created < total_mb:
+        size_mb = min(file_mb, total_mb - created)
+        with tempfile.TemporaryFile() as fh:
+            fh.write(b'%PDF-1.4\n')
+            for _ in range(size_mb):
+                fh.write(os.urandom(1024 * 1024))
+            fh.seek(0)
+            name = default_storage.save(f'kyc_documents/dossier-benchmark-{index:04d}.pdf', File(fh))
+        KYCDocument.objects.create(company=company, document_type='OTHER', file=name, uploaded_by=user)
+        created += size_mb
+        index += 1
+    return index
+
+
+def benchmark_dossier(company, user, output=None):
+    """Stream the dossier ZIP of ``company`` through the view; return throughput and memory figures.
+
+    With ``output`` the archive is also written to that path (to check it with unzip/zipfile).
+    """
+    client = Client()
+    client.force_login(user)
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_byte = None
+    total = 0
+    largest_chunk = 0
+    response = client.get(reverse('customers:company_dossier', kwargs={'pk': company.pk}))
+    sink = open(output, 'wb') if output else None
+    try:
+        for chunk in response.streaming_content:
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            total += len(chunk)
+            largest_chunk = max(largest_chunk, len(chunk))
+            if sink:
+                sink.write(chunk)
+    finally:
+        if sink:
+            sink.close()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'status': response.status_code,
+        'bytes': total,
+        'seconds': round(elapsed, 3),
+        'mb_per_s': round(total / (1024 * 1024) / elapsed, 1) if elapsed else None,
+        'first_byte_ms': round((first_byte or 0) * 1000, 2),
+        'largest_chunk': largest_chunk,
+        'peak_python_memory_mb': round(peak / (1024 * 1024), 2),
+    }
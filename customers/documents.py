@@ -0,0 +1,248 @@
+"""Background processing of uploaded documents.
+
+When a KYCDocument, EvaluationRecord or FinalAnalysisAttachment gets a new
+file, its name is queued (after the transaction commits) for a small pool
+of worker threads reading from a bounded queue. Each file is processed once
+into a ``FilePreview`` row:
+
+* MIME type sniffed from the first bytes (not the extension);
+* page count and extracted text of PDFs, read with ``pypdf`` (object
+  streams, incremental updates and encrypted files with an empty password
+  included; scans have no text);
+* a first-page PNG thumbnail stored next to the original
+  (``<name>.thumb.png``), rendered by poppler's ``pdftoppm`` for PDFs and by
+  Pillow for images, each only when available.
+
+When the queue is full the file stays ``PENDING`` and ``process_documents``
+picks it up; the same command backfills files uploaded before.
+"""
+
+import io
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from pypdf import PdfReader
+
+from .models import EvaluationRecord, FilePreview, FinalAnalysisAttachment, KYCDocument
+
+try:
+    from PIL import Image
+except ImportError:  # opcional: miniaturas de imagens
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Modelos cujos arquivos são processados ao salvar (signals)
+PREVIEW_MODELS = (KYCDocument, EvaluationRecord, FinalAnalysisAttachment)
+
+SNIFF_LENGTH = 16
+MIME_SIGNATURES = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'PK\x03\x04', 'application/zip'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def sniff_mime(head):
+    """MIME type of a file from its first bytes."""
+    for signature, mime in MIME_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head and b'\x00' not in head:
+        try:
+            head.decode('utf-8')
+            return 'text/plain'
+        except UnicodeDecodeError:
+            pass
+    return 'application/octet-stream'
+
+
+def thumbnail_name(name):
+    return os.path.splitext(name)[0] + '.thumb.png'
+
+
+def pdf_info(path):
+    """``(page_count, text)`` of a PDF file.
+
+    pypdf gets the open file rather than the path (which it would read whole
+    into memory), so objects are read from disk as the pages are visited.
+    """
+    with open(path, 'rb') as fh:
+        reader = PdfReader(fh)
+        if reader.is_encrypted:
+            # PDFs protegidos só contra edição abrem com a senha vazia; os demais falham aqui
+            reader.decrypt('')
+        parts = []
+        for number, page in enumerate(reader.pages, 1):
+            try:
+                parts.append(page.extract_text() or '')
+            except Exception:
+                # Fonte ou conteúdo que o pypdf não decodifica: a página fica sem texto
+                logger.debug("Texto da página %s não extraído", number, exc_info=True)
+        return len(reader.pages), '\n'.join(parts)
+
+
+# --- Miniaturas (dependências opcionais) ---
+def _pdf_thumbnail(path, size):
+    executable = shutil.which(settings.DOCUMENT_PDFTOPPM)
+    if not executable:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, 'thumb')
+        subprocess.run(
+            [executable, '-png', '-f', '1', '-l', '1', '-scale-to', str(size), '-singlefile', path, prefix],
+            check=True, capture_output=True, timeout=60,
+        )
+        with open(prefix + '.png', 'rb') as fh:
+            return fh.read()
+
+
+def _image_thumbnail(path, size):
+    if Image is None:
+        return None
+    with Image.open(path) as image:
+        image.thumbnail((size, size))
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        return buffer.getvalue()
+
+
+def _local_path(name, tmp_dir):
+    """Filesystem path of a stored file (copied to ``tmp_dir`` for non-local storages)."""
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        path = os.path.join(tmp_dir, os.path.basename(name))
+        with default_storage.open(name, 'rb') as src, open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        return path
+
+
+# --- Processamento ---
+def process_file(name, force=False):
+    """Compute (or refresh with ``force``) the preview of a stored file."""
+    preview, _ = FilePreview.objects.get_or_create(name=name)
+    if preview.status == FilePreview.Status.DONE and not force:
+        return preview
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = _local_path(name, tmp)
+            size = os.path.getsize(path)
+            with open(path, 'rb') as fh:
+                head = fh.read(SNIFF_LENGTH)
+            mime = sniff_mime(head)
+            page_count, text, thumbnail = None, '', None
+            if mime == 'application/pdf' and size <= settings.DOCUMENT_PROCESSING_MAX_BYTES:
+                page_count, text = pdf_info(path)
+                thumbnail = _pdf_thumbnail(path, settings.DOCUMENT_THUMBNAIL_SIZE)
+            elif mime.startswith('image/'):
+                page_count = 1
+                thumbnail = _image_thumbnail(path, settings.DOCUMENT_THUMBNAIL_SIZE)
+    except Exception as exc:
+        logger.exception("Falha ao processar o arquivo %s", name)
+        preview.status = FilePreview.Status.FAILED
+        preview.error = str(exc)[:255]
+        preview.processed_at = timezone.now()
+        preview.save(update_fields=['status', 'error', 'processed_at'])
+        return preview
+
+    if preview.thumbnail:
+        preview.thumbnail.delete(save=False)
+    if thumbnail:
+        preview.thumbnail.name = default_storage.save(thumbnail_name(name), ContentFile(thumbnail))
+    preview.status = FilePreview.Status.DONE
+    preview.mime_type = mime
+    preview.size = size
+    preview.page_count = page_count
+    preview.text = text[:settings.DOCUMENT_TEXT_MAX_CHARS]
+    preview.error = ''
+    preview.processed_at = timezone.now()
+    preview.save()
+    return preview
+
+
+def discard_preview(name):
+    """Remove the preview (and thumbnail) of a file that no longer exists."""
+    preview = FilePreview.objects.filter(name=name).first()
+    if preview is None:
+        return
+    if preview.thumbnail:
+        preview.thumbnail.delete(save=False)
+    preview.delete()
+
+
+def _worker():
+    while True:
+        name = _queue.get()
+        try:
+            process_file(name)
+        except Exception:
+            logger.exception("Falha ao processar o arquivo %s em segundo plano", name)
+        finally:
+            # A thread do pool não passa pelo ciclo de requisição: fecha a conexão aberta
+            connection.close()
+            _queue.task_done()
+
+
+def _get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = queue.Queue(maxsize=settings.DOCUMENT_PROCESSING_QUEUE_SIZE)
+            for index in range(settings.DOCUMENT_PROCESSING_WORKERS):
+                threading.Thread(target=_worker, name=f'documents-{index}', daemon=True).start()
+    return _queue
+
+
+def _enqueue(name):
+    if not settings.DOCUMENT_PROCESSING_ASYNC:
+        process_file(name)
+        return
+    try:
+        _get_queue().put_nowait(name)
+    except queue.Full:
+        logger.warning("Fila de processamento cheia; %s fica pendente (process_documents)", name)
+
+
+def schedule(name):
+    """Mark a file as pending and process it once the transaction commits."""
+    if not name:
+        return
+    FilePreview.objects.update_or_create(
+        name=name, defaults={'status': FilePreview.Status.PENDING, 'error': ''},
+    )
+    transaction.on_commit(lambda: _enqueue(name))
+
+
+def attach_previews(objects):
+    """Set ``obj.preview`` (or ``None``) on upload rows with one query."""
+    objects = list(objects)
+    names = {obj.file.name for obj in objects if obj.file}
+    previews = {p.name: p for p in FilePreview.objects.filter(name__in=names)} if names else {}
+    for obj in objects:
+        obj.preview = previews.get(obj.file.name) if obj.file else None
+    return objects
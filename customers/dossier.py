@@ -0,0 +1,194 @@
+"""Streaming ZIP of a company's complete KYC dossier.
+
+The archive holds ``manifest.json`` and ``manifest.csv`` (every onboarding
+step model of the company, inlines included, plus the list of files) and
+then every attached file: KYC documents, evaluation records, final analysis
+attachments and RDD attachments. It is produced on the fly: ``ZipFile``
+writes into a buffer that is drained after each chunk, so memory stays
+constant and nothing is written to disk. Files are stored uncompressed
+(PDFs and images are already compressed) with data descriptors, as the
+output is not seekable.
+"""
+
+import csv
+import io
+import json
+import os
+import zipfile
+from typing import NamedTuple
+
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import (
+    Company, EvaluationRecord, FinalAnalysisAttachment, KYCDocument, PriorBusinessRelationship,
+    ReverseDueDiligenceAttachment, StoredFile,
+)
+from .utils import FORM_MODEL_MAPPING
+
+CHUNK_SIZE = 256 * 1024
+
+# Arquivos do dossiê: (pasta no ZIP, queryset, filtro até a empresa)
+FILE_SOURCES = (
+    ('kyc_documents', KYCDocument.objects.all(), 'company'),
+    ('evaluations', EvaluationRecord.objects.all(), 'company'),
+    ('final_analysis', FinalAnalysisAttachment.objects.all(), 'company'),
+    ('rdd_attachments', ReverseDueDiligenceAttachment.objects.all(), 'message__thread__company'),
+)
+
+
+class DossierFile(NamedTuple):
+    arcname: str
+    model: str
+    pk: int
+    name: str
+    size: int
+    sha256: str
+    storage: object
+
+
+def _company_lookup(model):
+    """ORM path from ``model`` to its Company (directly or through a parent step model)."""
+    if model is Company:
+        return 'pk'
+    relations = [f for f in model._meta.fields if f.is_relation and (f.many_to_one or f.one_to_one)]
+    for field in relations:
+        if field.related_model is Company:
+            return field.name
+    for field in relations:
+        if any(f.is_relation and f.related_model is Company for f in field.related_model._meta.fields):
+            return f'{field.name}__company'
+    return None
+
+
+def step_models():
+    """``(section, model)`` for every step model and inline, in onboarding order."""
+    sections = []
+    for slug, mapping in FORM_MODEL_MAPPING.items():
+        sections.append((slug, mapping['model']))
+        for inline in mapping.get('inlines', ()):
+            sections.append((slug, inline['model']))
+        if mapping['model'].__name__ == 'BusinessInformation':
+            sections.append((slug, PriorBusinessRelationship))
+    return sections
+
+
+def collect_records(company):
+    """``[(section, serialized_object)]`` of all step data of the company."""
+    records = []
+    for section, model in step_models():
+        lookup = _company_lookup(model)
+        if lookup is None:
+            continue
+        queryset = model.objects.filter(**{lookup: company.pk}).order_by('pk')
+        records.extend((section, obj) for obj in serializers.serialize('python', queryset))
+    return records
+
+
+def collect_files(company):
+    files = []
+    for folder, queryset, lookup in FILE_SOURCES:
+        for obj in queryset.filter(**{lookup: company.pk}).exclude(file='').order_by('pk'):
+            storage = obj.file.storage
+            try:
+                size = storage.size(obj.file.name)
+            except OSError:
+                size = None
+            files.append(DossierFile(
+                arcname=f'{folder}/{obj.pk}-{os.path.basename(obj.file.name)}',
+                model=obj._meta.label,
+                pk=obj.pk,
+                name=obj.file.name,
+                size=size,
+                sha256='',
+                storage=storage,
+            ))
+    hashes = dict(StoredFile.objects.filter(name__in=[f.name for f in files]).values_list('name', 'blob__sha256'))
+    return [f._replace(sha256=hashes.get(f.name, '')) for f in files]
+
+
+def build_manifest(company, records, files):
+    """``(json_bytes, csv_bytes)`` describing the dossier."""
+    manifest = {
+        'company': {'id': company.pk, 'name': company.full_company_name},
+        'generated_at': timezone.now(),
+        'records': [{'section': section, **obj} for section, obj in records],
+        'files': [
+            {'path': f.arcname, 'model': f.model, 'pk': f.pk, 'name': f.name, 'size': f.size,
+             'sha256': f.sha256, 'missing': f.size is None}
+            for f in files
+        ],
+    }
+    json_bytes = json.dumps(manifest, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2).encode('utf-8')
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['section', 'model', 'pk', 'field', 'value'])
+    for section, obj in records:
+        for field, value in obj['fields'].items():
+            writer.writerow([section, obj['model'], obj['pk'], field, json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False) if isinstance(value, (list, dict)) else value])
+    for f in files:
+        writer.writerow(['files', f.model, f.pk, f.arcname, f.name])
+    return json_bytes, out.getvalue().encode('utf-8-sig')
+
+
+class _ZipStream:
+    """Write-only, non-seekable file object the ZipFile writes into; drained by the generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry(arcname, date_time):
+    info = zipfile.ZipInfo(arcname, date_time)
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def iter_dossier(company):
+    """Yield the bytes of the dossier ZIP."""
+    records = collect_records(company)
+    files = collect_files(company)
+    manifest_json, manifest_csv = build_manifest(company, records, files)
+    now = timezone.localtime().timetuple()[:6]
+
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        archive.writestr(_entry('manifest.json', now), manifest_json, compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr(_entry('manifest.csv', now), manifest_csv, compress_type=zipfile.ZIP_DEFLATED)
+        yield stream.drain()
+        for f in files:
+            if f.size is None:
+                continue
+            with f.storage.open(f.name, 'rb') as src, \
+                    archive.open(_entry(f.arcname, now), 'w', force_zip64=f.size >= zipfile.ZIP64_LIMIT) as dest:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = stream.drain()
+                    if data:
+                        yield data
+            # Descritor de dados do arquivo
+            yield stream.drain()
+    # Diretório central
+    yield stream.drain()
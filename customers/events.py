@@ -0,0 +1,208 @@
+"""In-process publish/subscribe for the Server-Sent Events endpoints.
+
+Events are published to channels (``rdd:<pk>`` for a Reverse Due Diligence
+thread, ``user:<pk>`` for a user's notification inbox) after the
+transaction that created them commits. Each open SSE stream subscribes to
+its channels with an ``asyncio.Queue``; publishers run in ordinary (sync)
+threads and hand events to the stream's event loop, so no stream ever
+queries the database while it waits.
+
+The backend is chosen by ``EVENTS_BACKEND``:
+
+* :class:`LocalBackend` (default) delivers within the process: enough for a
+  single ASGI worker;
+* :class:`FileBackend` appends each event as one JSON line to
+  ``EVENTS_FILE``. Every process runs one tailing thread that reads new
+  lines every ``EVENTS_POLL_INTERVAL`` seconds and fans them out to its own
+  subscribers, so several workers (on the same host or a shared volume)
+  see every event at the cost of one poll per worker, not per client.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def rdd_channel(thread_id):
+    return f'rdd:{thread_id}'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """Events of some channels, received on the event loop that created it."""
+
+    def __init__(self, backend, channels):
+        self.backend = backend
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=int(getattr(settings, 'EVENTS_QUEUE_SIZE', 100)))
+
+    def _put(self, message):
+        # Cliente lento: descarta o evento em vez de acumular memória
+        if self.queue.full():
+            logger.warning("Fila SSE cheia; evento descartado (%s)", message['event'])
+            return
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class LocalBackend:
+    """Delivers events to the subscribers of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def dispatch(self, message):
+        with self._lock:
+            targets = {s for channel in message['channels'] for s in self._subscribers.get(channel, ())}
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, message)
+            except RuntimeError:
+                # Loop encerrado sem fechar a assinatura
+                self.unsubscribe(subscription)
+
+    def publish(self, message):
+        self.dispatch(message)
+
+
+class FileBackend(LocalBackend):
+    """Shares events between processes through an append-only JSON-lines file."""
+
+    def __init__(self):
+        super().__init__()
+        self.path = str(settings.EVENTS_FILE)
+        self.poll_interval = float(getattr(settings, 'EVENTS_POLL_INTERVAL', 0.5))
+        self.max_bytes = int(getattr(settings, 'EVENTS_FILE_MAX_BYTES', 10 * 1024 * 1024))
+        self._tail_thread = None
+
+    def publish(self, message):
+        line = (json.dumps(message, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode('utf-8')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Uma única write() com O_APPEND: linhas de processos diferentes não se misturam
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.max_bytes:
+            # Quem já está lendo termina o arquivo antigo pelo descritor aberto
+            try:
+                os.replace(self.path, self.path + '.1')
+            except FileNotFoundError:
+                pass
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        with self._lock:
+            if self._tail_thread is None:
+                # Posição lida aqui, não na thread: o que for publicado depois desta assinatura é entregue
+                self._tail_thread = threading.Thread(
+                    target=self._tail, args=(self._open(at_end=True),), name='events-tail', daemon=True,
+                )
+                self._tail_thread.start()
+        return subscription
+
+    def _open(self, at_end):
+        try:
+            fh = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+        if at_end:
+            fh.seek(0, os.SEEK_END)
+        return fh
+
+    def _tail(self, fh):
+        buffer = b''
+        while True:
+            try:
+                if fh is None:
+                    fh = self._open(at_end=False)
+                if fh is not None:
+                    data = fh.read()
+                    if data:
+                        buffer += data
+                        *lines, buffer = buffer.split(b'\n')
+                        for line in lines:
+                            if line:
+                                self.dispatch(json.loads(line))
+                    else:
+                        # Arquivo rotacionado: passa para o novo, desde o início
+                        try:
+                            rotated = os.stat(self.path).st_ino != os.fstat(fh.fileno()).st_ino
+                        except FileNotFoundError:
+                            rotated = False
+                        if rotated:
+                            fh.close()
+                            fh, buffer = self._open(at_end=False), b''
+            except Exception:
+                logger.exception("Falha ao ler eventos de %s", self.path)
+            time.sleep(self.poll_interval)
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(getattr(settings, 'EVENTS_BACKEND', 'customers.events.LocalBackend'))()
+    return _backend
+
+
+def publish(channels, event, data):
+    """Publish ``event`` with ``data`` to ``channels`` once the current transaction commits."""
+    message = {'channels': list(channels), 'event': event, 'data': data}
+    if not message['channels']:
+        return
+
+    def send():
+        try:
+            get_backend().publish(message)
+        except Exception:
+            logger.exception("Falha ao publicar evento %s", event)
+
+    transaction.on_commit(send)
+
+
+def format_sse(message):
+    data = json.dumps(message['data'], cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"event: {message['event']}\ndata: {data}\n\n"
@@ -27,6 +27,7 @@ from .models import (
     ReverseDueDiligenceAttachment,
     PriorBusinessRelationship,
 )
+from .permissions import has_group
 from django.forms.widgets import CheckboxSelectMultiple # Para campos com múltiplas escolhas, se necessário
 
 # --- Formulários para a seção de "General Information" (Company e IndividualContact) ---
@@ -52,7 +53,7 @@ class CompanyForm(forms.ModelForm):
         is_staff_member = False
         try:
             if self.user is not None:
-                is_staff_member = bool(self.user.groups.filter(name='Equipe').exists())
+                is_staff_member = bool(has_group(self.user, 'Equipe'))
         except Exception:
             is_staff_member = False
         if self.user is not None and not is_staff_member:
@@ -119,7 +120,7 @@ class CompanyForm(forms.ModelForm):
         cleaned = super().clean()
         # Protege campos de avaliação contra alteração por não-Equipe
         evaluation_fields = ['evaluation_periodicity', 'last_evaluation_date', 'next_evaluation_date']
-        is_staff_member = bool(getattr(self, 'user', None) and self.user.groups.filter(name='Equipe').exists()) if getattr(self, 'user', None) else False
+        is_staff_member = bool(getattr(self, 'user', None) and has_group(self.user, 'Equipe')) if getattr(self, 'user', None) else False
         if not is_staff_member and self.instance and self.instance.pk:
             for fname in evaluation_fields:
                 if fname in cleaned:
@@ -530,13 +531,21 @@ class CertificationInformationForm(forms.ModelForm):
 
 
 # --- Reverse Due Diligence (RDD) ---
+def check_upload_size(f):
+    """Same limit as the chunked upload API (``settings.UPLOAD_MAX_SIZE``)."""
+    if f and getattr(f, 'size', None) and f.size > settings.UPLOAD_MAX_SIZE:
+        raise forms.ValidationError(
+            f'Arquivo muito grande. Tamanho máximo permitido: {settings.UPLOAD_MAX_SIZE // (1024 * 1024)}MB.'
+        )
+
+
 class ReverseDueDiligenceCreateForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         qs = Company.objects.all()
         try:
-            if self.user and not self.user.groups.filter(name='Equipe').exists():
+            if self.user and not has_group(self.user, 'Equipe'):
                 qs = qs.filter(created_by=self.user)
         except Exception:
             qs = Company.objects.none()
@@ -556,6 +565,11 @@ class ReverseDueDiligenceCreateForm(forms.ModelForm):
             'description': 'Descrição do processo de Due Diligence Reversa',
         }
 
+    def clean_attachment(self):
+        attachment = self.cleaned_data.get('attachment')
+        check_upload_size(attachment)
+        return attachment
+
 
 class ReverseDueDiligenceMessageForm(forms.ModelForm):
     attachment = forms.FileField(required=False, label='Anexo (opcional)')
@@ -569,6 +583,11 @@ class ReverseDueDiligenceMessageForm(forms.ModelForm):
             'body': 'Mensagem',
         }
 
+    def clean_attachment(self):
+        attachment = self.cleaned_data.get('attachment')
+        check_upload_size(attachment)
+        return attachment
+
 
 # --- Formulário para a seção de "To Add Docs" ---
 # Usamos FormSet para múltiplos documentos
@@ -593,12 +612,7 @@ class KYCDocumentForm(forms.ModelForm):
         ext = os.path.splitext(f.name)[1].lower()
         if ext not in allowed_exts:
             raise forms.ValidationError('Tipo de arquivo não suportado. Envie PDF ou imagem (JPG/PNG).')
-        try:
-            max_size = int(os.getenv('MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
-        except Exception:
-            max_size = 10 * 1024 * 1024
-        if getattr(f, 'size', None) and f.size > max_size:
-            raise forms.ValidationError('Arquivo muito grande. Tamanho máximo permitido: 10MB.')
+        check_upload_size(f)
         return f
 
 # Formulário para a seção de "Compliance Analysis"
@@ -0,0 +1,66 @@
+"""Dashboard KPI counters resolved in a single aggregate query.
+
+Every counter shown on the dashboard is a conditional ``Count`` over the
+companies visible to the user joined to their ``StatusControl``. The result
+can optionally be cached for a few seconds per user scope (internal users
+share one entry, each client has its own) through the
+``DASHBOARD_KPI_CACHE_TTL`` setting; ``0`` (default) disables the cache.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q
+
+from .models import Company
+
+CACHE_KEY_PREFIX = 'customers:dashboard_kpis'
+
+
+def _cache_ttl():
+    return int(getattr(settings, 'DASHBOARD_KPI_CACHE_TTL', 0) or 0)
+
+
+def cache_key(user, is_internal):
+    """Cache key for the KPI scope of the given user."""
+    if is_internal:
+        return f'{CACHE_KEY_PREFIX}:internal'
+    return f'{CACHE_KEY_PREFIX}:user:{user.pk}'
+
+
+def company_scope(user, is_internal):
+    """Companies visible on the dashboard for the user."""
+    if is_internal:
+        return Company.objects.all()
+    return Company.objects.filter(created_by=user)
+
+
+def compute_kpis(queryset, is_internal):
+    """Return every dashboard counter for the queryset with one ``aggregate()``."""
+    progress_field = 'onboarding_progress_internal' if is_internal else 'onboarding_progress_client'
+    kpis = queryset.order_by().aggregate(
+        total_companies=Count('pk'),
+        completed_count=Count('pk', filter=Q(status_control__client_onboarding_finished=True)),
+        pending_flag_count=Count('pk', filter=Q(status_control__is_pending=True)),
+        trading_pending=Count('pk', filter=Q(status_control__trading_qualified=False)),
+        compliance_pending=Count('pk', filter=Q(status_control__compliance_qualified=False)),
+        treasury_pending=Count('pk', filter=Q(status_control__treasury_qualified=False)),
+        # Suprimentos: pendências ativas atribuídas a SUPRIMENTOS
+        suprimentos_pending=Count('pk', filter=Q(status_control__is_pending=True, status_control__pending_owner='SUPRIMENTOS')),
+        avg_progress=Avg(progress_field),
+    )
+    kpis['avg_progress'] = round(kpis['avg_progress'] or 0)
+    return kpis
+
+
+def dashboard_kpis(user, is_internal):
+    """KPI counters for the user's scope, served from the cache when enabled."""
+    ttl = _cache_ttl()
+    key = cache_key(user, is_internal)
+    if ttl:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    kpis = compute_kpis(company_scope(user, is_internal), is_internal)
+    if ttl:
+        cache.set(key, kpis, ttl)
+    return kpis
@@ -0,0 +1,55 @@
+import shutil
+import tempfile
+import zipfile
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from customers.benchmark import benchmark_dossier, seed_dossier_files
+from customers.models import Company
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a vazão (MB/s), o tempo até o primeiro byte e a memória do ZIP do dossiê gerado sob demanda, "
+        "usando um banco de teste descartável e uma empresa com arquivos sintéticos (padrão: 500 MB)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=500, help='Tamanho total dos arquivos da empresa.')
+        parser.add_argument('--file-mb', type=int, default=25, help='Tamanho de cada arquivo.')
+        parser.add_argument('--verify', action='store_true', help='Grava o ZIP em disco e confere os CRCs.')
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp(prefix='benchmark-dossier-')
+        old_name = connection.settings_dict['NAME']
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(MEDIA_ROOT=media_root, DOCUMENT_PROCESSING_ASYNC=False, DOCUMENT_PROCESSING_MAX_BYTES=0):
+                user = get_user_model().objects.create_user('dossier-benchmark')
+                user.groups.add(Group.objects.get_or_create(name='Compliance')[0])
+                company = Company.objects.create(full_company_name='Dossier Benchmark', created_by=user)
+                self.stdout.write(f"Gerando {options['size_mb']} MB de arquivos...")
+                files = seed_dossier_files(company, user, options['size_mb'], options['file_mb'])
+                output = f'{media_root}/dossier.zip' if options['verify'] else None
+                result = benchmark_dossier(company, user, output=output)
+                if output:
+                    with zipfile.ZipFile(output) as archive:
+                        bad = archive.testzip()
+                        entries = len(archive.namelist())
+                    result['verified'] = bad is None
+                    self.stdout.write(f"ZIP com {entries} entrada(s); {'CRC ok' if bad is None else f'CRC inválido em {bad}'}.")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        self.stdout.write(
+            f"{files} arquivo(s), {result['bytes'] / (1024 * 1024):.1f} MB em {result['seconds']}s "
+            f"({result['mb_per_s']} MB/s); primeiro byte em {result['first_byte_ms']}ms; "
+            f"maior bloco {result['largest_chunk'] // 1024} KB; pico de memória Python {result['peak_python_memory_mb']} MB."
+        )
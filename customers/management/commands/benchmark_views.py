@@ -0,0 +1,100 @@
+import json
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from customers.benchmark import ROLES, seed_dataset, run_benchmark, check_budgets, compare_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede número de queries, tempo e tamanho da resposta de todas as rotas de customers "
+        "para cada perfil de usuário, usando um banco de teste descartável com dados sintéticos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=50, help='Quantidade de empresas sintéticas.')
+        parser.add_argument('--messages', type=int, default=10, help='Mensagens por thread de RDD.')
+        parser.add_argument('--repeat', type=int, default=3, help='Repetições por rota (usa a mediana do tempo).')
+        parser.add_argument('--role', action='append', dest='roles', choices=list(ROLES),
+                            help='Limita a perfil(is) específico(s) (pode repetir).')
+        parser.add_argument('--output', help='Grava os resultados em JSON.')
+        parser.add_argument('--budgets',
+                            help='JSON {"rota" | "rota@perfil" | "*": max_queries}; falha se algum for excedido.')
+        parser.add_argument('--compare', help='JSON de uma execução anterior para exibir as diferenças.')
+
+    def handle(self, *args, **options):
+        budgets = self._load_json(options['budgets']) if options['budgets'] else None
+        previous = self._load_json(options['compare']) if options['compare'] else None
+
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        old_name = connection.settings_dict['NAME']
+        setup_test_environment()
+        # create_test_db troca o NAME antes da primeira conexão; o banco real só seria aberto por uma
+        # thread de fundo (miniaturas, notificações) que terminasse depois de o NAME ser restaurado
+        # e criaria um db.sqlite3 vazio: tudo roda na thread do comando, dentro do banco descartável
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(MEDIA_ROOT=media_root, DOCUMENT_PROCESSING_ASYNC=False, NOTIFICATIONS_ASYNC=False):
+                data = seed_dataset(options['companies'], messages_per_thread=options['messages'])
+                results = run_benchmark(data, repeat=options['repeat'], roles=options['roles'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        for row in results:
+            self.stdout.write(
+                f"{row['route']:<36} {row['role']:<12} {row['method']:<4} {row['status']} "
+                f"{row['queries']:>4}q {row['time_ms']:>9.2f}ms {row['bytes']:>8}B"
+            )
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'created_at': datetime.now().isoformat(timespec='seconds'),
+                    'companies': options['companies'],
+                    'messages': options['messages'],
+                    'repeat': options['repeat'],
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados gravados em {options['output']}.")
+
+        if previous is not None:
+            for delta in compare_results(previous.get('results', []), results):
+                if delta['queries_before'] == delta['queries_after']:
+                    continue
+                self.stdout.write(
+                    f"{delta['route']:<36} {delta['role']:<12} queries "
+                    f"{delta['queries_before']} -> {delta['queries_after']} "
+                    f"({delta['time_ms_before']:.2f}ms -> {delta['time_ms_after']:.2f}ms)"
+                )
+
+        errors = [row for row in results if row['status'] >= 500]
+        for row in errors:
+            self.stderr.write(f"Erro {row['status']} em {row['url']} ({row['role']}).")
+
+        if budgets is not None:
+            violations = check_budgets(results, budgets)
+            for row in violations:
+                self.stderr.write(
+                    f"{row['route']} ({row['role']}): {row['queries']} queries, orçamento {row['budget']}."
+                )
+            if violations:
+                raise CommandError(f"{len(violations)} rota(s) acima do orçamento de queries.")
+
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} requisição(ões) medida(s)."))
+
+    def _load_json(self, path):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Não foi possível ler {path}: {exc}")
@@ -0,0 +1,31 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.storage import UPLOAD_MODELS, ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os arquivos enviados antes do armazenamento por conteúdo (SHA-256) para o repositório "
+        "de blobs, unificando cópias idênticas. Pode ser executado mais de uma vez."
+    )
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('O storage padrão não é o ContentAddressedStorage (MEDIA_CONTENT_ADDRESSED=0).')
+
+        names = set()
+        for model in UPLOAD_MODELS:
+            names.update(model.objects.exclude(file='').values_list('file', flat=True).distinct())
+
+        adopted = freed = 0
+        for name in sorted(names):
+            result = default_storage.adopt(name)
+            if result is None:
+                continue
+            adopted += 1
+            freed += result
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{adopted} arquivo(s) incorporado(s) de {len(names)}; {freed / (1024 * 1024):.1f} MB liberados."
+        ))
@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from customers.models import Company
+from customers.ownership import compute_portfolio
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula a participação efetiva (cadeias de acionistas entre empresas do portal) de toda a carteira "
+        "em uma passada, atualiza o cache e lista ciclos e somas acima de 100%."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Lista também as empresas sem inconsistências.')
+        parser.add_argument('--output', help='Grava o relatório completo em JSON.')
+
+    def handle(self, *args, **options):
+        reports = compute_portfolio()
+        names = dict(Company.objects.values_list('pk', 'full_company_name'))
+        flagged = [r for r in reports.values() if r.has_issues]
+
+        for report in reports.values() if options['all'] else flagged:
+            issues = []
+            if report.cycles:
+                issues.append('ciclo ' + ' / '.join(' -> '.join(str(pk) for pk in cycle) for cycle in report.cycles))
+            if report.direct_over_100:
+                issues.append(f'acionistas {report.direct_total}%')
+            if report.ubo_over_100:
+                issues.append(f'UBOs {report.ubo_total}%')
+            if report.effective_over_100:
+                issues.append(f'efetiva {report.effective_total}%')
+            self.stdout.write(f"{report.company_id:>6} {names.get(report.company_id, '')[:50]:<50} {'; '.join(issues) or 'ok'}")
+
+        if options['output']:
+            data = [
+                {
+                    'company_id': r.company_id,
+                    'direct_total': str(r.direct_total),
+                    'ubo_total': str(r.ubo_total),
+                    'effective_total': str(r.effective_total),
+                    'cycles': r.cycles,
+                    'effective_owners': [
+                        {'name': o.name, 'company_id': o.company_id, 'percentage': str(o.percentage)}
+                        for o in r.effective_owners
+                    ],
+                }
+                for r in reports.values()
+            ]
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(data, fh, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Relatório gravado em {options['output']}.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(reports)} empresa(s) calculada(s), {len(flagged)} com inconsistência(s)."
+        ))
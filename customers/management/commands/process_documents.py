@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from customers.documents import PREVIEW_MODELS, process_file
+from customers.models import FilePreview
+
+
+class Command(BaseCommand):
+    help = (
+        "Processa (miniatura, páginas, MIME e texto) os documentos pendentes e os enviados antes do "
+        "processamento em segundo plano. Também recupera os que ficaram fora da fila cheia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help='Reprocessa também os que falharam.')
+        parser.add_argument('--force', action='store_true', help='Reprocessa todos os arquivos.')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in PREVIEW_MODELS:
+            names.update(model.objects.exclude(file='').values_list('file', flat=True).distinct())
+        if not options['force']:
+            statuses = [FilePreview.Status.DONE] if options['retry_failed'] else [FilePreview.Status.DONE, FilePreview.Status.FAILED]
+            names -= set(FilePreview.objects.filter(name__in=names, status__in=statuses).values_list('name', flat=True))
+
+        failed = 0
+        for name in sorted(names):
+            preview = process_file(name, force=options['force'])
+            if preview.status == FilePreview.Status.FAILED:
+                failed += 1
+                self.stderr.write(f"{name}: {preview.error}")
+        self.stdout.write(self.style.SUCCESS(f"{len(names)} arquivo(s) processado(s), {failed} com falha."))
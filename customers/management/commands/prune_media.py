@@ -0,0 +1,27 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.storage import ContentAddressedStorage, sweep_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove blobs, links e arquivos temporários do armazenamento por conteúdo que ficaram sem "
+        "registro no banco (ex.: upload cuja transação foi desfeita). Pensado para rodar periodicamente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=1,
+                            help='Só remove arquivos mais antigos que isso (padrão: 1 hora).')
+        parser.add_argument('--dry-run', action='store_true', help='Só conta, sem remover.')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('O storage padrão não é o ContentAddressedStorage (MEDIA_CONTENT_ADDRESSED=0).')
+        blobs, links, spool = sweep_orphans(
+            default_storage, grace_seconds=options['grace_hours'] * 3600, dry_run=options['dry_run'],
+        )
+        verb = 'seriam removidos' if options['dry_run'] else 'removidos'
+        self.stdout.write(self.style.SUCCESS(
+            f"{blobs} blob(s), {links} link(s) e {spool} temporário(s) órfãos {verb}."
+        ))
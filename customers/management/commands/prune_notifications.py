@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from customers.notifications import archive_read_notifications, collapse_duplicate_unread
+
+
+class Command(BaseCommand):
+    help = (
+        "Arquiva notificações lidas mais antigas que N dias e agrupa notificações "
+        "não lidas duplicadas. Pensado para rodar periodicamente (ex.: cron diário)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+                            help='Idade mínima (dias) das notificações lidas a arquivar.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--jsonl', dest='jsonl_path',
+                            help='Grava o arquivo em um JSONL compactado (.jsonl.gz) em vez da tabela de arquivo.')
+        parser.add_argument('--skip-archive', action='store_true', help='Não arquiva notificações lidas.')
+        parser.add_argument('--skip-compact', action='store_true', help='Não agrupa notificações duplicadas.')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas informa quantas linhas seriam afetadas.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        prefix = '[dry-run] ' if dry_run else ''
+
+        if not options['skip_archive']:
+            cutoff = timezone.now() - timedelta(days=options['days'])
+            archived = archive_read_notifications(
+                cutoff, batch_size=batch_size, jsonl_path=options['jsonl_path'], dry_run=dry_run,
+            )
+            self.stdout.write(f"{prefix}{archived} notificação(ões) lida(s) arquivada(s).")
+
+        if not options['skip_compact']:
+            removed = collapse_duplicate_unread(batch_size=batch_size, dry_run=dry_run)
+            self.stdout.write(f"{prefix}{removed} notificação(ões) duplicada(s) agrupada(s).")
+
+        self.stdout.write(self.style.SUCCESS("Concluído."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from customers.uploads import prune_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove uploads em blocos vencidos (CHUNKED_UPLOAD_EXPIRY_HOURS) e seus arquivos de staging. "
+        "Pensado para rodar periodicamente (ex.: cron diário)."
+    )
+
+    def handle(self, *args, **options):
+        count = prune_expired()
+        self.stdout.write(self.style.SUCCESS(f"{count} upload(s) vencido(s) removido(s)."))
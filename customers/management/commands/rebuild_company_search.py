@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from customers.models import Company
+from customers.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o índice de busca de empresas (CompanySearchTerm)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, action='append', dest='companies',
+                            help='Limita a empresa(s) específica(s) (pode repetir).')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        qs = Company.objects.all()
+        if options['companies']:
+            qs = qs.filter(pk__in=options['companies'])
+        indexed = rebuild_search_index(qs, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{indexed} empresa(s) indexada(s)."))
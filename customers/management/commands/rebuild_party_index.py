@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from customers.parties import rebuild_party_index
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o índice de partes relacionadas (contatos, UBOs, conselho, diretoria, acionistas, relacionamentos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        indexed = rebuild_party_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{indexed} parte(s) indexada(s)."))
@@ -0,0 +1,48 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.models import Company
+from customers.screening import screen_company, screen_portfolio
+
+
+class Command(BaseCommand):
+    help = (
+        "Tria empresas, UBOs, conselheiros e acionistas contra a lista local de sanções. "
+        "Pensado para rodar após cada atualização da lista (ex.: cron com --if-changed)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Arquivo da lista (padrão: SANCTIONS_WATCHLIST_PATH).')
+        parser.add_argument('--threshold', type=float, help='Similaridade mínima (0-1).')
+        parser.add_argument('--workers', type=int, help='Processos do pool (padrão: SANCTIONS_SCREENING_WORKERS).')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Empresas por tarefa do pool.')
+        parser.add_argument('--company', type=int, action='append', dest='companies',
+                            help='Tria apenas a(s) empresa(s) informada(s) (pode repetir).')
+        parser.add_argument('--if-changed', action='store_true',
+                            help='Não faz nada se a lista e o limiar forem os da última triagem.')
+
+    def handle(self, *args, **options):
+        try:
+            if options['companies']:
+                total = 0
+                for company in Company.objects.filter(pk__in=options['companies']):
+                    total += len(screen_company(company, threshold=options['threshold'], path=options['path']))
+                self.stdout.write(self.style.SUCCESS(f"{total} ocorrência(s) encontrada(s)."))
+                return
+            run = screen_portfolio(
+                path=options['path'],
+                threshold=options['threshold'],
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                only_if_changed=options['if_changed'],
+            )
+        except (ImproperlyConfigured, OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        if run is None:
+            self.stdout.write("Lista sem alterações desde a última triagem.")
+            return
+        elapsed = (run.finished_at - run.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"{run.companies_screened} empresa(s) triada(s), {run.hits} ocorrência(s) em {elapsed:.1f}s."
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from customers.models import StatusTransition
+from customers.transitions import decisions_per_day, owner_turnaround, rebuild_rollups
+
+
+def _duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f'{hours // 24}d {hours % 24:02d}h{rest // 60:02d}' if hours >= 24 else f'{hours}h{rest // 60:02d}'
+
+
+class Command(BaseCommand):
+    help = (
+        "Relatório de SLA do fluxo de aprovação a partir das tabelas agregadas: tempo médio/máximo com cada "
+        "responsável (pending_owner) e decisões por dia e departamento. --rebuild recalcula os agregados a partir "
+        "do histórico (StatusTransition)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Janela do relatório em dias (padrão: 30).')
+        parser.add_argument('--department', choices=StatusTransition.Department.values, help='Filtra as decisões por departamento.')
+        parser.add_argument('--rebuild', action='store_true', help='Recalcula os agregados antes do relatório.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            stays, decisions = rebuild_rollups()
+            self.stdout.write(f'Agregados recalculados: {stays} linha(s) de permanência, {decisions} de decisões.')
+
+        self.stdout.write(f"Tempo com cada responsável (últimos {options['days']} dias):")
+        for owner, row in owner_turnaround(options['days']).items():
+            self.stdout.write(
+                f"  {owner:<12} {row['stays']:>6} passagem(ns)  média {_duration(row['avg_seconds']):>10}  "
+                f"máximo {_duration(row['max_seconds']):>10}"
+            )
+
+        self.stdout.write('Decisões por dia:')
+        for day, department, decision, count in decisions_per_day(options['days'], options['department']):
+            self.stdout.write(f'  {day:%d/%m/%Y} {department:<15} {decision:<21} {count:>5}')
@@ -0,0 +1,92 @@
+"""Middleware exposing the memoized user roles as ``request.roles``."""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .permissions import get_roles, set_roles
+
+SESSION_KEY = "_portal_roles"
+VERSION_KEY_PREFIX = "customers:roles_version"
+GLOBAL_VERSION_KEY = f"{VERSION_KEY_PREFIX}:all"
+
+
+def user_version_key(user_id):
+    return f"{VERSION_KEY_PREFIX}:user:{user_id}"
+
+
+def bump_roles_version(user_ids=None):
+    """Invalidate the session-cached roles of the given users (or of everyone)."""
+    if user_ids is None:
+        keys = [GLOBAL_VERSION_KEY]
+    else:
+        keys = [user_version_key(uid) for uid in user_ids]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def _current_version(user_id):
+    values = cache.get_many([GLOBAL_VERSION_KEY, user_version_key(user_id)])
+    return [values.get(GLOBAL_VERSION_KEY, 0), values.get(user_version_key(user_id), 0)]
+
+
+def _roles_from_session(request):
+    user = request.user
+    if not user.is_authenticated:
+        return get_roles(user)
+    version = _current_version(user.pk)
+    stored = request.session.get(SESSION_KEY)
+    if stored and stored.get("user") == user.pk and stored.get("version") == version:
+        return set_roles(user, stored.get("groups", ()))
+    roles = get_roles(user)
+    request.session[SESSION_KEY] = {
+        "user": user.pk,
+        "version": version,
+        "groups": sorted(roles.group_names),
+    }
+    return roles
+
+
+class PortalRolesMiddleware:
+    """Attach ``request.roles``, a lazy :class:`~customers.permissions.UserRoles`.
+
+    The group names are loaded at most once per request and memoized on
+    ``request.user``, so ``is_internal_user``/``can_start_onboarding``/``has_group``
+    all share the same lookup. With ``PORTAL_ROLES_SESSION_CACHE = True`` the names
+    are also kept in the session and only reloaded after an ``m2m_changed`` on
+    ``User.groups`` bumps the user's version (requires a cache shared by all
+    workers). Must come after ``AuthenticationMiddleware``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.use_session = bool(getattr(settings, "PORTAL_ROLES_SESSION_CACHE", False))
+        # Sob ASGI a cadeia é assíncrona: atende sem trocar de thread (ex.: streams SSE)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if self.use_session and hasattr(request, "session"):
+            # Preenche o memo do usuário a partir da sessão antes da view
+            request.roles = _roles_from_session(request)
+        else:
+            request.roles = SimpleLazyObject(lambda: get_roles(request.user))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.use_session and hasattr(request, "session"):
+            # Sessão e cache são síncronos: só este modo passa por uma thread
+            request.roles = await sync_to_async(_roles_from_session)(request)
+        else:
+            request.roles = SimpleLazyObject(lambda: get_roles(request.user))
+        return await self.get_response(request)
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:43
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+# Congelados como estavam nesta migração (customers.progress pode mudar depois): a ordem das
+# etapas define o bit de cada uma na máscara
+STEP_SLUGS = [
+    'general_information', 'individual_contacts', 'business_information', 'ownership_management',
+    'compliance', 'investigations_sanctions', 'banking_information', 'certification', 'add_documents',
+    'compliance_analysis', 'status_control',
+]
+STEP_BITS = {slug: 1 << index for index, slug in enumerate(STEP_SLUGS)}
+RESTRICTED_STEPS = ('compliance_analysis', 'status_control')
+# Modelo de cada etapa (exceto a própria Company) -> slug
+STEP_MODELS = {
+    'IndividualContact': 'individual_contacts',
+    'BusinessInformation': 'business_information',
+    'OwnershipManagementInfo': 'ownership_management',
+    'ComplianceInformation': 'compliance',
+    'InvestigationsSanctionsInfo': 'investigations_sanctions',
+    'BankingInformation': 'banking_information',
+    'CertificationInformation': 'certification',
+    'KYCDocument': 'add_documents',
+    'ComplianceAnalysis': 'compliance_analysis',
+    'StatusControl': 'status_control',
+}
+
+
+def _percentage(mask, steps):
+    completed = sum(1 for slug in steps if mask & STEP_BITS[slug])
+    return round(completed / len(steps) * 100)
+
+
+def snapshot_values(mask):
+    return {
+        'onboarding_progress_mask': mask,
+        'onboarding_progress_internal': _percentage(mask, STEP_SLUGS),
+        'onboarding_progress_client': _percentage(mask, [s for s in STEP_SLUGS if s not in RESTRICTED_STEPS]),
+    }
+
+
+def backfill_progress(apps, schema_editor):
+    Company = apps.get_model('customers', 'Company')
+    masks = {}
+    # Etapa da própria empresa: nome e endereço preenchidos
+    company_bits = sum(STEP_BITS[slug] for slug in STEP_SLUGS if slug not in STEP_MODELS.values())
+    filled = Company.objects.exclude(Q(full_company_name__isnull=True) | Q(full_company_name='')).exclude(
+        Q(registered_business_address__isnull=True) | Q(registered_business_address=''),
+    )
+    for pk in filled.values_list('pk', flat=True).iterator():
+        masks[pk] = company_bits
+    for model_name, slug in STEP_MODELS.items():
+        Step = apps.get_model('customers', model_name)
+        for pk in Step.objects.order_by().values_list('company', flat=True).distinct().iterator():
+            if pk is not None:
+                masks[pk] = masks.get(pk, 0) | STEP_BITS[slug]
+    by_mask = {}
+    for pk, mask in masks.items():
+        by_mask.setdefault(mask, []).append(pk)
+    for mask, pks in by_mask.items():
+        for start in range(0, len(pks), 500):
+            Company.objects.filter(pk__in=pks[start:start + 500]).update(**snapshot_values(mask))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0016_remove_businessinformation_repsol_company_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='onboarding_progress_client',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Progresso do onboarding (Cliente)'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='onboarding_progress_internal',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Progresso do onboarding (Equipe)'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='onboarding_progress_mask',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Etapas concluídas (bitmask)'),
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0018_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient_id', models.BigIntegerField(db_index=True)),
+                ('message', models.CharField(max_length=255)),
+                ('url', models.CharField(blank=True, max_length=255, null=True)),
+                ('audience', models.CharField(choices=[('INTERNAL', 'Interno'), ('CLIENT', 'Cliente')], max_length=10)),
+                ('rdd_id', models.BigIntegerField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
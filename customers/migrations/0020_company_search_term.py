@@ -0,0 +1,90 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:56
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Congelados como estavam nesta migração (customers.search pode mudar depois)
+FIELD_WEIGHTS = {
+    'full_company_name': 10,
+    'cnpj': 8,
+    'tax_vat_number': 8,
+    'company_registration_number': 8,
+    'previous_names': 6,
+    'aliases_trade_names': 6,
+    'registered_business_address': 2,
+}
+IDENTIFIER_FIELDS = ('cnpj', 'tax_vat_number', 'company_registration_number')
+MAX_TERM_LENGTH = 100
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def index_tokens(text, identifier=False):
+    tokens = []
+    folded = fold(text)
+    for chunk in folded.split():
+        parts = _WORD_RE.findall(chunk)
+        tokens.extend(parts)
+        if len(parts) > 1:
+            tokens.append(''.join(parts))
+    if identifier:
+        compact = ''.join(_WORD_RE.findall(folded))
+        if compact:
+            tokens.append(compact)
+    return [token[:MAX_TERM_LENGTH] for token in dict.fromkeys(tokens)]
+
+
+def company_terms(company):
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in index_tokens(getattr(company, field), identifier=field in IDENTIFIER_FIELDS):
+            if weight > terms.get(token, 0):
+                terms[token] = weight
+    return terms
+
+
+def backfill_search_terms(apps, schema_editor):
+    Company = apps.get_model('customers', 'Company')
+    CompanySearchTerm = apps.get_model('customers', 'CompanySearchTerm')
+    rows = []
+    for company in Company.objects.order_by('pk').only('pk', *FIELD_WEIGHTS).iterator(chunk_size=500):
+        rows.extend(
+            CompanySearchTerm(company_id=company.pk, term=term, weight=weight)
+            for term, weight in company_terms(company).items()
+        )
+        if len(rows) >= 5000:
+            CompanySearchTerm.objects.bulk_create(rows, batch_size=500)
+            rows = []
+    CompanySearchTerm.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0019_notification_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanySearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='customers.company')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='company_search_term_idx', opclasses=['varchar_pattern_ops'])],
+            },
+        ),
+        migrations.RunPython(backfill_search_terms, migrations.RunPython.noop),
+    ]
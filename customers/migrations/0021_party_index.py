@@ -0,0 +1,181 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:57
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Congelados como estavam nesta migração (customers.parties e customers.search podem mudar depois)
+NAME_WEIGHT = 10
+PASSPORT_WEIGHT = 8
+NATIONALITY_WEIGHT = 2
+MAX_TERM_LENGTH = 100
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def index_tokens(text, identifier=False):
+    tokens = []
+    folded = fold(text)
+    for chunk in folded.split():
+        parts = _WORD_RE.findall(chunk)
+        tokens.extend(parts)
+        if len(parts) > 1:
+            tokens.append(''.join(parts))
+    if identifier:
+        compact = ''.join(_WORD_RE.findall(folded))
+        if compact:
+            tokens.append(compact)
+    return [token[:MAX_TERM_LENGTH] for token in dict.fromkeys(tokens)]
+
+
+def party_terms(entry):
+    terms = {}
+    for text, weight, identifier in (
+        (entry.name, NAME_WEIGHT, False),
+        (entry.passport_number, PASSPORT_WEIGHT, True),
+        (entry.nationality, NATIONALITY_WEIGHT, False),
+    ):
+        for token in index_tokens(text, identifier=identifier):
+            if weight > terms.get(token, 0):
+                terms[token] = weight
+    return terms
+
+
+def _via_ownership(obj):
+    return obj.ownership_management.company_id
+
+
+def _describe_contact(obj):
+    if not obj.is_active:
+        return None
+    return {
+        'name': f"{obj.first_name} {obj.last_name}".strip(),
+        'role': obj.position_job_title or '',
+        'passport_number': '',
+        'nationality': '',
+    }
+
+
+def _describe_person(role_field, nationality_field, passport_field=None, name_field='full_name'):
+    def describe(obj):
+        return {
+            'name': getattr(obj, name_field) or '',
+            'role': getattr(obj, role_field) or '',
+            'passport_number': (getattr(obj, passport_field) if passport_field else '') or '',
+            'nationality': getattr(obj, nationality_field) or '',
+        }
+    return describe
+
+
+def _describe_prior_relationship(obj):
+    return {
+        'name': obj.company_name or '',
+        'role': 'Prior business relationship',
+        'passport_number': '',
+        'nationality': '',
+    }
+
+
+# source -> (modelo, select_related, empresa do objeto, valores da entrada)
+PARTY_SOURCES = {
+    'contact': ('IndividualContact', (), lambda obj: obj.company_id, _describe_contact),
+    'management': (
+        'ManagementAndKeyEmployees', ('ownership_management',), _via_ownership,
+        _describe_person('job_title', 'nationality', 'passport_number'),
+    ),
+    'board': (
+        'BoardOfDirectors', ('ownership_management',), _via_ownership,
+        _describe_person('board_position', 'nationality', 'passport_number'),
+    ),
+    'ubo': (
+        'UltimateBeneficialOwner', ('ownership_management',), _via_ownership,
+        _describe_person('company_individual', 'nationality_registered_country'),
+    ),
+    'shareholder': (
+        'MajorShareholder', ('ownership_management',), _via_ownership,
+        _describe_person('type_of_relationship', 'nationality_registered_country',
+                         name_field='name_of_individual_company'),
+    ),
+    'prior_relationship': (
+        'PriorBusinessRelationship', ('business_information',),
+        lambda obj: obj.business_information.company_id, _describe_prior_relationship,
+    ),
+}
+
+
+def backfill_party_index(apps, schema_editor):
+    Entry = apps.get_model('customers', 'PartyIndexEntry')
+    Term = apps.get_model('customers', 'PartySearchTerm')
+    lengths = {f: Entry._meta.get_field(f).max_length for f in ('name', 'role', 'passport_number', 'nationality')}
+
+    def flush(entries):
+        entries = Entry.objects.bulk_create(entries, batch_size=500)
+        Term.objects.bulk_create([
+            Term(party_id=entry.pk, term=term, weight=weight)
+            for entry in entries for term, weight in party_terms(entry).items()
+        ], batch_size=500)
+
+    for source, (model_name, select_related, company_of, describe) in PARTY_SOURCES.items():
+        Model = apps.get_model('customers', model_name)
+        batch = []
+        for obj in Model.objects.select_related(*select_related).order_by('pk').iterator(chunk_size=500):
+            values = describe(obj)
+            if values is None:
+                continue
+            values = {field: value[:lengths[field]] for field, value in values.items()}
+            batch.append(Entry(source=source, object_id=obj.pk, company_id=company_of(obj), **values))
+            if len(batch) >= 500:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0020_company_search_term'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartyIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('contact', 'Individual Contact'), ('management', 'Management and Key Employee'), ('board', 'Board of Directors'), ('ubo', 'Ultimate Beneficial Owner'), ('shareholder', 'Major Shareholder'), ('prior_relationship', 'Prior Business Relationship')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('role', models.CharField(blank=True, default='', max_length=255)),
+                ('passport_number', models.CharField(blank=True, default='', max_length=50)),
+                ('nationality', models.CharField(blank=True, default='', max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='party_index', to='customers.company')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PartySearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='customers.partyindexentry')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='partyindexentry',
+            constraint=models.UniqueConstraint(fields=('source', 'object_id'), name='party_index_source_object_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='partysearchterm',
+            index=models.Index(fields=['term'], name='party_search_term_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_party_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0021_party_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SanctionsScreeningRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('list_version', models.CharField(max_length=64)),
+                ('list_path', models.CharField(max_length=500)),
+                ('threshold', models.FloatField()),
+                ('companies_screened', models.PositiveIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-finished_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SanctionsScreeningHit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('screened_name', models.CharField(max_length=255)),
+                ('list_uid', models.CharField(blank=True, default='', max_length=64)),
+                ('list_name', models.CharField(max_length=255)),
+                ('list_type', models.CharField(blank=True, default='', max_length=50)),
+                ('programs', models.CharField(blank=True, default='', max_length=255)),
+                ('score', models.FloatField()),
+                ('list_version', models.CharField(max_length=64)),
+                ('screened_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='screening_hits', to='customers.company')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['company', '-score'], name='screening_hit_company_idx')],
+            },
+        ),
+    ]
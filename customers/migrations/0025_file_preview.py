@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0024_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilePreview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pendente'), ('DONE', 'Processado'), ('FAILED', 'Falhou')], default='PENDING', max_length=10)),
+                ('mime_type', models.CharField(blank=True, max_length=100)),
+                ('size', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('text', models.TextField(blank=True)),
+                ('thumbnail', models.FileField(blank=True, max_length=255, upload_to='')),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
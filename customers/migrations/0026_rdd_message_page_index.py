@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0025_file_preview'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reverseduediligencemessage',
+            index=models.Index(fields=['thread', 'created_at', 'id'], name='rdd_message_thread_page_idx'),
+        ),
+    ]
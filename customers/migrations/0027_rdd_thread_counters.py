@@ -0,0 +1,64 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def backfill_threads(apps, schema_editor):
+    Thread = apps.get_model('customers', 'ReverseDueDiligence')
+    Message = apps.get_model('customers', 'ReverseDueDiligenceMessage')
+    Notification = apps.get_model('customers', 'Notification')
+    ReadState = apps.get_model('customers', 'ReverseDueDiligenceReadState')
+    now = timezone.now()
+    counts = dict(Message.objects.order_by().values('thread').annotate(n=Count('pk')).values_list('thread', 'n'))
+    for thread in Thread.objects.filter(pk__in=counts):
+        last = Message.objects.filter(thread=thread).order_by('-created_at', '-pk').first()
+        Thread.objects.filter(pk=thread.pk).update(
+            message_count=counts[thread.pk], last_message_at=last.created_at, last_author_id=last.author_id,
+        )
+    # Quem escreveu no RDD ou já leu todas as notificações dele começa com tudo lido
+    seen = set(Message.objects.values_list('thread', 'author').distinct())
+    notified = set(Notification.objects.filter(rdd__isnull=False).values_list('rdd', 'recipient').distinct())
+    pending = set(Notification.objects.filter(rdd__isnull=False, is_read=False).values_list('rdd', 'recipient').distinct())
+    ReadState.objects.bulk_create([
+        ReadState(thread_id=thread_id, user_id=user_id, read_count=counts.get(thread_id, 0), last_read_at=now)
+        for thread_id, user_id in seen | (notified - pending)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0026_rdd_message_page_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reverseduediligence',
+            name='last_author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='reverseduediligence',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ReverseDueDiligenceReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_count', models.PositiveIntegerField(default=0)),
+                ('last_read_at', models.DateTimeField()),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='customers.reverseduediligence')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rdd_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('thread', 'user'), name='rdd_read_state_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
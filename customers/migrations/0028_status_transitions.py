@@ -0,0 +1,75 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_pending_since(apps, schema_editor):
+    StatusControl = apps.get_model('customers', 'StatusControl')
+    StatusControl.objects.update(pending_since=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0027_rdd_thread_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statuscontrol',
+            name='pending_since',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Pendente desde'),
+        ),
+        migrations.CreateModel(
+            name='DecisionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('department', models.CharField(choices=[('ONBOARDING', 'Requisitos mínimos'), ('COMPLIANCE', 'Compliance'), ('FINANCE', 'Financeiro'), ('TRADING', 'Trading'), ('FINAL_ANALYSIS', 'Análise final'), ('SUPRIMENTOS', 'Suprimentos')], max_length=20)),
+                ('decision', models.CharField(choices=[('APPROVE', 'Aprovado'), ('REJECT', 'Reprovado'), ('REGISTER', 'Cadastrado no SAP'), ('REQUIREMENTS_MET', 'Requisitos atendidos'), ('REQUIREMENTS_PENDING', 'Requisitos pendentes')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'department', 'decision'), name='decision_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PendingOwnerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('pending_owner', models.CharField(max_length=20)),
+                ('stays', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.PositiveBigIntegerField(default=0)),
+                ('max_seconds', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'pending_owner'), name='pending_owner_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('department', models.CharField(choices=[('ONBOARDING', 'Requisitos mínimos'), ('COMPLIANCE', 'Compliance'), ('FINANCE', 'Financeiro'), ('TRADING', 'Trading'), ('FINAL_ANALYSIS', 'Análise final'), ('SUPRIMENTOS', 'Suprimentos')], max_length=20)),
+                ('decision', models.CharField(choices=[('APPROVE', 'Aprovado'), ('REJECT', 'Reprovado'), ('REGISTER', 'Cadastrado no SAP'), ('REQUIREMENTS_MET', 'Requisitos atendidos'), ('REQUIREMENTS_PENDING', 'Requisitos pendentes')], max_length=20)),
+                ('from_owner', models.CharField(max_length=20)),
+                ('to_owner', models.CharField(max_length=20)),
+                ('duration_seconds', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('details', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_transitions', to='customers.company')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['company', 'created_at'], name='transition_company_idx'), models.Index(fields=['department', 'created_at'], name='transition_department_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_pending_since, migrations.RunPython.noop),
+    ]
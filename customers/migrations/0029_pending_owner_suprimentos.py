@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0028_status_transitions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='statuscontrol',
+            name='pending_owner',
+            field=models.CharField(choices=[('USER', 'Usuário'), ('COMPLIANCE', 'Compliance'), ('FINANCE', 'Financeiro'), ('TRADING', 'Trading'), ('SUPRIMENTOS', 'Suprimentos'), ('NONE', 'Nenhum')], default='NONE', max_length=20, verbose_name='Pendência atribuída a'),
+        ),
+    ]
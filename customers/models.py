@@ -1,9 +1,12 @@
-from django.db import models
+import uuid
+from django.db import models, transaction
 from django.conf import settings
 from datetime import date
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q
+from django.db.models import F, Q
 
 # 1.General Information
 
@@ -86,6 +89,22 @@ class Company(models.Model):
         null=True,
         verbose_name="Próxima avaliação em"
     )
+    # Snapshot do progresso do onboarding, mantido pelos sinais (ver customers/progress.py)
+    onboarding_progress_mask = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Etapas concluídas (bitmask)"
+    )
+    onboarding_progress_internal = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Progresso do onboarding (Equipe)"
+    )
+    onboarding_progress_client = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Progresso do onboarding (Cliente)"
+    )
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -97,9 +116,72 @@ class Company(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Campos dos quais min_requirements_met()/missing_min_requirements() dependem.
+    # Alterações neles (e só neles) reavaliam o estado no StatusControl.
+    MIN_REQUIREMENT_FIELDS = (
+        'client_type',
+        'cnpj',
+        'full_company_name',
+        'previous_names',
+        'registered_business_address',
+        'tax_vat_number',
+        'country_of_incorporation',
+    )
+    # Campos indexados na busca de empresas (customers/search.py)
+    SEARCH_FIELDS = (
+        'full_company_name',
+        'previous_names',
+        'aliases_trade_names',
+        'registered_business_address',
+        'cnpj',
+        'tax_vat_number',
+        'company_registration_number',
+    )
+    TRACKED_FIELDS = tuple(dict.fromkeys(MIN_REQUIREMENT_FIELDS + SEARCH_FIELDS))
+    # Snapshot gravado só por customers/progress.py (UPDATE com a linha travada)
+    PROGRESS_FIELDS = ('onboarding_progress_mask', 'onboarding_progress_internal', 'onboarding_progress_client')
+
     def __str__(self):
         return self.full_company_name
 
+    def save(self, *args, **kwargs):
+        # Um save() completo de uma instância carregada antes não pode regravar um snapshot antigo
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    f.name for f in self._meta.concrete_fields
+                    if not f.primary_key and f.attname not in deferred
+                ]
+            kwargs['update_fields'] = [name for name in update_fields if name not in self.PROGRESS_FIELDS]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.reset_tracked_fields()
+        return instance
+
+    def _tracked_values(self):
+        # Usa __dict__ para não disparar consultas de campos adiados (only/defer)
+        return {name: self.__dict__.get(name, models.DEFERRED) for name in self.TRACKED_FIELDS}
+
+    def reset_tracked_fields(self):
+        """Remember the current values of the tracked fields as the clean state."""
+        self._tracked_initial = self._tracked_values()
+
+    def changed_tracked_fields(self):
+        """Names of the tracked fields that changed since load (all of them for new instances)."""
+        initial = getattr(self, '_tracked_initial', None)
+        if initial is None:
+            return set(self.TRACKED_FIELDS)
+        current = self._tracked_values()
+        return {
+            name for name, value in current.items()
+            if value is models.DEFERRED or initial[name] is models.DEFERRED or value != initial[name]
+        }
+
     class Meta:
         verbose_name = "Company"
         verbose_name_plural = "Companies"
@@ -125,7 +207,7 @@ class Company(models.Model):
                 bool(self.tax_vat_number),
                 bool(self.country_of_incorporation),
             ])
-            ownership_ok = hasattr(self, 'ownership_management')
+            ownership_ok = self.has_ownership_management()
             return bool(basics_ok and ownership_ok)
 
         # Outros casos: considerar não atendido
@@ -150,7 +232,7 @@ class Company(models.Model):
                 missing.append('VAT number')
             if not self.country_of_incorporation:
                 missing.append('Country of Incorporation')
-            if not hasattr(self, 'ownership_management'):
+            if not self.has_ownership_management():
                 missing.append('Sheet 3. Ownership & Management info')
             return missing
 
@@ -159,19 +241,136 @@ class Company(models.Model):
             missing.append('Tipo de Cliente (Nacional/Internacional)')
         return missing
 
-    @property
+    def has_ownership_management(self):
+        """Whether the Ownership & Management sheet exists.
+
+        Listings annotate ``has_ownership`` (``Exists``) to avoid the reverse
+        one-to-one query per row; otherwise the relation is checked directly.
+        """
+        annotated = getattr(self, 'has_ownership', None)
+        if annotated is not None:
+            return annotated
+        return hasattr(self, 'ownership_management')
+
+    @cached_property
     def has_min_requirements(self):
-        """Template-friendly boolean for minimum requirements met."""
+        """Template-friendly boolean for minimum requirements met (computed once per instance)."""
         return self.min_requirements_met()
 
     @property
     def latest_final_analysis_attachment(self):
+        # Preenchido por Prefetch(to_attr='latest_final_analysis_attachments') nas listagens
+        prefetched = getattr(self, 'latest_final_analysis_attachments', None)
+        if prefetched is not None:
+            return prefetched[0] if prefetched else None
         try:
             return self.final_analysis_attachments.first()
         except Exception:
             return None
 
 
+class CompanySearchTerm(models.Model):
+    """Accent-folded search token of a company, kept in sync by customers.signals."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=100)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.term} ({self.company_id})"
+
+    class Meta:
+        indexes = [
+            # Busca por prefixo: faixa de comparação no SQLite, LIKE 'x%' (pattern_ops) no PostgreSQL
+            models.Index(fields=['term'], name='company_search_term_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+
+class PartyIndexEntry(models.Model):
+    """Denormalized copy of a person/entity linked to a company (customers/parties.py)."""
+    SOURCE_CHOICES = [
+        ('contact', 'Individual Contact'),
+        ('management', 'Management and Key Employee'),
+        ('board', 'Board of Directors'),
+        ('ubo', 'Ultimate Beneficial Owner'),
+        ('shareholder', 'Major Shareholder'),
+        ('prior_relationship', 'Prior Business Relationship'),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='party_index')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    name = models.CharField(max_length=255)
+    role = models.CharField(max_length=255, blank=True, default='')
+    passport_number = models.CharField(max_length=50, blank=True, default='')
+    nationality = models.CharField(max_length=100, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.get_source_display()})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'object_id'], name='party_index_source_object_uniq'),
+        ]
+
+
+class PartySearchTerm(models.Model):
+    """Accent-folded search token of a :class:`PartyIndexEntry`."""
+    party = models.ForeignKey(PartyIndexEntry, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=100)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.term} ({self.party_id})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term'], name='party_search_term_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+
+class SanctionsScreeningHit(models.Model):
+    """Watchlist match of a company or one of its parties (customers/screening.py)."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='screening_hits')
+    # 'company' para o próprio nome da empresa ou a origem do PartyIndexEntry (ubo, board, shareholder)
+    source = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    screened_name = models.CharField(max_length=255)
+    list_uid = models.CharField(max_length=64, blank=True, default='')
+    list_name = models.CharField(max_length=255)
+    list_type = models.CharField(max_length=50, blank=True, default='')
+    programs = models.CharField(max_length=255, blank=True, default='')
+    score = models.FloatField()
+    list_version = models.CharField(max_length=64)
+    screened_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.screened_name} ~ {self.list_name} ({self.score:.2f})"
+
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['company', '-score'], name='screening_hit_company_idx'),
+        ]
+
+
+class SanctionsScreeningRun(models.Model):
+    """One batch screening of the portfolio against a watchlist version."""
+    list_version = models.CharField(max_length=64)
+    list_path = models.CharField(max_length=500)
+    threshold = models.FloatField()
+    companies_screened = models.PositiveIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Triagem {self.list_version[:12]} em {self.finished_at:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        ordering = ['-finished_at']
+
+
 # Evaluation history attachments
 class EvaluationRecord(models.Model):
     company = models.ForeignKey(
@@ -951,6 +1150,7 @@ class StatusControl(models.Model):
         ('COMPLIANCE', 'Compliance'),
         ('FINANCE', 'Financeiro'),
         ('TRADING', 'Trading'),
+        ('SUPRIMENTOS', 'Suprimentos'),
         ('NONE', 'Nenhum'),
     ]
     pending_owner = models.CharField(
@@ -982,6 +1182,9 @@ class StatusControl(models.Model):
         verbose_name="Did Client Respond with OK / Finishing its Onboarding/KYC?"
     )
 
+    # Desde quando a pendência está com o pending_owner atual (ver customers.transitions)
+    pending_since = models.DateTimeField(default=timezone.now, verbose_name="Pendente desde")
+
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -1003,6 +1206,85 @@ class StatusControl(models.Model):
         ordering = ['company__full_company_name']
 
 
+class StatusTransition(models.Model):
+    """One workflow event of a company (append-only); see customers.transitions."""
+    class Department(models.TextChoices):
+        ONBOARDING = 'ONBOARDING', 'Requisitos mínimos'
+        COMPLIANCE = 'COMPLIANCE', 'Compliance'
+        FINANCE = 'FINANCE', 'Financeiro'
+        TRADING = 'TRADING', 'Trading'
+        FINAL_ANALYSIS = 'FINAL_ANALYSIS', 'Análise final'
+        SUPRIMENTOS = 'SUPRIMENTOS', 'Suprimentos'
+
+    class Decision(models.TextChoices):
+        APPROVE = 'APPROVE', 'Aprovado'
+        REJECT = 'REJECT', 'Reprovado'
+        REGISTER = 'REGISTER', 'Cadastrado no SAP'
+        REQUIREMENTS_MET = 'REQUIREMENTS_MET', 'Requisitos atendidos'
+        REQUIREMENTS_PENDING = 'REQUIREMENTS_PENDING', 'Requisitos pendentes'
+
+    company = models.ForeignKey('Company', on_delete=models.CASCADE, related_name='status_transitions')
+    department = models.CharField(max_length=20, choices=Department.choices)
+    decision = models.CharField(max_length=20, choices=Decision.choices)
+    from_owner = models.CharField(max_length=20)
+    to_owner = models.CharField(max_length=20)
+    # Tempo (segundos) que a pendência ficou com from_owner; nulo se o responsável não mudou
+    duration_seconds = models.PositiveBigIntegerField(null=True, blank=True)
+    details = models.TextField(blank=True, default='')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.company_id}: {self.department} {self.decision} ({self.from_owner} -> {self.to_owner})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("StatusTransition é somente inclusão.")
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            # Histórico de uma empresa
+            models.Index(fields=['company', 'created_at'], name='transition_company_idx'),
+            # Eventos por departamento em um período
+            models.Index(fields=['department', 'created_at'], name='transition_department_idx'),
+        ]
+
+
+class PendingOwnerRollup(models.Model):
+    """Time spent with each pending_owner, per day the stay ended."""
+    day = models.DateField()
+    pending_owner = models.CharField(max_length=20)
+    stays = models.PositiveIntegerField(default=0)
+    total_seconds = models.PositiveBigIntegerField(default=0)
+    max_seconds = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.pending_owner}: {self.stays}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'pending_owner'], name='pending_owner_rollup_unique'),
+        ]
+
+
+class DecisionRollup(models.Model):
+    """Number of decisions per day, department and outcome."""
+    day = models.DateField()
+    department = models.CharField(max_length=20, choices=StatusTransition.Department.choices)
+    decision = models.CharField(max_length=20, choices=StatusTransition.Decision.choices)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.department} {self.decision}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'department', 'decision'], name='decision_rollup_unique'),
+        ]
+
+
 # Reverse Due Diligence (RDD) communication
 class ReverseDueDiligence(models.Model):
     STATUS_CHOICES = [
@@ -1019,6 +1301,9 @@ class ReverseDueDiligence(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_message_at = models.DateTimeField(blank=True, null=True)
+    # Mantidos por ReverseDueDiligenceMessage.save() na mesma transação da mensagem
+    message_count = models.PositiveIntegerField(default=0)
+    last_author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
 
     def __str__(self):
         return f"RDD: {self.subject} ({self.company.full_company_name})"
@@ -1041,8 +1326,47 @@ class ReverseDueDiligenceMessage(models.Model):
     def __str__(self):
         return f"Mensagem em {self.thread_id} por {self.author_id}"
 
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created:
+                # Contadores do RDD e cursor de leitura do autor (sua própria mensagem não fica "não lida")
+                ReverseDueDiligence.objects.filter(pk=self.thread_id).update(
+                    message_count=F('message_count') + 1,
+                    last_message_at=self.created_at,
+                    last_author_id=self.author_id,
+                )
+                count = ReverseDueDiligence.objects.filter(pk=self.thread_id).values_list('message_count', flat=True).first()
+                ReverseDueDiligenceReadState.objects.bulk_create(
+                    [ReverseDueDiligenceReadState(
+                        thread_id=self.thread_id, user_id=self.author_id, read_count=count, last_read_at=self.created_at,
+                    )],
+                    update_conflicts=True, unique_fields=['thread', 'user'], update_fields=['read_count', 'last_read_at'],
+                )
+
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Paginação por cursor (created_at, id) das mensagens de um RDD
+            models.Index(fields=['thread', 'created_at', 'id'], name='rdd_message_thread_page_idx'),
+        ]
+
+
+class ReverseDueDiligenceReadState(models.Model):
+    """How many messages of a thread the user had when they last opened it."""
+    thread = models.ForeignKey(ReverseDueDiligence, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='rdd_read_states')
+    read_count = models.PositiveIntegerField(default=0)
+    last_read_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Leitura do RDD {self.thread_id} por {self.user_id}: {self.read_count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['thread', 'user'], name='rdd_read_state_unique'),
+        ]
 
 
 class Notification(models.Model):
@@ -1058,12 +1382,42 @@ class Notification(models.Model):
     audience = models.CharField(max_length=10, choices=Audience.choices, default=Audience.INTERNAL)
     # Opcional: vínculo com RDD
     rdd = models.ForeignKey(ReverseDueDiligence, on_delete=models.CASCADE, related_name='notifications', blank=True, null=True)
+    # Quantas notificações idênticas não lidas foram agrupadas nesta (ver prune_notifications)
+    count = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"Notificação para {self.recipient_id}: {self.message}"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Caixa de entrada e contador de não lidas por usuário
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='notif_recipient_read_idx'),
+            # Marcar como lidas as notificações de um RDD
+            models.Index(fields=['recipient', 'rdd', 'is_read'], name='notif_recipient_rdd_idx'),
+            # Feed de não lidas do dashboard interno
+            models.Index(fields=['audience', '-created_at'], name='notif_unread_audience_idx', condition=Q(is_read=False)),
+            # Detecção de notificação duplicada ainda não lida
+            models.Index(fields=['recipient', 'message'], name='notif_unread_message_idx', condition=Q(is_read=False)),
+        ]
+
+
+class NotificationArchive(models.Model):
+    """Compact copy of read notifications removed by the retention job."""
+    recipient_id = models.BigIntegerField(db_index=True)
+    message = models.CharField(max_length=255)
+    url = models.CharField(max_length=255, blank=True, null=True)
+    audience = models.CharField(max_length=10, choices=Notification.Audience.choices)
+    rdd_id = models.BigIntegerField(blank=True, null=True)
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Notificação arquivada para {self.recipient_id}: {self.message}"
+
+    class Meta:
+        ordering = ['-created_at']
 
 
 class ReverseDueDiligenceAttachment(models.Model):
@@ -1077,3 +1431,82 @@ class ReverseDueDiligenceAttachment(models.Model):
 
     class Meta:
         ordering = ['uploaded_at']
+
+
+class StoredBlob(models.Model):
+    """One physical copy of an uploaded file, addressed by its SHA-256 (see customers.storage)."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    # Quantos nomes de arquivo (StoredFile) apontam para este conteúdo
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} ref.)"
+
+
+class StoredFile(models.Model):
+    """A file name handed to a FileField, pointing at the blob that holds its content."""
+    name = models.CharField(max_length=255, unique=True)
+    blob = models.ForeignKey(StoredBlob, on_delete=models.PROTECT, related_name='files')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class UploadSession(models.Model):
+    """A resumable (chunked) upload in progress; see customers.uploads."""
+    class Status(models.TextChoices):
+        OPEN = 'OPEN', 'Em andamento'
+        COMPLETED = 'COMPLETED', 'Concluído'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    # kyc_document / evaluation_record / final_analysis_attachment / rdd_message
+    target = models.CharField(max_length=40)
+    # Dados já validados do objeto a criar (empresa, tipo de documento, mensagem...)
+    metadata = models.JSONField(default=dict)
+    filename = models.CharField(max_length=255)
+    length = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.OPEN)
+    object_id = models.PositiveBigIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Upload {self.pk} ({self.offset}/{self.length})"
+
+    class Meta:
+        indexes = [
+            # Limpeza das sessões vencidas (prune_uploads)
+            models.Index(fields=['expires_at'], name='upload_session_expires_idx'),
+        ]
+
+
+class FilePreview(models.Model):
+    """Derived data of an uploaded file (see customers.documents), keyed by the stored file name."""
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pendente'
+        DONE = 'DONE', 'Processado'
+        FAILED = 'FAILED', 'Falhou'
+
+    name = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    mime_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField(blank=True, null=True)
+    page_count = models.PositiveIntegerField(blank=True, null=True)
+    text = models.TextField(blank=True)
+    # Miniatura da primeira página, gravada ao lado do original (<nome>.thumb.png)
+    thumbnail = models.FileField(max_length=255, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+    @property
+    def excerpt(self):
+        return ' '.join(self.text[:400].split())
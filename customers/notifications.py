@@ -0,0 +1,265 @@
+"""Notification dispatch and inbox helpers.
+
+Recipients of a group broadcast are resolved with a single ``values_list('id')``
+query and the rows are inserted in batches of ``NOTIFICATION_BATCH_SIZE``.
+With ``NOTIFICATIONS_ASYNC = True`` the fan-out runs after the transaction
+commits in a small in-process thread pool, so the request that triggered it
+(e.g. an approval) does not wait for large groups such as 'Equipe'.
+
+The number of unread notifications of each user is kept in the cache: it is
+counted once (indexed query), then incremented on create and decremented by
+:func:`mark_read`. Bulk inserts simply drop the cached value of the affected
+users so it is recounted on the next read. Any worker may change a counter
+that another one serves, so this requires the cache shared by all workers
+configured in ``settings.CACHES`` (never a per-process ``LocMemCache``).
+"""
+
+import gzip
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+
+from .events import publish, user_channel
+from .models import Notification, NotificationArchive
+from .permissions import is_internal_user
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+UNREAD_CACHE_KEY = 'customers:notifications:unread:{}'
+
+
+def _unread_ttl():
+    return int(getattr(settings, 'NOTIFICATION_UNREAD_CACHE_TTL', 300))
+
+
+def _batch_size():
+    return int(getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(getattr(settings, 'NOTIFICATION_WORKERS', 2)),
+            thread_name_prefix='notifications',
+        )
+    return _executor
+
+
+def _run_in_background(func, *args, **kwargs):
+    def task():
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception("Falha ao enviar notificações em segundo plano")
+        finally:
+            # A thread do pool não passa pelo ciclo de requisição: fecha a conexão aberta
+            connection.close()
+
+    transaction.on_commit(lambda: _get_executor().submit(task))
+
+
+def group_recipient_ids(group_name):
+    """Ids of the users in the group, in one query."""
+    User = get_user_model()
+    return list(
+        User.objects.filter(groups__name=group_name)
+        .values_list('id', flat=True)
+        .distinct()
+    )
+
+
+def bulk_notify(recipient_ids, message, url=None, rdd=None, audience=Notification.Audience.INTERNAL):
+    """Insert one notification per recipient id with ``bulk_create``; return the rows created."""
+    rdd_id = rdd.pk if rdd is not None else None
+    rows = [
+        Notification(recipient_id=uid, message=message, url=url, rdd_id=rdd_id, audience=audience)
+        for uid in recipient_ids
+    ]
+    created = Notification.objects.bulk_create(rows, batch_size=_batch_size())
+    # bulk_create não dispara post_save: invalida os contadores dos destinatários e avisa as conexões SSE
+    forget_unread(recipient_ids)
+    publish([user_channel(uid) for uid in recipient_ids], 'notification', {'message': message, 'url': url, 'rdd': rdd_id})
+    return created
+
+
+def _notify_group_now(group_name, message, url=None, rdd=None, audience=Notification.Audience.INTERNAL):
+    recipient_ids = group_recipient_ids(group_name)
+    if not recipient_ids:
+        return []
+    return bulk_notify(recipient_ids, message, url=url, rdd=rdd, audience=audience)
+
+
+def notify_group(group_name, message, url=None, rdd=None, audience=Notification.Audience.INTERNAL, defer=None):
+    """Notify every member of a group.
+
+    ``defer`` overrides the ``NOTIFICATIONS_ASYNC`` setting for this call.
+    """
+    if defer is None:
+        defer = bool(getattr(settings, 'NOTIFICATIONS_ASYNC', False))
+    if defer:
+        _run_in_background(_notify_group_now, group_name, message, url=url, rdd=rdd, audience=audience)
+        return None
+    return _notify_group_now(group_name, message, url=url, rdd=rdd, audience=audience)
+
+
+def notify_user(user, message, url=None, rdd=None):
+    """Notify a single user, picking the audience from their role."""
+    if not user:
+        return None
+    audience = Notification.Audience.INTERNAL if is_internal_user(user) else Notification.Audience.CLIENT
+    return Notification.objects.create(
+        recipient=user,
+        message=message,
+        url=url,
+        rdd=rdd,
+        audience=audience,
+    )
+
+
+# --- Caixa de entrada / contador de não lidas ---
+
+def unread_queryset(user):
+    return Notification.objects.filter(recipient=user, is_read=False)
+
+
+def unread_count(user):
+    """Number of unread notifications of the user, served from the cache."""
+    if not getattr(user, 'is_authenticated', False):
+        return 0
+    key = UNREAD_CACHE_KEY.format(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = unread_queryset(user).count()
+        cache.set(key, count, _unread_ttl())
+    return count
+
+
+def adjust_unread(user_id, delta):
+    """Apply ``delta`` to a cached counter; a missing entry is left to be recounted."""
+    key = UNREAD_CACHE_KEY.format(user_id)
+    try:
+        value = cache.incr(key, delta)
+    except ValueError:
+        return
+    if value < 0:
+        cache.delete(key)
+
+
+def forget_unread(user_ids):
+    cache.delete_many([UNREAD_CACHE_KEY.format(uid) for uid in set(user_ids)])
+
+
+def mark_read(user, **filters):
+    """Mark the user's unread notifications (optionally filtered) as read; return how many."""
+    updated = unread_queryset(user).filter(**filters).update(is_read=True)
+    if updated:
+        adjust_unread(user.pk, -updated)
+    return updated
+
+
+# --- Retenção: arquivamento e compactação ---
+
+ARCHIVE_FIELDS = ('id', 'recipient_id', 'message', 'url', 'audience', 'rdd_id', 'count', 'created_at')
+
+
+def _write_jsonl(handle, rows):
+    for row in rows:
+        row = dict(row, created_at=row['created_at'].isoformat())
+        handle.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+def archive_read_notifications(cutoff, batch_size=1000, jsonl_path=None, dry_run=False):
+    """Move read notifications created before ``cutoff`` out of the live table.
+
+    Rows are processed in id order, one short transaction per batch, and
+    copied to :class:`NotificationArchive` (or appended to a gzipped JSONL
+    file when ``jsonl_path`` is given) before being deleted. Returns how many
+    rows were archived.
+    """
+    base = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('id')
+    if dry_run:
+        return base.count()
+
+    handle = gzip.open(jsonl_path, 'at', encoding='utf-8') if jsonl_path else None
+    archived = 0
+    last_id = 0
+    try:
+        while True:
+            rows = list(base.filter(id__gt=last_id).values(*ARCHIVE_FIELDS)[:batch_size])
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            last_id = ids[-1]
+            with transaction.atomic():
+                if handle is not None:
+                    _write_jsonl(handle, rows)
+                else:
+                    NotificationArchive.objects.bulk_create(
+                        [NotificationArchive(**{k: v for k, v in row.items() if k != 'id'}) for row in rows],
+                        batch_size=batch_size,
+                    )
+                Notification.objects.filter(id__in=ids, is_read=True).delete()
+            archived += len(ids)
+    finally:
+        if handle is not None:
+            handle.close()
+    return archived
+
+
+def collapse_duplicate_unread(batch_size=1000, dry_run=False):
+    """Merge unread notifications with the same (recipient, message, url) into one row.
+
+    The most recent row of each group is kept with ``count`` holding the total;
+    the others are deleted. Returns how many rows were removed.
+    """
+    groups = (
+        Notification.objects.filter(is_read=False)
+        .order_by()
+        .values('recipient_id', 'message', 'url')
+        .annotate(rows=Count('id'), keep_id=Max('id'), total=Sum('count'))
+        .filter(rows__gt=1)
+    )
+    removed = 0
+    affected = set()
+    pending = []
+
+    def flush():
+        nonlocal removed
+        with transaction.atomic():
+            for group in pending:
+                duplicates = Notification.objects.filter(
+                    is_read=False,
+                    recipient_id=group['recipient_id'],
+                    message=group['message'],
+                ).exclude(id=group['keep_id'])
+                if group['url'] is None:
+                    duplicates = duplicates.filter(url__isnull=True)
+                else:
+                    duplicates = duplicates.filter(url=group['url'])
+                deleted, _ = duplicates.delete()
+                Notification.objects.filter(id=group['keep_id']).update(count=group['total'])
+                removed += deleted
+                affected.add(group['recipient_id'])
+        pending.clear()
+
+    for group in groups.iterator(chunk_size=batch_size):
+        if dry_run:
+            removed += group['rows'] - 1
+            continue
+        pending.append(group)
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+    if affected:
+        forget_unread(affected)
+    return removed
@@ -0,0 +1,236 @@
+"""Ownership graph across the portal's companies.
+
+Each ``MajorShareholder`` row is an edge "holder owns N% of company". A
+shareholder that is itself a portal company (matched by CNPJ, tax/VAT or
+registration number found in its name, or else by its normalized name) is
+followed upwards, so the effective stake of every ultimate holder is the
+product of the percentages along each chain, summed over all chains.
+Cycles (A owns B owns A) are cut where they close and reported, and
+companies whose direct shareholders, declared UBOs or effective owners add
+up to more than 100% are flagged.
+
+The graph is loaded with three queries and resolving a company walks only
+the chains above it; the ``ownership_report`` command resolves the whole
+portfolio in one memoized pass. Reports are cached per company (in the
+cache shared by all workers, ``settings.CACHES``) under a version that any
+change to ownership rows (or to the names/identifiers used for matching)
+replaces through customers.signals. A detail page that misses the cache
+resolves only its own company.
+"""
+
+import re
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.core.cache import cache
+
+from .models import Company, MajorShareholder, UltimateBeneficialOwner
+from .screening import company_names, normalize_name
+from .search import fold
+
+VERSION_KEY = 'customers:ownership:version'
+REPORT_KEY = 'customers:ownership:{version}:{company_id}'
+REPORT_TTL = 24 * 60 * 60
+
+# Campos da Company usados para reconhecer acionistas que também são empresas do portal
+MATCH_FIELDS = ('full_company_name', 'previous_names', 'aliases_trade_names', 'cnpj', 'tax_vat_number', 'company_registration_number')
+IDENTIFIER_FIELDS = ('cnpj', 'tax_vat_number', 'company_registration_number')
+MIN_IDENTIFIER_LENGTH = 5
+MAX_DEPTH = 25
+
+HUNDRED = Decimal('100')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+class Holder(NamedTuple):
+    """A direct shareholder of a company; ``company_id`` is set when it is a portal company."""
+    key: str
+    name: str
+    company_id: Optional[int]
+    percentage: Decimal
+
+
+class EffectiveOwner(NamedTuple):
+    key: str
+    name: str
+    company_id: Optional[int]
+    percentage: Decimal
+
+
+class OwnershipReport(NamedTuple):
+    company_id: int
+    direct_total: Decimal
+    ubo_total: Decimal
+    effective_owners: list
+    effective_total: Decimal
+    cycles: list
+
+    @property
+    def direct_over_100(self):
+        return self.direct_total > HUNDRED
+
+    @property
+    def ubo_over_100(self):
+        return self.ubo_total > HUNDRED
+
+    @property
+    def effective_over_100(self):
+        return self.effective_total > HUNDRED
+
+    @property
+    def has_issues(self):
+        return bool(self.cycles) or self.direct_over_100 or self.ubo_over_100 or self.effective_over_100
+
+
+def _compact(value):
+    return ''.join(_WORD_RE.findall(fold(value)))
+
+
+class OwnershipGraph:
+    """Shareholder edges of every company plus the lookups used to match holders to companies."""
+
+    def __init__(self, companies, shareholders, ubos):
+        self.company_ids = set()
+        self._by_identifier = {}
+        by_name = defaultdict(set)
+        for company in companies:
+            self.company_ids.add(company['pk'])
+            for field in IDENTIFIER_FIELDS:
+                compact = _compact(company[field])
+                if len(compact) >= MIN_IDENTIFIER_LENGTH:
+                    self._by_identifier[compact] = company['pk']
+            for name in company_names(company):
+                key = normalize_name(name)
+                if key:
+                    by_name[key].add(company['pk'])
+        # Nomes que apontam para mais de uma empresa são ambíguos e não casam
+        self._by_name = {key: ids.pop() for key, ids in by_name.items() if len(ids) == 1}
+
+        self.holders = defaultdict(list)
+        for company_id, name, percentage in shareholders:
+            match = self.match_company(name)
+            key = f'company:{match}' if match is not None else f'name:{normalize_name(name) or name}'
+            self.holders[company_id].append(Holder(key, name, match, percentage))
+
+        self.ubo_totals = defaultdict(Decimal)
+        for company_id, percentage in ubos:
+            self.ubo_totals[company_id] += percentage
+
+        self._memo = {}
+
+    @classmethod
+    def load(cls):
+        """Build the graph of the whole portfolio with three queries."""
+        shareholders = MajorShareholder.objects.values_list(
+            'ownership_management__company_id', 'name_of_individual_company', 'percentage_of_ownership',
+        )
+        ubos = UltimateBeneficialOwner.objects.values_list('ownership_management__company_id', 'percentage_of_ownership')
+        return cls(Company.objects.values('pk', *MATCH_FIELDS), shareholders, ubos)
+
+    def match_company(self, name):
+        """Portal company a shareholder name refers to, or ``None``."""
+        for chunk in fold(name).split():
+            if any(ch.isdigit() for ch in chunk):
+                match = self._by_identifier.get(_compact(chunk))
+                if match is not None:
+                    return match
+        return self._by_name.get(normalize_name(name))
+
+    def _resolve(self, company_id, path):
+        """``({holder_key: (name, company_id, fraction)}, cycles, complete)`` for the owners of a company.
+
+        ``complete`` is false when a chain was cut at ``MAX_DEPTH``. Results
+        without cycles or cut chains are memoized, so each company is expanded
+        once per pass no matter how many chains reach it; a cut result depends
+        on the path it was reached by and is not reused.
+        """
+        memo = self._memo.get(company_id)
+        if memo is not None:
+            return memo
+        shares = {}
+        cycles = []
+        complete = True
+        for holder in self.holders.get(company_id, ()):
+            fraction = holder.percentage / HUNDRED
+            upstream = holder.company_id
+            if upstream is not None and upstream in path:
+                cycles.append([*path[path.index(upstream):], upstream])
+                continue
+            if upstream is not None and self.holders.get(upstream):
+                if len(path) < MAX_DEPTH:
+                    owners, upstream_cycles, upstream_complete = self._resolve(upstream, [*path, upstream])
+                    cycles.extend(upstream_cycles)
+                    complete = complete and upstream_complete
+                    for key, (name, owner_company, owner_fraction) in owners.items():
+                        previous = shares.get(key, (name, owner_company, Decimal(0)))[2]
+                        shares[key] = (name, owner_company, previous + fraction * owner_fraction)
+                    continue
+                complete = False
+            previous = shares.get(holder.key, (holder.name, upstream, Decimal(0)))[2]
+            shares[holder.key] = (holder.name, upstream, previous + fraction)
+        result = (shares, cycles, complete)
+        if not cycles and complete:
+            self._memo[company_id] = result
+        return result
+
+    def report(self, company_id):
+        shares, cycles, _ = self._resolve(company_id, [company_id])
+        owners = sorted(
+            (EffectiveOwner(key, name, owner_company, (fraction * HUNDRED).quantize(Decimal('0.0001')))
+             for key, (name, owner_company, fraction) in shares.items()),
+            key=lambda owner: -owner.percentage,
+        )
+        unique_cycles = list({tuple(cycle): cycle for cycle in cycles}.values())
+        return OwnershipReport(
+            company_id=company_id,
+            direct_total=sum((h.percentage for h in self.holders.get(company_id, ())), Decimal(0)),
+            ubo_total=self.ubo_totals.get(company_id, Decimal(0)),
+            effective_owners=owners,
+            effective_total=sum((o.percentage for o in owners), Decimal(0)),
+            cycles=unique_cycles,
+        )
+
+    def report_all(self):
+        return {company_id: self.report(company_id) for company_id in sorted(self.company_ids)}
+
+
+# --- Cache por empresa ---
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Versão nova (nunca usada) se a chave expirou ou foi descartada: nada antigo é servido
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY, 0)
+    return version
+
+
+def bump_ownership_version():
+    """Invalidate every cached report (any ownership change may affect chains elsewhere)."""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def compute_portfolio():
+    """Reports for every company in one batched pass; also refreshes the cache.
+
+    Meant for the ``ownership_report`` command (or a periodic job), never for a request.
+    """
+    version = _version()
+    reports = OwnershipGraph.load().report_all()
+    cache.set_many(
+        {REPORT_KEY.format(version=version, company_id=cid): report for cid, report in reports.items()},
+        REPORT_TTL,
+    )
+    return reports
+
+
+def ownership_report(company_id):
+    """Cached report of one company; a miss resolves (and caches) only this company."""
+    key = REPORT_KEY.format(version=_version(), company_id=company_id)
+    report = cache.get(key)
+    if report is None:
+        report = OwnershipGraph.load().report(company_id)
+        cache.set(key, report, REPORT_TTL)
+    return report
@@ -0,0 +1,203 @@
+"""Unified search over the people and entities linked to a company.
+
+Contacts, management, board members, UBOs, major shareholders and prior
+business relationships are copied into ``PartyIndexEntry``. Each entry's
+name, passport number and nationality are stored as tokens in
+``PartySearchTerm``, folded the same way as the company search
+(customers/search.py). Signals keep the index up to date one row at a
+time. ``rebuild_party_index`` rebuilds it in bulk.
+"""
+
+from typing import Callable, NamedTuple
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import (
+    IndividualContact, ManagementAndKeyEmployees, BoardOfDirectors,
+    UltimateBeneficialOwner, MajorShareholder, PriorBusinessRelationship,
+    PartyIndexEntry, PartySearchTerm,
+)
+from .search import index_tokens, query_tokens, rank_matches
+
+NAME_WEIGHT = 10
+PASSPORT_WEIGHT = 8
+NATIONALITY_WEIGHT = 2
+
+
+class PartySource(NamedTuple):
+    """How one model feeds the party index."""
+    model: type
+    select_related: tuple
+    company_of: Callable
+    describe: Callable
+
+
+def _via_ownership(obj):
+    return obj.ownership_management.company_id
+
+
+def _describe_contact(obj):
+    if not obj.is_active:
+        return None
+    return {
+        'name': f"{obj.first_name} {obj.last_name}".strip(),
+        'role': obj.position_job_title or '',
+        'passport_number': '',
+        'nationality': '',
+    }
+
+
+def _describe_person(role_field, nationality_field, passport_field=None, name_field='full_name'):
+    def describe(obj):
+        return {
+            'name': getattr(obj, name_field) or '',
+            'role': getattr(obj, role_field) or '',
+            'passport_number': (getattr(obj, passport_field) if passport_field else '') or '',
+            'nationality': getattr(obj, nationality_field) or '',
+        }
+    return describe
+
+
+def _describe_prior_relationship(obj):
+    return {
+        'name': obj.company_name or '',
+        'role': 'Prior business relationship',
+        'passport_number': '',
+        'nationality': '',
+    }
+
+
+PARTY_SOURCES = {
+    'contact': PartySource(IndividualContact, (), lambda obj: obj.company_id, _describe_contact),
+    'management': PartySource(
+        ManagementAndKeyEmployees, ('ownership_management',), _via_ownership,
+        _describe_person('job_title', 'nationality', 'passport_number'),
+    ),
+    'board': PartySource(
+        BoardOfDirectors, ('ownership_management',), _via_ownership,
+        _describe_person('board_position', 'nationality', 'passport_number'),
+    ),
+    'ubo': PartySource(
+        UltimateBeneficialOwner, ('ownership_management',), _via_ownership,
+        _describe_person('company_individual', 'nationality_registered_country'),
+    ),
+    'shareholder': PartySource(
+        MajorShareholder, ('ownership_management',), _via_ownership,
+        _describe_person('type_of_relationship', 'nationality_registered_country',
+                         name_field='name_of_individual_company'),
+    ),
+    'prior_relationship': PartySource(
+        PriorBusinessRelationship, ('business_information',),
+        lambda obj: obj.business_information.company_id, _describe_prior_relationship,
+    ),
+}
+
+SOURCE_FOR_MODEL = {spec.model: source for source, spec in PARTY_SOURCES.items()}
+
+
+def _values(source, obj):
+    spec = PARTY_SOURCES[source]
+    values = spec.describe(obj)
+    if values is None:
+        return None
+    values['company_id'] = spec.company_of(obj)
+    for field in ('name', 'role', 'passport_number', 'nationality'):
+        values[field] = values[field][:PartyIndexEntry._meta.get_field(field).max_length]
+    return values
+
+
+def party_terms(entry):
+    """``{term: weight}`` for an index entry (the highest weight wins for repeated tokens)."""
+    terms = {}
+    for text, weight, identifier in (
+        (entry.name, NAME_WEIGHT, False),
+        (entry.passport_number, PASSPORT_WEIGHT, True),
+        (entry.nationality, NATIONALITY_WEIGHT, False),
+    ):
+        for token in index_tokens(text, identifier=identifier):
+            if weight > terms.get(token, 0):
+                terms[token] = weight
+    return terms
+
+
+def _term_rows(entry):
+    return [PartySearchTerm(party_id=entry.pk, term=term, weight=weight) for term, weight in party_terms(entry).items()]
+
+
+def index_party(source, obj):
+    """Create/refresh the index entry of one source object; no writes when nothing changed."""
+    values = _values(source, obj)
+    if values is None:
+        remove_party(source, obj.pk)
+        return None
+    with transaction.atomic():
+        entry = PartyIndexEntry.objects.filter(source=source, object_id=obj.pk).first()
+        if entry is not None and all(getattr(entry, f) == v for f, v in values.items()):
+            return entry
+        if entry is None:
+            entry = PartyIndexEntry(source=source, object_id=obj.pk)
+        for field, value in values.items():
+            setattr(entry, field, value)
+        entry.save()
+        PartySearchTerm.objects.filter(party=entry).delete()
+        PartySearchTerm.objects.bulk_create(_term_rows(entry))
+    return entry
+
+
+def remove_party(source, object_id):
+    PartyIndexEntry.objects.filter(source=source, object_id=object_id).delete()
+
+
+def rebuild_party_index(batch_size=500):
+    """Rebuild the whole index from the source tables; return the number of entries."""
+    total = 0
+    with transaction.atomic():
+        PartyIndexEntry.objects.all().delete()
+        for source, spec in PARTY_SOURCES.items():
+            queryset = spec.model.objects.select_related(*spec.select_related).order_by('pk')
+            batch = []
+            for obj in queryset.iterator(chunk_size=batch_size):
+                values = _values(source, obj)
+                if values is not None:
+                    batch.append(PartyIndexEntry(source=source, object_id=obj.pk, **values))
+                if len(batch) >= batch_size:
+                    total += _flush(batch, batch_size)
+                    batch = []
+            if batch:
+                total += _flush(batch, batch_size)
+    return total
+
+
+def _flush(entries, batch_size):
+    entries = PartyIndexEntry.objects.bulk_create(entries, batch_size=batch_size)
+    PartySearchTerm.objects.bulk_create(
+        [row for entry in entries for row in _term_rows(entry)], batch_size=batch_size,
+    )
+    return len(entries)
+
+
+def search_parties(query, companies=None, limit=200):
+    """Return ``[(company, [entries])]`` for a query, best-ranked company first.
+
+    Matching entries and their companies come from a single query. Each
+    entry is annotated with ``search_rank``. ``companies`` optionally limits
+    the search to a ``Company`` queryset.
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return []
+    ranked = rank_matches(PartySearchTerm.objects.all(), 'party', tokens)
+    entries = PartyIndexEntry.objects.filter(pk__in=ranked.values('party'))
+    if companies is not None:
+        entries = entries.filter(company__in=companies)
+    entries = (
+        entries.select_related('company')
+        .annotate(search_rank=Subquery(ranked.filter(party=OuterRef('pk')).values('rank')[:1]))
+        .order_by('-search_rank', 'name')[:limit]
+    )
+    grouped = {}
+    for entry in entries:
+        grouped.setdefault(entry.company_id, (entry.company, []))[1].append(entry)
+    # A ordem de inserção já segue o melhor rank de cada empresa
+    return list(grouped.values())
@@ -19,49 +19,127 @@ INTERNAL_GROUP_NAMES = {name.lower() for name in getattr(settings, "PORTAL_INTER
 CLIENT_GROUP_NAMES = {name.lower() for name in getattr(settings, "PORTAL_CLIENT_GROUPS", DEFAULT_CLIENT_GROUPS)}
 
 
-def is_internal_user(user) -> bool:
-    """Return True when the given user should be treated as an internal member."""
-    if not getattr(user, "is_authenticated", False):
-        return False
-    if user.is_superuser or user.is_staff:
-        return True
+# Atributo usado para memorizar os grupos no próprio objeto do usuário. Como
+# request.user é o mesmo objeto durante toda a requisição, cada helper abaixo
+# consulta os grupos no máximo uma vez por requisição.
+ROLES_CACHE_ATTR = "_portal_roles"
+
+
+class UserRoles:
+    """Group names of a user loaded once, plus the role checks derived from them."""
 
-    group_names = {name.lower() for name in user.groups.values_list("name", flat=True)}
-    if not group_names:
-        return False
+    def __init__(self, user, group_names):
+        self.user = user
+        self.group_names = frozenset(group_names)
+        self._lower_names = frozenset(name.lower() for name in self.group_names)
 
-    if group_names & INTERNAL_GROUP_NAMES:
+    def __contains__(self, group_name):
+        return group_name in self.group_names
+
+    def __iter__(self):
+        return iter(self.group_names)
+
+    def has_group(self, group_name) -> bool:
+        return group_name in self.group_names
+
+    @property
+    def is_staff_member(self) -> bool:
+        """Member of the 'Equipe' group (full access to the onboarding steps)."""
+        return self.has_group("Equipe")
+
+    @property
+    def is_internal(self) -> bool:
+        user = self.user
+        if not getattr(user, "is_authenticated", False):
+            return False
+        if user.is_superuser or user.is_staff:
+            return True
+
+        group_names = self._lower_names
+        if not group_names:
+            return False
+
+        if group_names & INTERNAL_GROUP_NAMES:
+            return True
+
+        # Consider the user external when they belong only to explicit client groups.
+        if group_names <= CLIENT_GROUP_NAMES:
+            return False
+
+        # If the user has any other group, treat as internal by default so we don't
+        # accidentally expose restricted areas to clients.
         return True
 
-    # Consider the user external when they belong only to explicit client groups.
-    if group_names <= CLIENT_GROUP_NAMES:
-        return False
+    @property
+    def can_start_onboarding(self) -> bool:
+        user = self.user
+        if not getattr(user, "is_authenticated", False):
+            return False
+        if self.is_internal:
+            return True
 
-    # If the user has any other group, treat as internal by default so we don't
-    # accidentally expose restricted areas to clients.
-    return True
+        if not self._lower_names or self._lower_names <= CLIENT_GROUP_NAMES:
+            return True
 
+        try:
+            if user.has_perm("customers.add_company"):
+                return True
+        except Exception:
+            return True
 
-def can_start_onboarding(user) -> bool:
-    """Return True when the user may create a new onboarding/company."""
-    if not getattr(user, "is_authenticated", False):
-        return False
-    if is_internal_user(user):
         return True
 
+
+def get_roles(user) -> UserRoles:
+    """Return the memoized roles of the user, loading the group names on first use."""
+    roles = getattr(user, ROLES_CACHE_ATTR, None)
+    if roles is None:
+        if getattr(user, "is_authenticated", False):
+            group_names = user.groups.values_list("name", flat=True)
+        else:
+            group_names = ()
+        roles = set_roles(user, group_names)
+    return roles
+
+
+def set_roles(user, group_names) -> UserRoles:
+    """Prime the per-request memo with already known group names."""
+    roles = UserRoles(user, group_names)
     try:
-        group_names = {name.lower() for name in user.groups.values_list("name", flat=True)}
-    except Exception:
-        group_names = set()
+        setattr(user, ROLES_CACHE_ATTR, roles)
+    except AttributeError:
+        pass
+    return roles
 
-    if not group_names or group_names <= CLIENT_GROUP_NAMES:
-        return True
 
+def clear_roles(user) -> None:
+    """Drop the memo so the next check reloads the groups (e.g. after a change)."""
     try:
-        if user.has_perm("customers.add_company"):
-            return True
-    except Exception:
-        return True
+        delattr(user, ROLES_CACHE_ATTR)
+    except AttributeError:
+        pass
+
+
+def get_group_names(user) -> frozenset:
+    """Names of the groups the user belongs to (memoized per request)."""
+    return get_roles(user).group_names
+
 
-    return True
+def has_group(user, group_name) -> bool:
+    """Same as ``user.groups.filter(name=group_name).exists()`` but served from the memo."""
+    return get_roles(user).has_group(group_name)
 
+
+def is_staff_member(user) -> bool:
+    """Return True when the user belongs to the 'Equipe' group."""
+    return get_roles(user).is_staff_member
+
+
+def is_internal_user(user) -> bool:
+    """Return True when the given user should be treated as an internal member."""
+    return get_roles(user).is_internal
+
+
+def can_start_onboarding(user) -> bool:
+    """Return True when the user may create a new onboarding/company."""
+    return get_roles(user).can_start_onboarding
@@ -0,0 +1,215 @@
+"""Onboarding progress computed with a fixed number of queries.
+
+Each step in ``FORM_MODEL_MAPPING`` is backed by a model related to
+``Company``. Instead of issuing one ``exists()``/``get()`` per step and per
+company, the helpers below annotate the company queryset with one ``Exists()``
+subquery per step model, so a single company or a whole page of companies is
+resolved in one query.
+"""
+
+from typing import NamedTuple, Optional
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Company
+from .utils import ONBOARDING_STEPS, FORM_MODEL_MAPPING
+
+# Etapas visíveis apenas para a Equipe interna
+RESTRICTED_STEPS = ('compliance_analysis', 'status_control')
+
+# Ordem fixa das etapas: o índice de cada slug é o bit correspondente na máscara
+STEP_SLUGS = list(ONBOARDING_STEPS.keys())
+STEP_BITS = {slug: 1 << index for index, slug in enumerate(STEP_SLUGS)}
+
+# Modelo de cada etapa (exceto a própria Company) -> slug, usado pelos sinais
+STEP_FOR_MODEL = {
+    FORM_MODEL_MAPPING[slug]['model']: slug
+    for slug in STEP_SLUGS
+    if FORM_MODEL_MAPPING[slug]['model'] is not Company
+}
+
+
+def _annotation_name(slug):
+    return f'_step_{slug}_done'
+
+
+def visible_steps(is_internal):
+    """Return the ordered step slugs that count towards progress for the audience."""
+    if is_internal:
+        return list(STEP_SLUGS)
+    return [s for s in STEP_SLUGS if s not in RESTRICTED_STEPS]
+
+
+def visible_mask(is_internal):
+    """Bitmask with every step visible to the audience switched on."""
+    mask = 0
+    for slug in visible_steps(is_internal):
+        mask |= STEP_BITS[slug]
+    return mask
+
+
+class OnboardingProgress(NamedTuple):
+    """Compact per-company progress result shared by the onboarding views."""
+    mask: int
+    completed_count: int
+    total_steps: int
+    percentage: int
+    next_step: Optional[str]
+
+    @property
+    def completed_steps(self):
+        return {slug for slug in STEP_SLUGS if self.mask & STEP_BITS[slug]}
+
+    def is_completed(self, slug):
+        return bool(self.mask & STEP_BITS.get(slug, 0))
+
+    @property
+    def next_step_title(self):
+        if not self.next_step:
+            return None
+        return ONBOARDING_STEPS.get(self.next_step, self.next_step).title()
+
+
+def step_annotations():
+    """``Exists()`` annotation per step model (the Company step itself is checked in Python)."""
+    annotations = {}
+    for slug in STEP_SLUGS:
+        Model = FORM_MODEL_MAPPING[slug]['model']
+        if Model is Company:
+            continue
+        annotations[_annotation_name(slug)] = Exists(Model.objects.filter(company=OuterRef('pk')))
+    return annotations
+
+
+def with_progress(queryset):
+    """Annotate a ``Company`` queryset with the step completion flags."""
+    return queryset.annotate(**step_annotations())
+
+
+def _company_step_done(company):
+    return bool(company.full_company_name and company.registered_business_address)
+
+
+def completed_mask(company):
+    """Build the completed-step bitmask of a company annotated by :func:`with_progress`."""
+    mask = 0
+    for slug in STEP_SLUGS:
+        if FORM_MODEL_MAPPING[slug]['model'] is Company:
+            done = _company_step_done(company)
+        else:
+            done = getattr(company, _annotation_name(slug), False)
+        if done:
+            mask |= STEP_BITS[slug]
+    return mask
+
+
+def progress_from_mask(mask, is_internal):
+    """Translate a completed-step bitmask into the progress seen by the audience."""
+    steps = visible_steps(is_internal)
+    completed = 0
+    next_step = None
+    for slug in steps:
+        if mask & STEP_BITS[slug]:
+            completed += 1
+        elif next_step is None:
+            next_step = slug
+    total = len(steps)
+    percentage = round(completed / total * 100) if total else 0
+    return OnboardingProgress(
+        mask=mask & visible_mask(is_internal),
+        completed_count=completed,
+        total_steps=total,
+        percentage=percentage,
+        next_step=next_step,
+    )
+
+
+def progress_for_queryset(queryset, is_internal):
+    """Yield ``(company, progress)`` for every company in the queryset using a single query."""
+    for company in with_progress(queryset):
+        yield company, progress_from_mask(completed_mask(company), is_internal)
+
+
+def progress_for_company(company, is_internal):
+    """Return the progress of one company with a single query."""
+    annotations = step_annotations()
+    flags = Company.objects.filter(pk=company.pk).annotate(**annotations).values(*annotations).first() or {}
+    # Os campos da própria empresa vêm da instância recebida (pode ter acabado de ser salva)
+    for name, value in flags.items():
+        setattr(company, name, value)
+    return progress_from_mask(completed_mask(company), is_internal)
+
+
+# --- Snapshot persistido em Company ---
+
+def snapshot_values(mask):
+    """Field values of the persisted progress snapshot for a completed-step bitmask."""
+    return {
+        'onboarding_progress_mask': mask,
+        'onboarding_progress_internal': progress_from_mask(mask, True).percentage,
+        'onboarding_progress_client': progress_from_mask(mask, False).percentage,
+    }
+
+
+def stored_progress(company, is_internal):
+    """Progress read from the snapshot columns, without touching the database."""
+    return progress_from_mask(company.onboarding_progress_mask, is_internal)
+
+
+def set_step_state(company_id, slug, done):
+    """Switch one step bit of the stored snapshot on/off; only writes when it changes."""
+    bit = STEP_BITS[slug]
+    with transaction.atomic():
+        current = (
+            Company.objects.select_for_update()
+            .filter(pk=company_id)
+            .values_list('onboarding_progress_mask', flat=True)
+            .first()
+        )
+        if current is None:
+            return None
+        mask = current | bit if done else current & ~bit
+        if mask != current:
+            Company.objects.filter(pk=company_id).update(**snapshot_values(mask))
+    return mask
+
+
+def sync_company_step(company):
+    """Refresh the bit of the steps backed by the Company fields themselves."""
+    done = _company_step_done(company)
+    mask = company.onboarding_progress_mask
+    for slug in STEP_SLUGS:
+        if FORM_MODEL_MAPPING[slug]['model'] is Company:
+            mask = set_step_state(company.pk, slug, done)
+    if mask is not None:
+        # Mantém a instância em memória coerente com o banco
+        for field, value in snapshot_values(mask).items():
+            setattr(company, field, value)
+
+
+def rebuild_progress(queryset=None, batch_size=500):
+    """Recompute the snapshot for every company in the queryset; return how many changed."""
+    if queryset is None:
+        queryset = Company.objects.all()
+    queryset = with_progress(queryset.order_by('pk').only(
+        'pk', 'full_company_name', 'registered_business_address',
+        'onboarding_progress_mask', 'onboarding_progress_internal', 'onboarding_progress_client',
+    ))
+    fields = list(snapshot_values(0))
+    changed = []
+    total = 0
+    for company in queryset.iterator(chunk_size=batch_size):
+        values = snapshot_values(completed_mask(company))
+        if any(getattr(company, f) != v for f, v in values.items()):
+            for f, v in values.items():
+                setattr(company, f, v)
+            changed.append(company)
+        if len(changed) >= batch_size:
+            Company.objects.bulk_update(changed, fields)
+            total += len(changed)
+            changed = []
+    if changed:
+        Company.objects.bulk_update(changed, fields)
+        total += len(changed)
+    return total
@@ -0,0 +1,127 @@
+"""Reverse Due Diligence thread rendering helpers.
+
+A thread is shown one page at a time, newest messages last, with keyset
+pagination on ``(created_at, id)``: the "load older" link carries the
+position of the oldest message on screen and the next page is the
+``RDD_MESSAGES_PER_PAGE`` messages before it, using the
+``(thread, created_at, id)`` index. Authors come from a join and the
+attachments of the whole page from one prefetch query, so a page costs the
+same number of queries however long the thread is.
+
+The message/attachment totals shown in the header are counted with one
+aggregate query and kept in the cache until a message or attachment of the
+thread changes (see the signals).
+
+Each thread also carries ``message_count``, ``last_message_at`` and
+``last_author``, updated by ``ReverseDueDiligenceMessage.save()`` in the
+transaction that inserts the message, and every participant has a
+``ReverseDueDiligenceReadState`` with the ``message_count`` they last saw.
+A thread is unread while its count is ahead of the user's cursor, which
+:func:`with_unread` computes for a whole list with one join.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, FilteredRelation, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import (
+    ReverseDueDiligence, ReverseDueDiligenceAttachment, ReverseDueDiligenceMessage, ReverseDueDiligenceReadState,
+)
+
+COUNTS_CACHE_KEY = 'customers:rdd:counts:{}'
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _page_size():
+    return int(getattr(settings, 'RDD_MESSAGES_PER_PAGE', 50))
+
+
+def format_cursor(message):
+    """Opaque position of ``message``: microseconds since the epoch and id."""
+    return f'{(message.created_at - _EPOCH) // timedelta(microseconds=1)}-{message.pk}'
+
+
+def parse_cursor(value):
+    """``(created_at, id)`` of a cursor, or ``None`` if it is missing or malformed."""
+    try:
+        micros, pk = (int(part) for part in (value or '').split('-'))
+    except ValueError:
+        return None
+    return _EPOCH + timedelta(microseconds=micros), pk
+
+
+def message_page(thread, before=None, limit=None):
+    """Messages of ``thread`` before the ``before`` cursor, oldest first.
+
+    Returns ``(messages, older_cursor)``; ``older_cursor`` is ``None`` when
+    there is nothing older.
+    """
+    limit = limit or _page_size()
+    queryset = ReverseDueDiligenceMessage.objects.filter(thread=thread)
+    position = parse_cursor(before)
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    messages = list(
+        queryset.select_related('author')
+        .prefetch_related(Prefetch('attachments', queryset=ReverseDueDiligenceAttachment.objects.order_by('uploaded_at', 'pk')))
+        .order_by('-created_at', '-pk')[:limit + 1]
+    )
+    has_older = len(messages) > limit
+    messages = messages[:limit][::-1]
+    return messages, format_cursor(messages[0]) if has_older else None
+
+
+def thread_counts(thread_id):
+    """``{'messages': n, 'attachments': n}`` of a thread, served from the cache."""
+    key = COUNTS_CACHE_KEY.format(thread_id)
+    counts = cache.get(key)
+    if counts is None:
+        counts = ReverseDueDiligenceMessage.objects.filter(thread_id=thread_id).aggregate(
+            messages=Count('pk', distinct=True), attachments=Count('attachments'),
+        )
+        cache.set(key, counts, int(getattr(settings, 'RDD_COUNTS_CACHE_TTL', 300)))
+    return counts
+
+
+def forget_counts(thread_id):
+    cache.delete(COUNTS_CACHE_KEY.format(thread_id))
+
+
+def refresh_thread_stats(thread_ids=None):
+    """Recompute the denormalized counters (after deletes or bulk inserts) in one UPDATE."""
+    messages = ReverseDueDiligenceMessage.objects.filter(thread=OuterRef('pk'))
+    latest = messages.order_by('-created_at', '-pk')
+    queryset = ReverseDueDiligence.objects.all()
+    if thread_ids is not None:
+        queryset = queryset.filter(pk__in=thread_ids)
+    return queryset.update(
+        message_count=Coalesce(Subquery(messages.order_by().values('thread').annotate(n=Count('pk')).values('n')), Value(0)),
+        last_message_at=Subquery(latest.values('created_at')[:1]),
+        last_author=Subquery(latest.values('author')[:1]),
+    )
+
+
+def with_unread(queryset, user):
+    """Annotate ``unread_count`` (messages not seen by ``user``) through one LEFT JOIN on the read cursors."""
+    return queryset.annotate(
+        my_read_state=FilteredRelation('read_states', condition=Q(read_states__user=user)),
+    ).annotate(
+        unread_count=Greatest(F('message_count') - Coalesce(F('my_read_state__read_count'), Value(0)), Value(0)),
+    )
+
+
+def mark_thread_read(user, thread):
+    """Move the user's cursor to the thread's current count; ``False`` if there was nothing unread."""
+    read_count = ReverseDueDiligenceReadState.objects.filter(thread=thread, user=user).values_list('read_count', flat=True).first()
+    if read_count is not None and read_count >= thread.message_count:
+        return False
+    ReverseDueDiligenceReadState.objects.bulk_create(
+        [ReverseDueDiligenceReadState(thread=thread, user=user, read_count=thread.message_count, last_read_at=timezone.now())],
+        update_conflicts=True, unique_fields=['thread', 'user'], update_fields=['read_count', 'last_read_at'],
+    )
+    return True
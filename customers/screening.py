@@ -0,0 +1,358 @@
+"""Local sanctions/watchlist screening.
+
+The watchlist is a file on disk (``SANCTIONS_WATCHLIST_PATH``): a CSV with a
+``name`` column (optionally ``uid``, ``type``, ``programs`` and ``aliases``
+separated by ``;``), the headerless OFAC ``sdn.csv`` export, or a JSON list of
+objects with the same keys. It is loaded once per process into a trigram
+index and reloaded only when the file changes.
+
+Names are accent-folded (customers/search.py), stripped of legal suffixes
+("Ltda", "S.A.", "Inc") and their words sorted, so "SMITH, John" and "John
+Smith" compare equal. A match is scored with the Dice coefficient of the two
+trigram sets; only the watchlist names sharing at least one trigram with the
+screened name are scored.
+
+A company is screened with its own names plus its UBOs, board members and
+shareholders, read from the party index (customers/parties.py). Hits are
+stored in ``SanctionsScreeningHit``; ``screen_sanctions`` re-screens the whole
+portfolio in a process pool after the list is refreshed.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Company, PartyIndexEntry, SanctionsScreeningHit, SanctionsScreeningRun
+from .search import fold
+
+# Origens do índice de partes triadas junto com a empresa
+SCREENED_SOURCES = ('ubo', 'board', 'shareholder')
+
+# Sufixos societários e partículas que não distinguem um nome de outro
+NAME_STOPWORDS = frozenset({
+    'ltda', 'sa', 'me', 'epp', 'eireli', 'cia', 'inc', 'llc', 'ltd', 'limited',
+    'corp', 'corporation', 'co', 'company', 'gmbh', 'ag', 'plc', 'bv', 'nv',
+    'the', 'de', 'da', 'do', 'das', 'dos', 'e', 'of', 'and',
+})
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_ALIAS_SPLIT_RE = re.compile(r'[;\n]+')
+# OFAC usa "-0-" para campos vazios no sdn.csv
+OFAC_EMPTY = '-0-'
+
+
+class WatchlistEntry(NamedTuple):
+    uid: str
+    name: str
+    type: str
+    programs: str
+    aliases: tuple
+
+
+class ScreeningMatch(NamedTuple):
+    company_id: int
+    source: str
+    object_id: int
+    screened_name: str
+    entry: WatchlistEntry
+    score: float
+
+
+def normalize_name(name):
+    """Comparable form of a name: folded words without legal suffixes, sorted."""
+    # "S.A." -> "sa": abreviações com ponto viram uma palavra só
+    words = _WORD_RE.findall(fold(name).replace('.', ''))
+    kept = [w for w in words if w not in NAME_STOPWORDS]
+    return ' '.join(sorted(kept or words))
+
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# --- Carga da lista ---
+
+def _clean(value):
+    value = (value or '').strip()
+    return '' if value == OFAC_EMPTY else value
+
+
+def _split_aliases(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_clean(v) for v in value if _clean(v))
+    return tuple(a.strip() for a in _ALIAS_SPLIT_RE.split(_clean(value)) if a.strip())
+
+
+def _entry_from_mapping(row, position):
+    lowered = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    name = _clean(lowered.get('name') or lowered.get('sdn_name'))
+    if not name:
+        return None
+    programs = lowered.get('programs') or lowered.get('program') or ''
+    if isinstance(programs, (list, tuple)):
+        programs = '; '.join(programs)
+    return WatchlistEntry(
+        uid=_clean(str(lowered.get('uid') or lowered.get('id') or lowered.get('ent_num') or position)),
+        name=name,
+        type=_clean(lowered.get('type') or lowered.get('sdn_type')),
+        programs=_clean(programs),
+        aliases=_split_aliases(lowered.get('aliases') or ()),
+    )
+
+
+def _read_csv(handle):
+    rows = csv.reader(handle)
+    first = next(rows, None)
+    if first is None:
+        return []
+    header = [col.strip().lower() for col in first]
+    if 'name' in header or 'sdn_name' in header:
+        return [
+            entry for position, row in enumerate(rows, start=1)
+            if (entry := _entry_from_mapping(dict(zip(header, row)), position))
+        ]
+    # sdn.csv da OFAC: ent_num, SDN_Name, SDN_Type, Program, ... (sem cabeçalho)
+    entries = []
+    for row in [first, *rows]:
+        if len(row) < 2 or not _clean(row[1]):
+            continue
+        entries.append(WatchlistEntry(
+            uid=_clean(row[0]),
+            name=_clean(row[1]),
+            type=_clean(row[2]) if len(row) > 2 else '',
+            programs=_clean(row[3]) if len(row) > 3 else '',
+            aliases=(),
+        ))
+    return entries
+
+
+def load_watchlist(path):
+    """Parse a CSV or JSON watchlist file into ``WatchlistEntry`` tuples."""
+    with open(path, encoding='utf-8-sig', newline='') as handle:
+        if str(path).lower().endswith('.json'):
+            data = json.load(handle)
+            if isinstance(data, dict):
+                data = data.get('entries', [])
+            return [
+                entry for position, row in enumerate(data, start=1)
+                if (entry := _entry_from_mapping(row, position))
+            ]
+        return _read_csv(handle)
+
+
+def file_version(path):
+    """SHA-256 of the watchlist file, recorded with every hit and run."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class WatchlistIndex:
+    """In-memory trigram index over the names and aliases of a watchlist."""
+
+    def __init__(self, entries, version=''):
+        self.entries = list(entries)
+        self.version = version
+        self._names = []  # (índice da entrada, quantidade de trigramas)
+        self._postings = defaultdict(list)
+        for entry_idx, entry in enumerate(self.entries):
+            for name in dict.fromkeys((entry.name, *entry.aliases)):
+                grams = trigrams(normalize_name(name))
+                if len(grams) < 2:
+                    continue
+                name_idx = len(self._names)
+                self._names.append((entry_idx, len(grams)))
+                for gram in grams:
+                    self._postings[gram].append(name_idx)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, name, threshold):
+        """``[(entry, score)]`` with a Dice similarity of at least ``threshold``, best first."""
+        grams = trigrams(normalize_name(name))
+        if len(grams) < 2:
+            return []
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        best = {}
+        size = len(grams)
+        for name_idx, common in shared.items():
+            entry_idx, other_size = self._names[name_idx]
+            score = 2 * common / (size + other_size)
+            if score >= threshold and score > best.get(entry_idx, 0):
+                best[entry_idx] = score
+        return sorted(
+            ((self.entries[idx], round(score, 3)) for idx, score in best.items()),
+            key=lambda item: -item[1],
+        )
+
+
+_index_lock = threading.Lock()
+_index_cache = {}
+
+
+def watchlist_path():
+    path = getattr(settings, 'SANCTIONS_WATCHLIST_PATH', '')
+    if not path:
+        raise ImproperlyConfigured("SANCTIONS_WATCHLIST_PATH não configurado.")
+    return path
+
+
+def default_threshold():
+    return float(getattr(settings, 'SANCTIONS_MATCH_THRESHOLD', 0.82))
+
+
+def get_index(path=None):
+    """Index of the watchlist at ``path``, rebuilt only when the file changes."""
+    path = path or watchlist_path()
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _index_lock:
+        cached = _index_cache.get(path)
+        if cached is None or cached[0] != key:
+            index = WatchlistIndex(load_watchlist(path), version=file_version(path))
+            cached = _index_cache[path] = (key, index)
+    return cached[1]
+
+
+# --- Candidatos e triagem ---
+
+def company_names(company):
+    """Distinct names of a company row (``values()``): legal name, previous names and aliases."""
+    names = [company['full_company_name']]
+    for field in ('previous_names', 'aliases_trade_names'):
+        names.extend(a.strip() for a in _ALIAS_SPLIT_RE.split(company[field] or '') if a.strip())
+    return dict.fromkeys(n for n in names if n)
+
+
+def collect_candidates(company_ids=None):
+    """``{company_id: [(source, object_id, name)]}`` for the companies, in two queries."""
+    companies = Company.objects.order_by('pk').values('pk', 'full_company_name', 'previous_names', 'aliases_trade_names')
+    parties = PartyIndexEntry.objects.filter(source__in=SCREENED_SOURCES).values_list('company_id', 'source', 'object_id', 'name')
+    if company_ids is not None:
+        companies = companies.filter(pk__in=company_ids)
+        parties = parties.filter(company_id__in=company_ids)
+    candidates = {
+        company['pk']: [('company', company['pk'], name) for name in company_names(company)]
+        for company in companies
+    }
+    for company_id, source, object_id, name in parties:
+        if company_id in candidates:
+            candidates[company_id].append((source, object_id, name))
+    return candidates
+
+
+def screen_candidates(index, candidates, threshold):
+    """Match every candidate name; returns ``ScreeningMatch`` tuples (no database access)."""
+    matches = []
+    for company_id, names in candidates.items():
+        for source, object_id, name in names:
+            for entry, score in index.match(name, threshold):
+                matches.append(ScreeningMatch(company_id, source, object_id, name, entry, score))
+    return matches
+
+
+_HIT_LIMITS = {
+    field: SanctionsScreeningHit._meta.get_field(field).max_length
+    for field in ('screened_name', 'list_uid', 'list_name', 'list_type', 'programs')
+}
+
+
+def _hit_row(match, version):
+    return SanctionsScreeningHit(
+        company_id=match.company_id,
+        source=match.source,
+        object_id=match.object_id,
+        screened_name=match.screened_name[:_HIT_LIMITS['screened_name']],
+        list_uid=match.entry.uid[:_HIT_LIMITS['list_uid']],
+        list_name=match.entry.name[:_HIT_LIMITS['list_name']],
+        list_type=match.entry.type[:_HIT_LIMITS['list_type']],
+        programs=match.entry.programs[:_HIT_LIMITS['programs']],
+        score=match.score,
+        list_version=version,
+    )
+
+
+def _store(company_ids, matches, version, batch_size=500):
+    with transaction.atomic():
+        hits = SanctionsScreeningHit.objects.all()
+        if company_ids is not None:
+            hits = hits.filter(company_id__in=company_ids)
+        hits.delete()
+        SanctionsScreeningHit.objects.bulk_create([_hit_row(m, version) for m in matches], batch_size=batch_size)
+
+
+def screen_company(company, threshold=None, path=None):
+    """Screen one company and its parties now and replace its stored hits."""
+    index = get_index(path)
+    threshold = default_threshold() if threshold is None else threshold
+    matches = screen_candidates(index, collect_candidates([company.pk]), threshold)
+    _store([company.pk], matches, index.version)
+    return matches
+
+
+def _screen_chunk(path, threshold, candidates):
+    # Executado nos processos do pool: cada worker carrega o índice uma única vez
+    return screen_candidates(get_index(path), candidates, threshold)
+
+
+def _chunks(candidates, size):
+    items = list(candidates.items())
+    for start in range(0, len(items), size):
+        yield dict(items[start:start + size])
+
+
+def screen_portfolio(path=None, threshold=None, workers=None, chunk_size=200, only_if_changed=False):
+    """Re-screen every company; return the ``SanctionsScreeningRun`` (``None`` when skipped).
+
+    With ``workers`` > 1 the matching runs in a process pool; the database is
+    read before and written after it, only in this process.
+    """
+    path = path or watchlist_path()
+    threshold = default_threshold() if threshold is None else threshold
+    index = get_index(path)
+    if only_if_changed:
+        last = SanctionsScreeningRun.objects.first()
+        if last is not None and last.list_version == index.version and last.threshold == threshold:
+            return None
+    if workers is None:
+        workers = int(getattr(settings, 'SANCTIONS_SCREENING_WORKERS', 0)) or os.cpu_count() or 1
+
+    started_at = timezone.now()
+    candidates = collect_candidates()
+    if workers > 1 and len(candidates) > chunk_size:
+        # Os processos filhos não devem herdar conexões abertas
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            futures = [pool.submit(_screen_chunk, path, threshold, chunk) for chunk in _chunks(candidates, chunk_size)]
+            matches = [m for future in futures for m in future.result()]
+    else:
+        matches = screen_candidates(index, candidates, threshold)
+
+    _store(None, matches, index.version)
+    return SanctionsScreeningRun.objects.create(
+        list_version=index.version,
+        list_path=str(path),
+        threshold=threshold,
+        companies_screened=len(candidates),
+        hits=len(matches),
+        started_at=started_at,
+        finished_at=timezone.now(),
+    )
@@ -0,0 +1,188 @@
+"""Indexed, accent-folded company search.
+
+Every company is broken into tokens stored in ``CompanySearchTerm``.
+Tokens are lowercased and accent-folded, so "sao paulo" finds "São Paulo".
+Identifiers (CNPJ, tax/VAT and registration number) are also stored
+without punctuation, so a CNPJ matches with or without its mask. A search
+is a prefix lookup of each query token on the ``term`` index,
+grouped by company and ranked by the weight of the fields that matched.
+"""
+
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Q, Subquery, Value, When
+
+from .models import Company, CompanySearchTerm
+
+# Peso de cada campo no ranking (nome > identificadores > nomes anteriores/aliases > endereço)
+FIELD_WEIGHTS = {
+    'full_company_name': 10,
+    'cnpj': 8,
+    'tax_vat_number': 8,
+    'company_registration_number': 8,
+    'previous_names': 6,
+    'aliases_trade_names': 6,
+    'registered_business_address': 2,
+}
+IDENTIFIER_FIELDS = ('cnpj', 'tax_vat_number', 'company_registration_number')
+
+MAX_TERM_LENGTH = CompanySearchTerm._meta.get_field('term').max_length
+MAX_QUERY_TOKENS = 8
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    """Lowercase and strip accents: ``'São Paulo'`` -> ``'sao paulo'``."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def index_tokens(text, identifier=False):
+    """Tokens stored for one field value.
+
+    Each whitespace-separated chunk yields its words plus, when it has
+    punctuation inside, the words glued together ("S.A." -> s, a, sa). An
+    identifier also yields its whole value without separators.
+    """
+    tokens = []
+    folded = fold(text)
+    for chunk in folded.split():
+        parts = _WORD_RE.findall(chunk)
+        tokens.extend(parts)
+        if len(parts) > 1:
+            tokens.append(''.join(parts))
+    if identifier:
+        compact = ''.join(_WORD_RE.findall(folded))
+        if compact:
+            tokens.append(compact)
+    return [token[:MAX_TERM_LENGTH] for token in dict.fromkeys(tokens)]
+
+
+def query_tokens(query):
+    """Tokens looked up for a search string.
+
+    A chunk with digits is treated as an identifier and searched without its
+    mask (``12.345.678/0001-90`` -> ``12345678000190``); other chunks are split
+    into words.
+    """
+    tokens = []
+    for chunk in fold(query).split():
+        parts = _WORD_RE.findall(chunk)
+        if any(ch.isdigit() for ch in chunk):
+            tokens.append(''.join(parts))
+        else:
+            tokens.extend(parts)
+    tokens = [token[:MAX_TERM_LENGTH] for token in dict.fromkeys(tokens) if token]
+    return tokens[:MAX_QUERY_TOKENS]
+
+
+def company_terms(company):
+    """``{term: weight}`` for a company (the highest weight wins for repeated tokens)."""
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in index_tokens(getattr(company, field), identifier=field in IDENTIFIER_FIELDS):
+            if weight > terms.get(token, 0):
+                terms[token] = weight
+    return terms
+
+
+def _term_rows(company):
+    return [
+        CompanySearchTerm(company_id=company.pk, term=term, weight=weight)
+        for term, weight in company_terms(company).items()
+    ]
+
+
+def index_company(company):
+    """Replace the search terms of one company."""
+    with transaction.atomic():
+        CompanySearchTerm.objects.filter(company_id=company.pk).delete()
+        CompanySearchTerm.objects.bulk_create(_term_rows(company))
+
+
+def rebuild_search_index(queryset=None, batch_size=500):
+    """Re-index every company in the queryset; return how many were indexed."""
+    if queryset is None:
+        queryset = Company.objects.all()
+    queryset = queryset.order_by('pk').only('pk', *FIELD_WEIGHTS)
+    total = 0
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            CompanySearchTerm.objects.filter(company_id__in=[c.pk for c in batch]).delete()
+            CompanySearchTerm.objects.bulk_create(
+                [row for c in batch for row in _term_rows(c)], batch_size=batch_size,
+            )
+
+    for company in queryset.iterator(chunk_size=batch_size):
+        batch.append(company)
+        if len(batch) >= batch_size:
+            flush()
+            total += len(batch)
+            batch = []
+    if batch:
+        flush()
+        total += len(batch)
+    return total
+
+
+def _prefix(token):
+    if connection.vendor == 'postgresql':
+        # LIKE 'x%' usa o índice varchar_pattern_ops
+        return Q(term__startswith=token)
+    # No SQLite o LIKE ignora o índice; a faixa (comparação binária) o usa
+    return Q(term__gte=token, term__lt=token + '\uffff')
+
+
+def rank_matches(terms, group_by, tokens):
+    """Group a term queryset by ``group_by`` and rank the groups matching every token.
+
+    Shared by the company search and the party index (customers/parties.py).
+    """
+    per_token = {
+        f'_match_{i}': Max(Case(
+            When(term=token, then=F('weight') * 2),
+            When(_prefix(token), then=F('weight')),
+            default=0,
+            output_field=IntegerField(),
+        ))
+        for i, token in enumerate(tokens)
+    }
+    rank = reduce(lambda a, b: a + b, (F(name) for name in per_token))
+    return (
+        terms
+        .filter(reduce(or_, (_prefix(token) for token in tokens)))
+        .values(group_by)
+        .annotate(**per_token)
+        .filter(**{f'{name}__gt': 0 for name in per_token})
+        .annotate(rank=rank)
+    )
+
+
+def ranked_terms(query):
+    """Per-company rank for a query; only companies matching every token are kept."""
+    tokens = query_tokens(query)
+    if not tokens:
+        return None
+    return rank_matches(CompanySearchTerm.objects.all(), 'company', tokens)
+
+
+def search_companies(queryset, query):
+    """Filter a ``Company`` queryset by ``query`` and annotate ``search_rank``.
+
+    Callers order by ``-search_rank`` to get the best matches first. A query
+    without tokens (empty or only punctuation) filters nothing and ranks every
+    company 0.
+    """
+    ranked = ranked_terms(query)
+    if ranked is None:
+        return queryset.annotate(search_rank=Value(0, output_field=IntegerField()))
+    return queryset.filter(pk__in=ranked.values('company')).annotate(
+        search_rank=Subquery(ranked.filter(company=OuterRef('pk')).values('rank')[:1]),
+    )
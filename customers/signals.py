@@ -1,47 +1,44 @@
-from django.db.models.signals import post_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, m2m_changed
 from django.dispatch import receiver
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.urls import reverse
+from django.utils import timezone
 
-from .models import Company, OwnershipManagementInfo, StatusControl, Notification
-from .permissions import is_internal_user
-
+from .models import (
+    Company, OwnershipManagementInfo, StatusControl, Notification, MajorShareholder, UltimateBeneficialOwner,
+    ReverseDueDiligenceMessage, ReverseDueDiligenceAttachment, StatusTransition,
+)
+from .permissions import is_internal_user, clear_roles
+from .middleware import bump_roles_version
+from .notifications import notify_group, adjust_unread
+from .progress import STEP_FOR_MODEL, set_step_state, sync_company_step
+from .search import index_company
+from .parties import SOURCE_FOR_MODEL, index_party, remove_party
+from .ownership import MATCH_FIELDS as OWNERSHIP_MATCH_FIELDS, bump_ownership_version
+from .storage import UPLOAD_MODELS, is_referenced, release_file
+from .documents import PREVIEW_MODELS, discard_preview, schedule as schedule_processing
+from .rdd import forget_counts, refresh_thread_stats
+from .events import publish, rdd_channel, user_channel
+from .transitions import record_transition
+from .workflow import MAX_ATTEMPTS
 
-def _ensure_status_control(company):
-    sc, _ = StatusControl.objects.get_or_create(company=company)
-    return sc
+logger = logging.getLogger(__name__)
 
 
 def _notify_compliance(company):
-    try:
-        group = Group.objects.get(name='Compliance')
-    except Group.DoesNotExist:
-        return
     url = reverse('customers:company_detail', kwargs={'pk': company.pk})
     msg = f'Cliente pronto para avaliação de Compliance: {company.full_company_name}'
-    for u in group.user_set.all():
-        Notification.objects.create(
-            recipient=u,
-            message=msg,
-            url=url,
-            audience=Notification.Audience.INTERNAL,
-        )
+    notify_group('Compliance', msg, url=url, audience=Notification.Audience.INTERNAL)
 
 
 def _notify_finance(company):
-    try:
-        group = Group.objects.get(name='Financeiro')
-    except Group.DoesNotExist:
-        return
     url = reverse('customers:company_detail', kwargs={'pk': company.pk})
     msg = f'Cliente pronto para avaliação do Financeiro: {company.full_company_name}'
-    for u in group.user_set.all():
-        Notification.objects.create(
-            recipient=u,
-            message=msg,
-            url=url,
-            audience=Notification.Audience.INTERNAL,
-        )
+    notify_group('Financeiro', msg, url=url, audience=Notification.Audience.INTERNAL)
 
 
 def _notify_user_missing(company, missing_list):
@@ -63,36 +60,224 @@ def _notify_user_missing(company, missing_list):
 
 
 def _update_min_requirements_state(company):
-    sc = _ensure_status_control(company)
     met = company.min_requirements_met()
+    missing = [] if met else company.missing_min_requirements()
+    StatusControl.objects.get_or_create(company=company)
 
-    # Detecta transição para ligado/desligado
-    previously = sc.min_requirements_met
-    sc.min_requirements_met = met
-
-    if not met:
-        missing = company.missing_min_requirements()
-        sc.is_pending = True
-        sc.pending_owner = 'USER'
-        sc.pending_details = f"Requisitos mínimos pendentes: {', '.join(missing)}" if missing else 'Requisitos mínimos pendentes.'
-        sc.save(update_fields=['min_requirements_met', 'is_pending', 'pending_owner', 'pending_details', 'updated_at'])
-        _notify_user_missing(company, missing)
-    else:
-        # Requisitos mínimos atendidos: libera Compliance e Financeiro em paralelo
-        sc.is_pending = True
-        sc.pending_owner = 'NONE'
-        sc.pending_details = 'Aguardando avaliação de Compliance e Financeiro.'
-        sc.save(update_fields=['min_requirements_met', 'is_pending', 'pending_owner', 'pending_details', 'updated_at'])
-        if not previously:
+    for _attempt in range(MAX_ATTEMPTS):
+        sc = StatusControl.objects.get(company=company)
+        # Detecta transição para ligado/desligado
+        previously = sc.min_requirements_met
+        if met and previously:
+            # Requisitos continuam atendidos: não desfaz decisões já tomadas no workflow
+            return
+
+        if not met:
+            target = {
+                'min_requirements_met': False,
+                'is_pending': True,
+                'pending_owner': 'USER',
+                'pending_details': f"Requisitos mínimos pendentes: {', '.join(missing)}" if missing else 'Requisitos mínimos pendentes.',
+            }
+        else:
+            # Requisitos mínimos atendidos: libera Compliance e Financeiro em paralelo
+            target = {
+                'min_requirements_met': True,
+                'is_pending': True,
+                'pending_owner': 'NONE',
+                'pending_details': 'Aguardando avaliação de Compliance e Financeiro.',
+            }
+
+        # Só grava (e notifica) quando o estado calculado difere do armazenado
+        if all(getattr(sc, field) == value for field, value in target.items()):
+            return
+        previous_owner = sc.pending_owner
+        now = timezone.now()
+        with transaction.atomic():
+            # Mesmo UPDATE condicional de customers/workflow.py: não sobrescreve uma decisão concorrente
+            updated = StatusControl.objects.filter(
+                pk=sc.pk, pending_owner=previous_owner, min_requirements_met=previously,
+            ).update(**target, updated_at=now)
+            if not updated:
+                continue
+            for field, value in target.items():
+                setattr(sc, field, value)
+            decision = StatusTransition.Decision.REQUIREMENTS_MET if met else StatusTransition.Decision.REQUIREMENTS_PENDING
+            record_transition(sc, StatusTransition.Department.ONBOARDING, decision, previous_owner, now=now)
+
+        if not met:
+            _notify_user_missing(company, missing)
+        else:
             _notify_compliance(company)
             _notify_finance(company)
+        return
+    logger.warning("StatusControl da empresa %s alterado concorrentemente; requisitos mínimos não gravados.", company.pk)
 
 
 @receiver(post_save, sender=Company)
-def on_company_saved(sender, instance: Company, created, **kwargs):
-    _update_min_requirements_state(instance)
+def on_company_saved(sender, instance: Company, created, update_fields=None, **kwargs):
+    changed = instance.changed_tracked_fields()
+    if update_fields is not None:
+        changed &= set(update_fields)
+    instance.reset_tracked_fields()
+    # Ex.: CompanyEvaluationUpdateView altera apenas datas de avaliação
+    if not created and not changed:
+        return
+    if created or changed & set(Company.MIN_REQUIREMENT_FIELDS):
+        _update_min_requirements_state(instance)
+    if created or changed & {'full_company_name', 'registered_business_address'}:
+        sync_company_step(instance)
+    if created or changed & set(Company.SEARCH_FIELDS):
+        index_company(instance)
+    if created or changed & set(OWNERSHIP_MATCH_FIELDS):
+        bump_ownership_version()
 
 
 @receiver(post_save, sender=OwnershipManagementInfo)
 def on_ownership_saved(sender, instance: OwnershipManagementInfo, created, **kwargs):
     _update_min_requirements_state(instance.company)
+
+
+# --- Snapshot de progresso do onboarding ---
+def on_step_saved(sender, instance, **kwargs):
+    if instance.company_id:
+        set_step_state(instance.company_id, STEP_FOR_MODEL[sender], True)
+
+
+def on_step_deleted(sender, instance, **kwargs):
+    # Exclusão em cascata da própria empresa: nada a atualizar
+    if isinstance(kwargs.get('origin'), Company) or not instance.company_id:
+        return
+    done = sender.objects.filter(company_id=instance.company_id).exists()
+    set_step_state(instance.company_id, STEP_FOR_MODEL[sender], done)
+
+
+for _step_model in STEP_FOR_MODEL:
+    post_save.connect(on_step_saved, sender=_step_model, dispatch_uid=f'progress_saved_{_step_model.__name__}')
+    post_delete.connect(on_step_deleted, sender=_step_model, dispatch_uid=f'progress_deleted_{_step_model.__name__}')
+
+
+# --- Índice de partes relacionadas (customers/parties.py) ---
+def on_party_saved(sender, instance, **kwargs):
+    index_party(SOURCE_FOR_MODEL[sender], instance)
+
+
+def on_party_deleted(sender, instance, **kwargs):
+    # Exclusão em cascata da própria empresa: as entradas já caem junto
+    if isinstance(kwargs.get('origin'), Company):
+        return
+    remove_party(SOURCE_FOR_MODEL[sender], instance.pk)
+
+
+for _party_model in SOURCE_FOR_MODEL:
+    post_save.connect(on_party_saved, sender=_party_model, dispatch_uid=f'party_saved_{_party_model.__name__}')
+    post_delete.connect(on_party_deleted, sender=_party_model, dispatch_uid=f'party_deleted_{_party_model.__name__}')
+
+
+# --- Grafo societário (customers/ownership.py) ---
+@receiver(post_save, sender=MajorShareholder)
+@receiver(post_delete, sender=MajorShareholder)
+@receiver(post_save, sender=UltimateBeneficialOwner)
+@receiver(post_delete, sender=UltimateBeneficialOwner)
+@receiver(post_delete, sender=OwnershipManagementInfo)
+@receiver(post_delete, sender=Company)
+def on_ownership_row_changed(sender, instance, **kwargs):
+    bump_ownership_version()
+
+
+# --- Arquivos enviados (customers/storage.py) ---
+def on_upload_replacing(sender, instance, **kwargs):
+    # Só consulta o nome anterior quando um arquivo novo está para ser gravado
+    if instance.pk and instance.file and not instance.file._committed:
+        instance._previous_file_name = sender.objects.filter(pk=instance.pk).values_list('file', flat=True).first()
+
+
+def _release_upload(name, storage):
+    if not name or is_referenced(name):
+        return
+    discard_preview(name)
+    release_file(name, storage)
+
+
+def on_upload_saved(sender, instance, created=False, **kwargs):
+    previous = instance.__dict__.pop('_previous_file_name', None)
+    replaced = previous and previous != instance.file.name
+    if replaced:
+        storage = instance.file.storage
+        transaction.on_commit(lambda: _release_upload(previous, storage))
+    # Miniatura, páginas, MIME e texto (customers/documents.py)
+    if sender in PREVIEW_MODELS and instance.file and (created or replaced):
+        schedule_processing(instance.file.name)
+
+
+def on_upload_deleted(sender, instance, **kwargs):
+    name, storage = instance.file.name, instance.file.storage
+    transaction.on_commit(lambda: _release_upload(name, storage))
+
+
+for _upload_model in UPLOAD_MODELS:
+    pre_save.connect(on_upload_replacing, sender=_upload_model, dispatch_uid=f'upload_replacing_{_upload_model.__name__}')
+    post_save.connect(on_upload_saved, sender=_upload_model, dispatch_uid=f'upload_saved_{_upload_model.__name__}')
+    post_delete.connect(on_upload_deleted, sender=_upload_model, dispatch_uid=f'upload_deleted_{_upload_model.__name__}')
+
+
+# --- Papéis em cache (request.roles / sessão) ---
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def on_user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        clear_roles(instance)
+        bump_roles_version([instance.pk])
+    elif pk_set:
+        bump_roles_version(pk_set)
+    else:
+        # group.user_set.clear(): não sabemos quais usuários foram afetados
+        bump_roles_version()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def on_group_changed(sender, instance, **kwargs):
+    bump_roles_version()
+
+
+# --- Contador de notificações não lidas ---
+@receiver(post_save, sender=Notification)
+def on_notification_saved(sender, instance: Notification, created, **kwargs):
+    if created and not instance.is_read:
+        adjust_unread(instance.recipient_id, 1)
+        publish([user_channel(instance.recipient_id)], 'notification',
+                {'message': instance.message, 'url': instance.url, 'rdd': instance.rdd_id})
+
+
+# --- Totais de mensagens/anexos do RDD em cache ---
+@receiver(post_save, sender=ReverseDueDiligenceMessage)
+@receiver(post_delete, sender=ReverseDueDiligenceMessage)
+def on_rdd_message_changed(sender, instance, **kwargs):
+    forget_counts(instance.thread_id)
+    if kwargs['signal'] is post_delete:
+        refresh_thread_stats([instance.thread_id])
+    if kwargs.get('created'):
+        publish([rdd_channel(instance.thread_id)], 'message', {
+            'id': instance.pk,
+            'author_id': instance.author_id,
+            'author': instance.author.get_username(),
+            'body': instance.body,
+            'created_at': timezone.localtime(instance.created_at).strftime('%d/%m/%Y %H:%M'),
+        })
+
+
+@receiver(post_save, sender=ReverseDueDiligenceAttachment)
+@receiver(post_delete, sender=ReverseDueDiligenceAttachment)
+def on_rdd_attachment_changed(sender, instance, **kwargs):
+    thread_id = ReverseDueDiligenceMessage.objects.filter(pk=instance.message_id).values_list('thread_id', flat=True).first()
+    if thread_id is not None:
+        forget_counts(thread_id)
+        if kwargs.get('created'):
+            publish([rdd_channel(thread_id)], 'attachment', {
+                'id': instance.pk,
+                'message': instance.message_id,
+                'name': instance.file.name[-50:],
+                'url': reverse('customers:rdd_attachment_file', kwargs={'pk': instance.pk}),
+            })
@@ -0,0 +1,295 @@
+"""Content-addressed, deduplicated storage for uploaded files.
+
+Every upload is streamed once to a temporary file under ``MEDIA_ROOT/.cas``
+while its SHA-256 is computed. The content is kept a single time as
+``.cas/<aa>/<sha256>`` (``StoredBlob``) and the name chosen by the FileField
+(``kyc_documents/contrato.pdf``...) becomes a hard link to that blob
+(``StoredFile``), so existing names, ``.url`` and ``.path`` keep working. An
+upload whose content is already stored costs only the link and two row
+writes; ``StoredBlob.ref_count`` counts the names pointing at a blob and the
+blob is removed when the last one is deleted.
+
+Where hard links are not available the name falls back to a copy of the blob
+(still reference counted). Files saved before this backend was enabled have
+no ``StoredFile`` row and are deleted as plain files; ``dedupe_media``
+adopts them.
+
+The blob and the link are written before the rows, so the file can be read in
+the same transaction. If that transaction rolls back, the files are left
+behind without rows. :func:`sweep_orphans` (``prune_media``) removes blobs
+with no ``StoredBlob``, links with no ``StoredFile`` and leftover spool files
+once they are older than a grace period.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+from .models import (
+    EvaluationRecord, FinalAnalysisAttachment, KYCDocument, ReverseDueDiligenceAttachment, StoredBlob, StoredFile,
+)
+
+BLOB_DIR = '.cas'
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Modelos cujos arquivos são liberados ao excluir/substituir a linha (signals)
+UPLOAD_MODELS = (KYCDocument, EvaluationRecord, FinalAnalysisAttachment, ReverseDueDiligenceAttachment)
+
+
+def content_hash(content):
+    """SHA-256 (hex) of a Django ``File``/upload, leaving it rewound."""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that keeps one copy of each distinct content."""
+
+    def blob_path(self, sha256):
+        return os.path.join(self.location, BLOB_DIR, sha256[:2], sha256)
+
+    def _spool(self, content):
+        """Copy ``content`` to a temporary file while hashing it; ``(tmp_path, sha256, size)``."""
+        tmp_dir = os.path.join(self.location, BLOB_DIR, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def _link(self, blob_path, name):
+        """Create ``name`` as a link to the blob, picking another name if it is taken."""
+        while True:
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                os.link(blob_path, full_path)
+            except FileExistsError:
+                name = self.get_available_name(name)
+                continue
+            except OSError:
+                # Sistema de arquivos sem hard link: grava uma cópia (ainda contada no blob)
+                try:
+                    with open(blob_path, 'rb') as src, open(full_path, 'xb') as dst:
+                        shutil.copyfileobj(src, dst)
+                except FileExistsError:
+                    name = self.get_available_name(name)
+                    continue
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+            return name
+
+    def _save(self, name, content):
+        tmp_path, sha256, size = self._spool(content)
+        full_path = None
+        try:
+            with transaction.atomic():
+                # O lock na linha do blob serializa uploads e exclusões do mesmo conteúdo
+                blob, created = StoredBlob.objects.select_for_update().get_or_create(
+                    sha256=sha256, defaults={'size': size},
+                )
+                blob_path = self.blob_path(sha256)
+                if created or not os.path.exists(blob_path):
+                    # Linha nova: o arquivo no lugar do blob (se houver) é sobra de um upload desfeito e
+                    # pode estar sendo varrido; a cópia recém-gravada tem outro inode e a varredura a poupa
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    os.replace(tmp_path, blob_path)
+                name = self._link(blob_path, name)
+                full_path = self.path(name)
+                StoredFile.objects.create(name=str(name).replace('\\', '/'), blob=blob)
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        except BaseException:
+            if full_path and os.path.exists(full_path):
+                os.remove(full_path)
+            raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return str(name).replace('\\', '/')
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        blob_id = StoredFile.objects.filter(name=name).values_list('blob_id', flat=True).first()
+        if blob_id is None:
+            super().delete(name)
+            return
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(pk=blob_id).first()
+            deleted, _ = StoredFile.objects.filter(name=name).delete()
+            super().delete(name)
+            if blob is None or not deleted:
+                return
+            if blob.ref_count <= 1:
+                blob.delete()
+                blob_path = self.blob_path(blob.sha256)
+                if os.path.exists(blob_path):
+                    os.remove(blob_path)
+            else:
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+
+    def adopt(self, name):
+        """Move an existing plain file into the blob store; returns the bytes freed (0 if new content).
+
+        Files already tracked, or missing on disk, are left alone (returns ``None``).
+        """
+        full_path = self.path(name)
+        if StoredFile.objects.filter(name=name).exists() or not os.path.isfile(full_path):
+            return None
+        sha256 = file_hash(full_path)
+        freed = 0
+        with transaction.atomic():
+            blob, _ = StoredBlob.objects.select_for_update().get_or_create(
+                sha256=sha256, defaults={'size': os.path.getsize(full_path)},
+            )
+            blob_path = self.blob_path(sha256)
+            if os.path.exists(blob_path):
+                if not os.path.samefile(blob_path, full_path):
+                    freed = blob.size
+                    tmp_link = f'{full_path}.cas-tmp'
+                    try:
+                        os.link(blob_path, tmp_link)
+                        os.replace(tmp_link, full_path)
+                    except OSError:
+                        freed = 0
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                try:
+                    os.link(full_path, blob_path)
+                except OSError:
+                    shutil.copyfile(full_path, blob_path)
+            StoredFile.objects.create(name=name, blob=blob)
+            StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        return freed
+
+
+def is_referenced(name):
+    """Whether any upload row still points at ``name``."""
+    return any(model.objects.filter(file=name).exists() for model in UPLOAD_MODELS)
+
+
+def release_file(name, storage):
+    """Drop a name no upload row references any more (decrementing its blob).
+
+    Only done by the content-addressed backend: with plain storage files are
+    kept on delete, as Django does by default.
+    """
+    if not name or not isinstance(storage, ContentAddressedStorage):
+        return
+    if is_referenced(name):
+        return
+    storage.delete(name)
+
+
+def _known_rows():
+    """Hashes of every ``StoredBlob`` and names of every ``StoredFile``."""
+    known_blobs = set(StoredBlob.objects.values_list('sha256', flat=True))
+    known_names = set(StoredFile.objects.values_list('name', flat=True))
+    return known_blobs, known_names
+
+
+def sweep_orphans(storage, grace_seconds=3600, dry_run=False):
+    """Delete the files left by uploads whose transaction rolled back.
+
+    Only files older than ``grace_seconds`` are considered, so uploads still in
+    flight are never touched, and each blob or link is checked again under the
+    row lock (no row, same inode and mtime as listed) right before it is
+    removed, so an upload of the same content never loses its file. Returns ``(blobs, links, spool)`` removed (or that
+    would be, with ``dry_run``). Names written as copies (no hard link) cannot be
+    told from files saved before this backend and are kept.
+    """
+    cutoff = time.time() - grace_seconds
+    root = os.path.join(storage.location, BLOB_DIR)
+    # Lidas antes de varrer o disco: o que for gravado depois é recente demais para a varredura
+    known_blobs, known_names = _known_rows()
+    removed = {'blobs': 0, 'links': 0, 'spool': 0}
+
+    def remove(path, kind):
+        if not dry_run:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return
+        removed[kind] += 1
+
+    def remove_orphan(path, kind, stat, rows):
+        """Remove a blob/link after checking, under the row lock, that it is still an orphan."""
+        if dry_run:
+            removed[kind] += 1
+            return
+        with transaction.atomic():
+            # O upload do mesmo conteúdo trava esta linha em _save: ou já a criou, ou espera a remoção
+            if rows.select_for_update().exists():
+                return
+            try:
+                current = os.lstat(path)
+            except FileNotFoundError:
+                return
+            # Regravado depois da listagem (os.replace em _save): não é mais a sobra vista
+            if (current.st_ino, current.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+                return
+            os.remove(path)
+        removed[kind] += 1
+
+    blob_inodes = set()
+    if os.path.isdir(root):
+        for bucket in os.scandir(root):
+            if not bucket.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(bucket.path):
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if bucket.name == 'tmp':
+                    if stat.st_mtime < cutoff:
+                        remove(entry.path, 'spool')
+                    continue
+                blob_inodes.add((stat.st_dev, stat.st_ino))
+                if entry.name not in known_blobs and stat.st_mtime < cutoff:
+                    remove_orphan(entry.path, 'blobs', stat, StoredBlob.objects.filter(sha256=entry.name))
+
+    # Nomes que são hard link de um blob mas não têm StoredFile
+    for dirpath, dirnames, filenames in os.walk(storage.location):
+        if os.path.abspath(dirpath) == os.path.abspath(storage.location) and BLOB_DIR in dirnames:
+            dirnames.remove(BLOB_DIR)
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            stat = os.lstat(path)
+            if (stat.st_dev, stat.st_ino) not in blob_inodes:
+                continue
+            name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+            # st_ctime muda quando o link é criado: protege links de transações em andamento
+            if name not in known_names and stat.st_ctime < cutoff:
+                remove_orphan(path, 'links', stat, StoredFile.objects.filter(name=name))
+    return removed['blobs'], removed['links'], removed['spool']
@@ -0,0 +1,33 @@
+import shutil
+import tempfile
+
+from django.contrib.auth.models import Group, User
+from django.test import override_settings
+
+from customers.models import Company
+
+
+def make_user(username, *groups):
+    user = User.objects.create_user(username, password='x')
+    for name in groups:
+        user.groups.add(Group.objects.get_or_create(name=name)[0])
+    return user
+
+
+def make_company(owner, **fields):
+    # Empresa nacional com CNPJ: requisitos mínimos atendidos
+    values = {'full_company_name': 'Alfa Comércio S.A.', 'client_type': 'NATIONAL', 'cnpj': '12.345.678/0001-90'}
+    values.update(fields)
+    return Company.objects.create(created_by=owner, **values)
+
+
+class MediaTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.media = media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media, CHUNKED_UPLOAD_DIR=f'{media}/.uploads', DOCUMENT_PROCESSING_ASYNC=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.owner = make_user('cliente')
+        self.company = make_company(self.owner)
@@ -0,0 +1,115 @@
+import io
+import os
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from pypdf import PdfReader, PdfWriter
+
+from customers import documents
+from customers.documents import pdf_info, process_file, sniff_mime
+from customers.models import DOCUMENT_TYPE_CHOICES, FilePreview, KYCDocument
+
+from .helpers import MediaTestMixin
+
+
+def text_pdf(*pages):
+    """A PDF with one page per string, each drawn in Helvetica."""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in pages:
+        stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> '
+            b'/Contents %d 0 R >>' % (len(objects))
+        )
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b'%010d 00000 n \n' % offset)
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+class PdfInfoTests(MediaTestMixin, TestCase):
+    def write(self, content, name='doc.pdf'):
+        path = os.path.join(self.media, name)
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        return path
+
+    def test_pages_and_text(self):
+        pages, text = pdf_info(self.write(text_pdf('Contrato social', 'Balanco 2024')))
+        self.assertEqual(pages, 2)
+        self.assertIn('Contrato social', text)
+        self.assertIn('Balanco 2024', text)
+
+    def test_reads_from_the_open_file(self):
+        path = self.write(text_pdf('Procuração'))
+        with mock.patch.object(documents, 'PdfReader', wraps=PdfReader) as reader:
+            pdf_info(path)
+        stream = reader.call_args.args[0]
+        self.assertIsInstance(stream, io.BufferedReader)
+        self.assertTrue(stream.closed)
+
+    def test_empty_password_encryption_is_opened(self):
+        writer = PdfWriter(clone_from=PdfReader(io.BytesIO(text_pdf('Protegido'))))
+        writer.encrypt(user_password='', owner_password='dono', algorithm='RC4-128')
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        pages, text = pdf_info(self.write(buffer.getvalue()))
+        self.assertEqual(pages, 1)
+        self.assertIn('Protegido', text)
+
+    def test_mime_is_sniffed_from_the_content(self):
+        self.assertEqual(sniff_mime(b'%PDF-1.7'), 'application/pdf')
+        self.assertEqual(sniff_mime(b'\x89PNG\r\n\x1a\n....'), 'image/png')
+        self.assertEqual(sniff_mime(b'RIFF\0\0\0\0WEBPVP8 '), 'image/webp')
+        self.assertEqual(sniff_mime('texto simples'.encode()), 'text/plain')
+        self.assertEqual(sniff_mime(b'\x00\x01\x02\xff'), 'application/octet-stream')
+
+
+class ProcessFileTests(MediaTestMixin, TestCase):
+    def upload(self, content, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            document = KYCDocument.objects.create(
+                company=self.company, document_type=DOCUMENT_TYPE_CHOICES[0][0], file=ContentFile(content, name=name),
+            )
+        return FilePreview.objects.get(name=document.file.name)
+
+    def test_upload_is_processed_after_commit(self):
+        preview = self.upload(text_pdf('Estatuto', 'Ata'), 'estatuto.pdf')
+        self.assertEqual(preview.status, FilePreview.Status.DONE)
+        self.assertEqual((preview.mime_type, preview.page_count), ('application/pdf', 2))
+        self.assertIn('Estatuto', preview.text)
+
+    def test_unreadable_pdf_fails_the_preview(self):
+        with self.assertLogs('customers.documents', 'ERROR'):
+            preview = self.upload(b'%PDF-1.4 sem estrutura', 'quebrado.pdf')
+        self.assertEqual(preview.status, FilePreview.Status.FAILED)
+        self.assertTrue(preview.error)
+
+    def test_large_pdf_is_not_parsed(self):
+        with self.settings(DOCUMENT_PROCESSING_MAX_BYTES=10), mock.patch.object(documents, 'pdf_info') as info:
+            preview = self.upload(text_pdf('Grande'), 'grande.pdf')
+        info.assert_not_called()
+        self.assertEqual(preview.status, FilePreview.Status.DONE)
+        self.assertIsNone(preview.page_count)
+
+    def test_done_preview_is_not_redone_without_force(self):
+        preview = self.upload(text_pdf('Uma vez'), 'uma-vez.pdf')
+        with mock.patch.object(documents, 'pdf_info') as info:
+            process_file(preview.name)
+            info.assert_not_called()
+            info.return_value = (1, 'refeito')
+            self.assertEqual(process_file(preview.name, force=True).text, 'refeito')
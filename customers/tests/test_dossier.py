@@ -0,0 +1,84 @@
+import io
+import json
+import zipfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+from django.urls import reverse
+
+from customers import dossier
+from customers.dossier import iter_dossier
+from customers.models import (
+    DOCUMENT_TYPE_CHOICES, IndividualContact, KYCDocument, ReverseDueDiligence, ReverseDueDiligenceAttachment,
+    ReverseDueDiligenceMessage,
+)
+
+from .helpers import MediaTestMixin, make_user
+
+
+class DossierTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.files = {
+            'balanco.pdf': b'%PDF-1.4\n' + bytes(range(256)) * 3000,
+            'contrato.pdf': b'%PDF-1.4\ncontrato',
+        }
+        self.document = KYCDocument.objects.create(
+            company=self.company, document_type=DOCUMENT_TYPE_CHOICES[0][0],
+            file=ContentFile(self.files['balanco.pdf'], name='balanco.pdf'),
+        )
+        thread = ReverseDueDiligence.objects.create(
+            company=self.company, created_by=self.owner, subject='Dúvida', description='...',
+        )
+        message = ReverseDueDiligenceMessage.objects.create(thread=thread, author=self.owner, body='Segue')
+        self.attachment = ReverseDueDiligenceAttachment.objects.create(
+            message=message, file=ContentFile(self.files['contrato.pdf'], name='contrato.pdf'), uploaded_by=self.owner,
+        )
+        IndividualContact.objects.create(company=self.company, first_name='Ana', last_name='Costa')
+
+    def archive(self, chunks):
+        return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+    def test_zip_opens_and_crcs_check(self):
+        # Blocos menores que os arquivos: cada um é escrito em várias partes
+        with mock.patch.object(dossier, 'CHUNK_SIZE', 4096):
+            chunks = list(iter_dossier(self.company))
+        with self.archive(chunks) as archive:
+            self.assertIsNone(archive.testzip())
+            names = archive.namelist()
+            self.assertEqual(names[:2], ['manifest.json', 'manifest.csv'])
+            self.assertEqual(
+                archive.read(f'kyc_documents/{self.document.pk}-balanco.pdf'), self.files['balanco.pdf'],
+            )
+            self.assertEqual(
+                archive.read(f'rdd_attachments/{self.attachment.pk}-contrato.pdf'), self.files['contrato.pdf'],
+            )
+            manifest = json.loads(archive.read('manifest.json'))
+
+        self.assertEqual(manifest['company']['id'], self.company.pk)
+        self.assertEqual([f['path'] for f in manifest['files']], names[2:])
+        self.assertTrue(all(len(f['sha256']) == 64 and not f['missing'] for f in manifest['files']))
+        self.assertIn('customers.individualcontact', {r['model'] for r in manifest['records']})
+
+    def test_missing_file_is_listed_but_not_archived(self):
+        self.document.file.storage.delete(self.document.file.name)
+        with self.archive(iter_dossier(self.company)) as archive:
+            self.assertIsNone(archive.testzip())
+            manifest = json.loads(archive.read('manifest.json'))
+            self.assertEqual(archive.namelist()[2:], [f'rdd_attachments/{self.attachment.pk}-contrato.pdf'])
+        missing = [f['path'] for f in manifest['files'] if f['missing']]
+        self.assertEqual(missing, [f'kyc_documents/{self.document.pk}-balanco.pdf'])
+
+    def test_view_streams_the_zip_to_internal_users_only(self):
+        url = reverse('customers:company_dossier', args=[self.company.pk])
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(make_user('compliance', 'Equipe', 'Compliance'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with self.archive(response.streaming_content) as archive:
+            self.assertIsNone(archive.testzip())
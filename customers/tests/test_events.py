@@ -0,0 +1,164 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from customers import events
+from customers.events import FileBackend, LocalBackend, format_sse, rdd_channel, user_channel
+from customers.middleware import PortalRolesMiddleware
+from customers.models import Notification, ReverseDueDiligence, ReverseDueDiligenceMessage
+
+from .helpers import make_company, make_user
+
+
+def message(channel, event='message', **data):
+    return {'channels': [channel], 'event': event, 'data': data}
+
+
+class BackendTests(TestCase):
+    async def test_local_backend_delivers_to_subscribed_channels(self):
+        backend = LocalBackend()
+        subscription = backend.subscribe(['rdd:1'])
+        # Publicadores rodam em threads comuns
+        for channel in ('rdd:2', 'rdd:1'):
+            thread = threading.Thread(target=backend.publish, args=(message(channel, body=channel),))
+            thread.start()
+            thread.join()
+        received = await asyncio.wait_for(subscription.get(), 1)
+        self.assertEqual(received['data'], {'body': 'rdd:1'})
+        self.assertTrue(subscription.queue.empty())
+
+        subscription.close()
+        backend.publish(message('rdd:1'))
+        await asyncio.sleep(0)
+        self.assertTrue(subscription.queue.empty())
+        self.assertEqual(backend._subscribers, {})
+
+    async def test_file_backend_shares_events_between_processes(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        path = os.path.join(tmp, 'events.jsonl')
+        # O leitor começa do fim do arquivo: ele já existe (vazio) quando a assinatura abre
+        open(path, 'wb').close()
+        with override_settings(EVENTS_FILE=path, EVENTS_POLL_INTERVAL=0.02):
+            # Uma instância por processo: a que publica não é a que entrega
+            reader, writer = FileBackend(), FileBackend()
+            subscription = reader.subscribe(['user:7'])
+            writer.publish(message('user:8', 'notification', message='outro'))
+            writer.publish(message('user:7', 'notification', message='Novo RDD'))
+            received = await asyncio.wait_for(subscription.get(), 5)
+        subscription.close()
+        self.assertEqual(received['data'], {'message': 'Novo RDD'})
+
+    def test_publish_waits_for_the_commit(self):
+        backend = mock.Mock()
+        with mock.patch.object(events, 'get_backend', return_value=backend):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                events.publish(['rdd:1'], 'message', {'id': 1})
+                backend.publish.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        backend.publish.assert_called_once_with(message('rdd:1', id=1))
+
+    def test_format_sse(self):
+        self.assertEqual(
+            format_sse(message('rdd:1', body='olá\nmundo')),
+            'event: message\ndata: {"body": "olá\\nmundo"}\n\n',
+        )
+
+
+class SignalEventTests(TestCase):
+    def setUp(self):
+        self.backend = mock.Mock()
+        patcher = mock.patch.object(events, 'get_backend', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.owner = make_user('cliente')
+        self.thread = ReverseDueDiligence.objects.create(
+            company=make_company(self.owner), created_by=self.owner, subject='Dúvida', description='...',
+        )
+
+    def published(self):
+        return [call.args[0] for call in self.backend.publish.call_args_list]
+
+    def test_new_message_and_notification_are_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            msg = ReverseDueDiligenceMessage.objects.create(thread=self.thread, author=self.owner, body='Oi')
+            Notification.objects.create(recipient=self.owner, message='Resposta ao RDD', rdd=self.thread)
+        sent = self.published()
+        self.assertEqual([(m['channels'], m['event']) for m in sent], [
+            ([rdd_channel(self.thread.pk)], 'message'), ([user_channel(self.owner.pk)], 'notification'),
+        ])
+        self.assertEqual((sent[0]['data']['id'], sent[0]['data']['body']), (msg.pk, 'Oi'))
+
+
+@override_settings(EVENTS_HEARTBEAT=0.05, EVENTS_STREAM_MAX_SECONDS=5)
+class StreamViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('cliente')
+        cls.outsider = make_user('outro')
+        cls.thread = ReverseDueDiligence.objects.create(
+            company=make_company(cls.owner), created_by=cls.owner, subject='Dúvida', description='...',
+        )
+
+    def setUp(self):
+        self.backend = LocalBackend()
+        patcher = mock.patch('customers.views_events.get_backend', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = f'/customers/rdd/{self.thread.pk}/events/'
+
+    async def test_stream_sends_published_events(self):
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        self.assertEqual(await anext(chunks), b': ping\n\n')
+
+        self.backend.publish(message(rdd_channel(self.thread.pk), id=5, body='Oi'))
+        chunk = await anext(chunks)
+        while chunk == b': ping\n\n':
+            chunk = await anext(chunks)
+        event, data = chunk.decode().strip().split('\n')
+        self.assertEqual(event, 'event: message')
+        self.assertEqual(json.loads(data.removeprefix('data: ')), {'id': 5, 'body': 'Oi'})
+
+    async def test_stream_checks_thread_access(self):
+        await self.async_client.aforce_login(self.outsider)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_wsgi_answers_no_content(self):
+        self.client.force_login(self.owner)
+        for url in (self.url, '/customers/notifications/events/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 204)
+            self.assertFalse(response.streaming)
+
+
+class AsyncMiddlewareTests(TestCase):
+    async def test_roles_middleware_stays_async(self):
+        async def view(request):
+            return HttpResponse(str(request.roles.is_internal))
+
+        middleware = PortalRolesMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        response = await middleware(request)
+        self.assertEqual(response.content, b'False')
+
+    def test_roles_middleware_still_serves_wsgi(self):
+        middleware = PortalRolesMiddleware(lambda request: HttpResponse('ok'))
+        self.assertFalse(iscoroutinefunction(middleware))
+        self.assertEqual(middleware(RequestFactory().get('/')).content, b'ok')
@@ -0,0 +1,103 @@
+import hashlib
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from customers.models import (
+    DOCUMENT_TYPE_CHOICES, KYCDocument, ReverseDueDiligence, ReverseDueDiligenceAttachment, ReverseDueDiligenceMessage,
+)
+
+from .helpers import MediaTestMixin, make_user
+
+
+class ProtectedDownloadTests(MediaTestMixin, TestCase):
+    data = b'%PDF-1.4\n' + bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        self.document = KYCDocument.objects.create(
+            company=self.company, document_type=DOCUMENT_TYPE_CHOICES[0][0],
+            file=ContentFile(self.data, name='balanco.pdf'),
+        )
+        self.url = reverse('customers:kyc_document_file', args=[self.document.pk])
+        self.etag = f'"{hashlib.sha256(self.data).hexdigest()}"'
+        self.client.force_login(self.owner)
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_download_with_etag(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_if_none_match(self):
+        for value in (self.etag, f'"outro", {self.etag}', '*'):
+            response, body = self.get(if_none_match=value)
+            self.assertEqual(response.status_code, 304, value)
+            self.assertEqual(body, b'')
+            self.assertEqual(response['ETag'], self.etag)
+        response, _ = self.get(if_none_match='"outro"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_ranges(self):
+        size = len(self.data)
+        for header, start, end in (
+            ('bytes=0-9', 0, 9),
+            ('bytes=100-', 100, size - 1),
+            ('bytes=-16', size - 16, size - 1),
+            (f'bytes=1000-{size * 2}', 1000, size - 1),
+        ):
+            response, body = self.get(range=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(body, self.data[start:end + 1], header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+            self.assertEqual(response['Content-Length'], str(end - start + 1))
+
+        response, _ = self.get(range=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_if_range_with_another_validator_sends_the_whole_file(self):
+        response, body = self.get(range='bytes=0-9', if_range='"outro"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        response, body = self.get(range='bytes=0-9', if_range=self.etag)
+        self.assertEqual((response.status_code, body), (206, self.data[:10]))
+
+    def test_client_sees_only_its_own_files(self):
+        self.client.force_login(make_user('outro'))
+        self.assertEqual(self.get()[0].status_code, 403)
+        self.client.force_login(make_user('equipe', 'Equipe'))
+        self.assertEqual(self.get()[0].status_code, 200)
+        self.client.logout()
+        self.assertEqual(self.get()[0].status_code, 302)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_rdd_attachment_follows_the_thread(self):
+        thread = ReverseDueDiligence.objects.create(
+            company=self.company, created_by=make_user('equipe', 'Equipe'), subject='Dúvida', description='...',
+        )
+        message = ReverseDueDiligenceMessage.objects.create(thread=thread, author=self.owner, body='Segue')
+        attachment = ReverseDueDiligenceAttachment.objects.create(
+            message=message, file=ContentFile(self.data, name='contrato.pdf'), uploaded_by=self.owner,
+        )
+        url = reverse('customers:rdd_attachment_file', args=[attachment.pk])
+        # Dono da empresa do RDD
+        self.assertEqual(self.get(url)[0].status_code, 200)
+        self.client.force_login(make_user('outro'))
+        self.assertEqual(self.get(url)[0].status_code, 403)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='nginx', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_accel_redirect_hands_the_file_to_nginx(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.document.file.name}')
@@ -0,0 +1,110 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from customers import ownership
+from customers.models import MajorShareholder, OwnershipManagementInfo, UltimateBeneficialOwner
+from customers.ownership import OwnershipGraph, ownership_report
+
+from .helpers import make_company, make_user
+
+
+class OwnershipGraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('cliente')
+        cls.alfa = make_company(cls.owner, full_company_name='Alfa Petróleo S.A.', cnpj='11.111.111/0001-11')
+        cls.beta = make_company(cls.owner, full_company_name='Beta Holding Ltda', cnpj='22.222.222/0001-22')
+        cls.gama = make_company(cls.owner, full_company_name='Gama Participações', cnpj='33.333.333/0001-33')
+
+    def shareholder(self, company, name, percentage):
+        om, _ = OwnershipManagementInfo.objects.get_or_create(company=company)
+        return MajorShareholder.objects.create(
+            ownership_management=om, company_individual='Company', name_of_individual_company=name,
+            nationality_registered_country='Brasil', address_registered_business_address='-',
+            type_of_relationship='Acionista', percentage_of_ownership=percentage,
+        )
+
+    def owners(self, report):
+        return {owner.name: owner.percentage for owner in report.effective_owners}
+
+    def test_chain_multiplies_percentages(self):
+        # Beta é reconhecida pelo CNPJ no nome e Gama pelo nome normalizado
+        self.shareholder(self.alfa, 'BETA HOLDING (CNPJ 22.222.222/0001-22)', 60)
+        self.shareholder(self.alfa, 'Maria Souza', 40)
+        self.shareholder(self.beta, 'gama participacoes', 50)
+        self.shareholder(self.beta, 'João Lima', 50)
+        self.shareholder(self.gama, 'Ana Costa', 100)
+
+        report = OwnershipGraph.load().report(self.alfa.pk)
+        self.assertEqual(self.owners(report), {
+            'Maria Souza': Decimal('40.0000'), 'João Lima': Decimal('30.0000'), 'Ana Costa': Decimal('30.0000'),
+        })
+        self.assertEqual(report.effective_total, Decimal('100.0000'))
+        self.assertFalse(report.has_issues)
+
+    def test_cycles_and_totals_are_flagged(self):
+        self.shareholder(self.alfa, 'Beta Holding Ltda', 70)
+        self.shareholder(self.alfa, 'Maria Souza', 40)
+        self.shareholder(self.beta, 'Alfa Petróleo S.A.', 100)
+        om = OwnershipManagementInfo.objects.get(company=self.alfa)
+        UltimateBeneficialOwner.objects.create(
+            ownership_management=om, company_individual='Individual', full_name='Maria Souza',
+            nationality_registered_country='Brasil', country_of_residence='Brasil', percentage_of_ownership=100,
+        )
+
+        report = OwnershipGraph.load().report(self.alfa.pk)
+        self.assertEqual(report.cycles, [[self.alfa.pk, self.beta.pk, self.alfa.pk]])
+        self.assertTrue(report.direct_over_100)
+        self.assertFalse(report.ubo_over_100)
+        self.assertTrue(report.has_issues)
+
+    def test_results_cut_at_max_depth_are_not_reused(self):
+        self.shareholder(self.alfa, 'Beta Holding Ltda', 100)
+        self.shareholder(self.beta, 'Gama Participações', 100)
+        self.shareholder(self.gama, 'Ana Costa', 100)
+
+        with mock.patch.object(ownership, 'MAX_DEPTH', 2):
+            graph = OwnershipGraph.load()
+            # Pela Alfa a cadeia é cortada na Beta, que fica com a Gama como dona final
+            self.assertEqual(self.owners(graph.report(self.alfa.pk)), {'Gama Participações': Decimal('100.0000')})
+            self.assertEqual(self.owners(graph.report(self.beta.pk)), {'Ana Costa': Decimal('100.0000')})
+
+
+class OwnershipReportCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = make_user('cliente')
+        cls.alfa = make_company(owner, full_company_name='Alfa Petróleo S.A.')
+        cls.om = OwnershipManagementInfo.objects.create(company=cls.alfa)
+
+    def add_shareholder(self, name, percentage):
+        MajorShareholder.objects.create(
+            ownership_management=self.om, company_individual='Individual', name_of_individual_company=name,
+            nationality_registered_country='Brasil', address_registered_business_address='-',
+            type_of_relationship='Acionista', percentage_of_ownership=percentage,
+        )
+
+    def test_miss_resolves_only_the_company(self):
+        self.add_shareholder('Maria Souza', 30)
+        with mock.patch.object(OwnershipGraph, 'report_all') as report_all:
+            report = ownership_report(self.alfa.pk)
+        report_all.assert_not_called()
+        self.assertEqual(report.direct_total, Decimal('30'))
+        with mock.patch.object(OwnershipGraph, 'load') as load:
+            self.assertEqual(ownership_report(self.alfa.pk), report)
+        load.assert_not_called()
+
+    def test_shareholder_change_invalidates_the_report(self):
+        self.add_shareholder('Maria Souza', 30)
+        self.assertEqual(ownership_report(self.alfa.pk).direct_total, Decimal('30'))
+        self.add_shareholder('João Lima', 20)
+        self.assertEqual(ownership_report(self.alfa.pk).direct_total, Decimal('50'))
+
+    def test_lost_version_never_serves_old_reports(self):
+        self.add_shareholder('Maria Souza', 30)
+        ownership_report(self.alfa.pk)
+        ownership.cache.delete(ownership.VERSION_KEY)
+        MajorShareholder.objects.update(percentage_of_ownership=45)
+        self.assertEqual(ownership_report(self.alfa.pk).direct_total, Decimal('45'))
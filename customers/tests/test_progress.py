@@ -0,0 +1,20 @@
+from django.test import TestCase
+
+from customers.models import BusinessInformation, Company
+
+from .helpers import make_company, make_user
+
+
+class OnboardingProgressSnapshotTests(TestCase):
+    def test_stale_company_save_keeps_finished_steps(self):
+        company = make_company(make_user('cliente'))
+        stale = Company.objects.get(pk=company.pk)
+        BusinessInformation.objects.create(company=company)
+        mask = Company.objects.get(pk=company.pk).onboarding_progress_mask
+
+        stale.phone = '+55 11 5555-0000'
+        stale.save()
+
+        company = Company.objects.get(pk=company.pk)
+        self.assertEqual(company.phone, '+55 11 5555-0000')
+        self.assertEqual(company.onboarding_progress_mask, mask)
@@ -0,0 +1,96 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from customers.models import Notification, ReverseDueDiligence, ReverseDueDiligenceMessage
+from customers.rdd import format_cursor, mark_thread_read, message_page, parse_cursor, with_unread
+
+from .helpers import make_company, make_user
+
+
+class RddThreadTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('cliente')
+        cls.staff = make_user('equipe', 'Equipe')
+        company = make_company(cls.owner)
+        cls.thread = ReverseDueDiligence.objects.create(company=company, created_by=cls.staff, subject='Dúvida', description='...')
+        start = timezone.now() - timedelta(days=1)
+        cls.messages = []
+        for index in range(7):
+            message = ReverseDueDiligenceMessage.objects.create(thread=cls.thread, author=cls.owner, body=f'm{index}')
+            # Duas mensagens por instante: o id desempata o cursor
+            ReverseDueDiligenceMessage.objects.filter(pk=message.pk).update(created_at=start + timedelta(minutes=index // 2))
+            cls.messages.append(message.pk)
+
+
+class RddPaginationTests(RddThreadTestCase):
+    def test_cursor_round_trip(self):
+        message = ReverseDueDiligenceMessage.objects.get(pk=self.messages[3])
+        self.assertEqual(parse_cursor(format_cursor(message)), (message.created_at, message.pk))
+        for value in (None, '', 'abc', '1-2-3'):
+            self.assertIsNone(parse_cursor(value))
+
+    def test_pages_walk_back_without_gaps(self):
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = message_page(self.thread, before=cursor, limit=3)
+            seen = [m.pk for m in page] + seen
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.messages)
+
+    def test_first_page_is_newest_oldest_first(self):
+        page, cursor = message_page(self.thread, limit=3)
+        self.assertEqual([m.pk for m in page], self.messages[-3:])
+        self.assertIsNotNone(cursor)
+        page, cursor = message_page(self.thread, limit=10)
+        self.assertEqual(len(page), 7)
+        self.assertIsNone(cursor)
+
+    def test_older_link_renders_the_previous_page(self):
+        self.client.force_login(self.staff)
+        with self.settings(RDD_MESSAGES_PER_PAGE=3):
+            response = self.client.get(self.thread.get_absolute_url())
+            self.assertEqual([m.pk for m in response.context['thread_messages']], self.messages[-3:])
+            response = self.client.get(self.thread.get_absolute_url(), {'before': response.context['older_cursor']})
+        self.assertEqual([m.pk for m in response.context['thread_messages']], self.messages[1:4])
+
+
+class RddUnreadTests(RddThreadTestCase):
+    def test_unread_counts_and_read_cursor(self):
+        unread = {t.pk: t.unread_count for t in with_unread(ReverseDueDiligence.objects.all(), self.staff)}
+        self.assertEqual(unread[self.thread.pk], 7)
+        # O autor já leu as próprias mensagens
+        self.assertEqual(with_unread(ReverseDueDiligence.objects.all(), self.owner).get().unread_count, 0)
+
+        thread = ReverseDueDiligence.objects.get(pk=self.thread.pk)
+        self.assertTrue(mark_thread_read(self.staff, thread))
+        self.assertFalse(mark_thread_read(self.staff, thread))
+        self.assertEqual(with_unread(ReverseDueDiligence.objects.all(), self.staff).get().unread_count, 0)
+
+        ReverseDueDiligenceMessage.objects.create(thread=self.thread, author=self.owner, body='nova')
+        self.assertEqual(with_unread(ReverseDueDiligence.objects.all(), self.staff).get().unread_count, 1)
+
+    def test_visit_clears_notifications_without_new_messages(self):
+        thread = ReverseDueDiligence.objects.get(pk=self.thread.pk)
+        mark_thread_read(self.staff, thread)
+        Notification.objects.create(recipient=self.staff, message='RDD reaberto: Dúvida', rdd=self.thread)
+        self.client.force_login(self.staff)
+        response = self.client.get(self.thread.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Notification.objects.filter(recipient=self.staff, is_read=False).exists())
+
+    def test_visit_skips_the_update_without_unread_notifications_of_the_thread(self):
+        other = ReverseDueDiligence.objects.create(company=self.thread.company, created_by=self.staff, subject='Outro', description='...')
+        Notification.objects.create(recipient=self.staff, message='Novo RDD: Outro', rdd=other)
+        thread = ReverseDueDiligence.objects.get(pk=self.thread.pk)
+        mark_thread_read(self.staff, thread)
+        self.client.force_login(self.staff)
+        with mock.patch('customers.views.mark_read') as mark_read:
+            self.assertEqual(self.client.get(self.thread.get_absolute_url()).status_code, 200)
+        mark_read.assert_not_called()
+        self.assertTrue(Notification.objects.filter(recipient=self.staff, rdd=other, is_read=False).exists())
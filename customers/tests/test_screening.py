@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from customers.models import MajorShareholder, OwnershipManagementInfo, SanctionsScreeningHit
+from customers.screening import (
+    WatchlistIndex, get_index, load_watchlist, normalize_name, screen_company, screen_portfolio,
+)
+
+from .helpers import make_company, make_user
+
+
+class WatchlistTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def write(self, filename, content):
+        path = os.path.join(self.dir, filename)
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(content)
+        return path
+
+    def test_names_compare_without_order_accents_or_suffixes(self):
+        self.assertEqual(normalize_name('SMITH, John'), normalize_name('John Smith'))
+        self.assertEqual(normalize_name('Alfa Comércio S.A.'), 'alfa comercio')
+        # Só partículas: mantém as palavras em vez de um nome vazio
+        self.assertEqual(normalize_name('The Company'), 'company the')
+
+    def test_loads_csv_ofac_and_json(self):
+        csv_path = self.write('lista.csv', 'uid,name,type,programs,aliases\n7,Ivan Petrov,Individual,RUSSIA,Ivan P.;I. Petrov\n')
+        [entry] = load_watchlist(csv_path)
+        self.assertEqual((entry.uid, entry.name, entry.aliases), ('7', 'Ivan Petrov', ('Ivan P.', 'I. Petrov')))
+
+        ofac_path = self.write('sdn.csv', '36,"AEROCARIBBEAN AIRLINES",-0-,"CUBA",-0-\n')
+        [entry] = load_watchlist(ofac_path)
+        self.assertEqual((entry.uid, entry.name, entry.type, entry.programs), ('36', 'AEROCARIBBEAN AIRLINES', '', 'CUBA'))
+
+        json_path = self.write('lista.json', json.dumps({'entries': [{'name': 'Acme Trading', 'aliases': ['Acme']}, {'name': ''}]}))
+        [entry] = load_watchlist(json_path)
+        self.assertEqual((entry.uid, entry.aliases), ('1', ('Acme',)))
+
+    def test_match_scores_names_and_aliases(self):
+        index = WatchlistIndex(load_watchlist(self.write('lista.csv', 'name,aliases\nIvan Petrov,Ivan Petroff\nMaria Souza,\n')))
+        [(entry, score)] = index.match('PETROV, Ivan', 0.8)
+        self.assertEqual((entry.name, score), ('Ivan Petrov', 1.0))
+        self.assertEqual(index.match('Ivan Petroff Ltda', 0.8)[0][0].name, 'Ivan Petrov')
+        self.assertEqual(index.match('João Lima', 0.5), [])
+
+    def test_index_is_rebuilt_only_when_the_file_changes(self):
+        path = self.write('lista.csv', 'name\nIvan Petrov\n')
+        first = get_index(path)
+        self.assertIs(get_index(path), first)
+        self.write('lista.csv', 'name\nIvan Petrov\nMaria Souza\n')
+        second = get_index(path)
+        self.assertIsNot(second, first)
+        self.assertEqual(len(second), 2)
+        self.assertNotEqual(second.version, first.version)
+
+
+class ScreeningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('cliente')
+        cls.company = make_company(cls.owner, full_company_name='Acme Trading Ltda', aliases_trade_names='Alfa Oil')
+        cls.other = make_company(cls.owner, full_company_name='Beta Comércio', cnpj='22.222.222/0001-22')
+        om = OwnershipManagementInfo.objects.create(company=cls.company)
+        cls.shareholder = MajorShareholder.objects.create(
+            ownership_management=om, company_individual='Individual', name_of_individual_company='Ivan Petrov',
+            nationality_registered_country='Rússia', address_registered_business_address='-',
+            type_of_relationship='Acionista', percentage_of_ownership=30,
+        )
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.path = os.path.join(self.dir, 'lista.csv')
+        with open(self.path, 'w', encoding='utf-8') as fh:
+            fh.write('uid,name,programs\n1,ACME TRADING,SDGT\n2,"PETROV, Ivan",RUSSIA\n')
+
+    def test_company_and_parties_are_screened(self):
+        matches = screen_company(self.company, threshold=0.9, path=self.path)
+        self.assertEqual(
+            sorted((m.source, m.object_id, m.entry.uid) for m in matches),
+            [('company', self.company.pk, '1'), ('shareholder', self.shareholder.pk, '2')],
+        )
+        hits = SanctionsScreeningHit.objects.filter(company=self.company)
+        self.assertEqual(hits.count(), 2)
+        self.assertEqual({hit.list_version for hit in hits}, {get_index(self.path).version})
+
+        # Nova triagem substitui os resultados anteriores da empresa
+        with open(self.path, 'w', encoding='utf-8') as fh:
+            fh.write('uid,name\n3,Outro Nome\n')
+        self.assertEqual(screen_company(self.company, threshold=0.9, path=self.path), [])
+        self.assertFalse(SanctionsScreeningHit.objects.exists())
+
+    def test_portfolio_run_is_skipped_for_the_same_list(self):
+        run = screen_portfolio(path=self.path, threshold=0.9, workers=1)
+        self.assertEqual((run.companies_screened, run.hits), (2, 2))
+        self.assertIsNone(screen_portfolio(path=self.path, threshold=0.9, workers=1, only_if_changed=True))
+        self.assertIsNotNone(screen_portfolio(path=self.path, threshold=0.8, workers=1, only_if_changed=True))
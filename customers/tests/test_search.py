@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from customers.models import Company
+from customers.search import index_tokens, query_tokens, search_companies
+
+from .helpers import make_company, make_user
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = make_user('cliente')
+        cls.sao_paulo = make_company(owner, full_company_name='São Paulo Comércio S.A.', cnpj='11.222.333/0001-44')
+        cls.paulista = make_company(owner, full_company_name='Transportes Rio', registered_business_address='Av. Paulista, 100', cnpj='')
+        cls.other = make_company(owner, full_company_name='Beta Ltda', cnpj='99.888.777/0001-66')
+
+    def search(self, query):
+        return list(search_companies(Company.objects.all(), query).order_by('-search_rank', '-created_at'))
+
+    def test_tokens_are_folded(self):
+        self.assertEqual(index_tokens('São Paulo S.A.'), ['sao', 'paulo', 's', 'a', 'sa'])
+        self.assertEqual(query_tokens('  SÃO   paulo '), ['sao', 'paulo'])
+
+    def test_identifiers_drop_their_mask(self):
+        self.assertIn('11222333000144', index_tokens('11.222.333/0001-44', identifier=True))
+        self.assertEqual(query_tokens('11.222.333/0001-44'), ['11222333000144'])
+        self.assertEqual(self.search('11222333'), [self.sao_paulo])
+        self.assertEqual(self.search('11.222.333/0001-44'), [self.sao_paulo])
+
+    def test_punctuation_only_query_filters_nothing(self):
+        self.assertEqual(query_tokens('- !!! ...'), [])
+        for query in ('-', '!!!', ''):
+            results = self.search(query)
+            self.assertEqual(len(results), 3)
+            self.assertTrue(all(company.search_rank == 0 for company in results))
+
+    def test_every_token_must_match(self):
+        self.assertEqual(self.search('paulo comercio'), [self.sao_paulo])
+        self.assertEqual(self.search('paulo beta'), [])
+
+    def test_name_outranks_address_and_exact_outranks_prefix(self):
+        results = self.search('paul')
+        self.assertEqual(results, [self.sao_paulo, self.paulista])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+        exact = self.search('paulo')[0].search_rank
+        self.assertEqual(exact, 2 * self.search('paul')[0].search_rank)
+
+    def test_company_list_view_handles_punctuation(self):
+        staff = make_user('equipe', 'Equipe')
+        self.client.force_login(staff)
+        for query in ('-', '!!!', 'paulo'):
+            response = self.client.get('/customers/', {'q': query})
+            self.assertEqual(response.status_code, 200, query)
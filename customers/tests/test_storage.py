@@ -0,0 +1,83 @@
+import hashlib
+import os
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import TestCase
+
+from customers.models import DOCUMENT_TYPE_CHOICES, KYCDocument, StoredBlob, StoredFile
+from customers.storage import release_file, sweep_orphans
+
+from .helpers import MediaTestMixin
+
+
+class ContentAddressedStorageTests(MediaTestMixin, TestCase):
+    def upload(self, content, name='contrato.pdf'):
+        return KYCDocument.objects.create(
+            company=self.company, document_type=DOCUMENT_TYPE_CHOICES[0][0], file=ContentFile(content, name=name),
+        )
+
+    def test_identical_content_is_stored_once(self):
+        first = self.upload(b'%PDF-1.4 mesmo conteudo')
+        second = self.upload(b'%PDF-1.4 mesmo conteudo')
+        self.assertNotEqual(first.file.name, second.file.name)
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(StoredFile.objects.filter(blob=blob).count(), 2)
+
+    def test_release_drops_blob_with_last_reference(self):
+        first = self.upload(b'%PDF-1.4 compartilhado')
+        second = self.upload(b'%PDF-1.4 compartilhado')
+        blob_path = default_storage.blob_path(StoredBlob.objects.get().sha256)
+
+        first.delete()
+        release_file(first.file.name, default_storage)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertFalse(default_storage.exists(first.file.name))
+        with second.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'%PDF-1.4 compartilhado')
+
+        second.delete()
+        release_file(second.file.name, default_storage)
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(default_storage.exists(blob_path))
+
+    def test_release_keeps_names_still_referenced(self):
+        document = self.upload(b'%PDF-1.4 em uso')
+        release_file(document.file.name, default_storage)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertTrue(default_storage.exists(document.file.name))
+
+    def test_sweep_removes_files_of_rolled_back_uploads(self):
+        kept = self.upload(b'%PDF-1.4 guardado')
+        for content in (b'%PDF-1.4 guardado', b'%PDF-1.4 descartado'):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.upload(content, name='desfeito.pdf')
+                raise RuntimeError
+
+        self.assertEqual(sweep_orphans(default_storage), (0, 0, 0))
+        self.assertEqual(sweep_orphans(default_storage, grace_seconds=-60), (1, 2, 0))
+        with kept.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'%PDF-1.4 guardado')
+        self.assertFalse(default_storage.exists('kyc_documents/desfeito.pdf'))
+
+    def test_sweep_rechecks_rows_created_after_the_listing(self):
+        document = self.upload(b'%PDF-1.4 recente')
+        # Linhas lidas antes do upload terminar: nada conhecido, mas blob e nome já têm linha
+        with mock.patch('customers.storage._known_rows', return_value=(set(), set())):
+            self.assertEqual(sweep_orphans(default_storage, grace_seconds=-60), (0, 0, 0))
+        with document.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'%PDF-1.4 recente')
+
+    def test_upload_rewrites_blob_left_by_rolled_back_upload(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.upload(b'%PDF-1.4 de novo', name='desfeito.pdf')
+            raise RuntimeError
+        blob_path = default_storage.blob_path(hashlib.sha256(b'%PDF-1.4 de novo').hexdigest())
+        leftover = os.stat(blob_path).st_ino
+
+        document = self.upload(b'%PDF-1.4 de novo')
+        self.assertNotEqual(os.stat(blob_path).st_ino, leftover)
+        self.assertTrue(os.path.samefile(blob_path, document.file.path))
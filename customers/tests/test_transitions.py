@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from customers.models import DecisionRollup, PendingOwnerRollup, StatusControl, StatusTransition
+from customers.transitions import decisions_per_day, owner_turnaround, rebuild_rollups, record_transition
+from customers.workflow import Department
+
+from .helpers import make_company, make_user
+
+Decision = StatusTransition.Decision
+
+
+class TransitionLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('analista', 'Compliance')
+        cls.company = make_company(make_user('cliente'))
+
+    def test_record_transition_closes_the_stay(self):
+        sc = StatusControl.objects.get(company=self.company)
+        start = sc.pending_since
+        now = start + timedelta(hours=2)
+        sc.pending_owner = 'FINANCE'
+        sc.save(update_fields=['pending_owner'])
+
+        event = record_transition(sc, Department.COMPLIANCE, Decision.APPROVE, 'NONE', self.user, now=now)
+
+        self.assertEqual(event.duration_seconds, 7200)
+        self.assertEqual((event.from_owner, event.to_owner), ('NONE', 'FINANCE'))
+        self.assertEqual(event.actor, self.user)
+        self.assertEqual(StatusControl.objects.get(pk=sc.pk).pending_since, now)
+        stay = PendingOwnerRollup.objects.get(day=timezone.localdate(now), pending_owner='NONE')
+        self.assertEqual((stay.stays, stay.total_seconds, stay.max_seconds), (1, 7200, 7200))
+
+    def test_same_owner_counts_decision_without_stay(self):
+        sc = StatusControl.objects.get(company=self.company)
+        stays = PendingOwnerRollup.objects.count()
+        event = record_transition(sc, Department.FINANCE, Decision.REJECT, sc.pending_owner)
+        self.assertIsNone(event.duration_seconds)
+        self.assertEqual(PendingOwnerRollup.objects.count(), stays)
+        self.assertEqual(DecisionRollup.objects.get(department=Department.FINANCE, decision=Decision.REJECT).count, 1)
+
+    def test_rollups_accumulate_and_rebuild(self):
+        sc = StatusControl.objects.get(company=self.company)
+        base = sc.pending_since
+        for owner, hours in (('FINANCE', 1), ('TRADING', 3)):
+            previous = sc.pending_owner
+            sc.pending_owner = owner
+            record_transition(sc, Department.COMPLIANCE, Decision.APPROVE, previous, now=base + timedelta(hours=hours))
+
+        report = owner_turnaround(today=timezone.localdate(base + timedelta(hours=3)))
+        self.assertEqual(report['NONE']['max_seconds'], 3600)
+        self.assertEqual(report['FINANCE']['avg_seconds'], 7200)
+
+        expected_stays = sorted(PendingOwnerRollup.objects.values_list('day', 'pending_owner', 'stays', 'total_seconds', 'max_seconds'))
+        expected_decisions = decisions_per_day(today=timezone.localdate(base + timedelta(hours=3)))
+        PendingOwnerRollup.objects.update(stays=0)
+        DecisionRollup.objects.all().delete()
+        rebuild_rollups()
+        self.assertEqual(
+            sorted(PendingOwnerRollup.objects.values_list('day', 'pending_owner', 'stays', 'total_seconds', 'max_seconds')),
+            expected_stays,
+        )
+        self.assertEqual(decisions_per_day(today=timezone.localdate(base + timedelta(hours=3))), expected_decisions)
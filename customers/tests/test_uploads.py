@@ -0,0 +1,180 @@
+import base64
+import io
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from customers.forms import KYCDocumentForm
+from customers.models import (
+    DOCUMENT_TYPE_CHOICES, KYCDocument, ReverseDueDiligence, ReverseDueDiligenceAttachment, UploadSession,
+)
+from customers.uploads import UploadError, append_chunk, create_session
+
+from .helpers import MediaTestMixin
+
+
+class ChunkedUploadTests(MediaTestMixin, TestCase):
+    data = b'%PDF-1.4\n' + bytes(range(256)) * 40
+
+    def open_session(self):
+        return create_session(self.owner, len(self.data), {
+            'target': 'kyc_document', 'filename': 'balanco.pdf',
+            'company': str(self.company.pk), 'document_type': DOCUMENT_TYPE_CHOICES[0][0],
+        })
+
+    def test_resume_at_offset_completes_upload(self):
+        session = self.open_session()
+        append_chunk(session, 0, io.BytesIO(self.data[:4000]))
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).offset, 4000)
+
+        # Retomada com uma instância nova, como outra requisição faria após o HEAD
+        session = UploadSession.objects.get(pk=session.pk)
+        append_chunk(session, session.offset, io.BytesIO(self.data[4000:]))
+
+        self.assertEqual(session.status, UploadSession.Status.COMPLETED)
+        document = KYCDocument.objects.get(pk=session.object_id)
+        with document.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.data)
+
+    def test_wrong_offset_is_rejected(self):
+        session = self.open_session()
+        append_chunk(session, 0, io.BytesIO(self.data[:100]))
+        for offset in (0, 50, 'abc'):
+            with self.assertRaises(UploadError) as caught:
+                append_chunk(session, offset, io.BytesIO(b'xx'))
+            self.assertIn(caught.exception.status, (400, 409))
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).offset, 100)
+
+    def test_stale_session_sees_the_stored_offset(self):
+        session = self.open_session()
+        stale = UploadSession.objects.get(pk=session.pk)
+        append_chunk(session, 0, io.BytesIO(self.data[:100]))
+        with self.assertRaises(UploadError) as caught:
+            append_chunk(stale, 0, io.BytesIO(b'%PDF-junk'))
+        self.assertEqual(caught.exception.status, 409)
+        self.assertEqual(stale.offset, 100)
+
+    def test_concurrent_patch_is_locked_out(self):
+        session = self.open_session()
+        outcome = []
+
+        class RacingBody(io.BytesIO):
+            def read(inner, size=-1):
+                if not outcome:
+                    try:
+                        append_chunk(UploadSession.objects.get(pk=session.pk), 0, io.BytesIO(b'%PDF-outro'))
+                    except UploadError as exc:
+                        outcome.append(exc.status)
+                return super().read(size)
+
+        append_chunk(session, 0, RacingBody(self.data[:500]))
+        self.assertEqual(outcome, [423])
+        with open(f'{self.media}/.uploads/{session.pk}', 'rb') as fh:
+            self.assertEqual(fh.read(), self.data[:500])
+
+    def test_content_must_match_extension(self):
+        session = self.open_session()
+        with self.assertRaises(UploadError) as caught:
+            append_chunk(session, 0, io.BytesIO(b'GIF89a' + b'\0' * 20))
+        self.assertEqual(caught.exception.status, 415)
+        self.assertFalse(UploadSession.objects.filter(pk=session.pk).exists())
+
+    def test_declared_length_is_enforced(self):
+        session = self.open_session()
+        with self.assertRaises(UploadError) as caught:
+            append_chunk(session, 0, io.BytesIO(self.data + b'extra'))
+        self.assertEqual(caught.exception.status, 413)
+
+    def test_kyc_metadata_goes_through_the_form(self):
+        metadata = {
+            'target': 'kyc_document', 'filename': 'balanco.pdf', 'company': str(self.company.pk),
+            'document_type': 'inexistente',
+        }
+        with self.assertRaises(UploadError):
+            create_session(self.owner, len(self.data), metadata)
+
+        metadata.update(document_type=DOCUMENT_TYPE_CHOICES[0][0], description='', is_recommended='true')
+        session = create_session(self.owner, len(self.data), metadata)
+        append_chunk(session, 0, io.BytesIO(self.data))
+        document = KYCDocument.objects.get(pk=session.object_id)
+        self.assertTrue(document.is_recommended)
+        self.assertIsNone(document.description)
+
+    @override_settings(UPLOAD_MAX_SIZE=1000)
+    def test_one_size_limit_for_both_paths(self):
+        with self.assertRaises(UploadError) as caught:
+            self.open_session()
+        self.assertEqual(caught.exception.status, 413)
+        form = KYCDocumentForm(
+            data={'document_type': DOCUMENT_TYPE_CHOICES[0][0]},
+            files={'file': SimpleUploadedFile('balanco.pdf', self.data)},
+        )
+        self.assertIn('file', form.errors)
+
+
+def encode_metadata(**metadata):
+    return ','.join(f'{key} {base64.b64encode(str(value).encode()).decode()}' for key, value in metadata.items())
+
+
+class UploadPagesTests(MediaTestMixin, TestCase):
+    data = b'%PDF-1.4\n' + b'x' * 300
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.owner)
+
+    def test_api_requires_the_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.owner)
+        token = client.get(reverse('customers:kyc_document_add', args=[self.company.pk])).cookies['csrftoken'].value
+        headers = {
+            'HTTP_UPLOAD_LENGTH': str(len(self.data)),
+            'HTTP_UPLOAD_METADATA': encode_metadata(
+                target='kyc_document', filename='balanco.pdf', company=self.company.pk,
+                document_type=DOCUMENT_TYPE_CHOICES[0][0],
+            ),
+        }
+        self.assertEqual(client.post(reverse('customers:upload_create'), **headers).status_code, 403)
+        response = client.post(reverse('customers:upload_create'), HTTP_X_CSRFTOKEN=token, **headers)
+        self.assertEqual(response.status_code, 201)
+
+    def test_only_the_create_page_uses_chunked_upload(self):
+        response = self.client.get(reverse('customers:kyc_document_add', args=[self.company.pk]))
+        self.assertContains(response, 'data-chunked-upload="kyc_document"')
+        self.assertContains(response, 'js/chunked-upload.js')
+        document = KYCDocument.objects.create(
+            company=self.company, document_type=DOCUMENT_TYPE_CHOICES[0][0],
+            file=SimpleUploadedFile('balanco.pdf', self.data),
+        )
+        response = self.client.get(reverse('customers:kyc_document_edit', args=[self.company.pk, document.pk]))
+        self.assertNotContains(response, 'data-chunked-upload')
+
+    def test_rdd_message_then_chunked_attachment(self):
+        thread = ReverseDueDiligence.objects.create(
+            company=self.company, created_by=self.owner, subject='Dúvida', description='...',
+        )
+        url = reverse('customers:rdd_detail', args=[thread.pk])
+        self.assertContains(self.client.get(url), 'data-chunked-upload="rdd_message"')
+
+        response = self.client.post(url, {'body': ''}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('body', response.json()['errors'])
+
+        response = self.client.post(url, {'body': 'Segue o contrato'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['url'], thread.get_absolute_url())
+        session = create_session(self.owner, len(self.data), {
+            'target': 'rdd_message', 'filename': 'contrato.pdf', 'message': str(response.json()['message']),
+        })
+        append_chunk(session, 0, io.BytesIO(self.data))
+        attachment = ReverseDueDiligenceAttachment.objects.get(pk=session.object_id)
+        self.assertEqual(attachment.message_id, response.json()['message'])
+
+    def test_rdd_create_answers_json(self):
+        response = self.client.post(reverse('customers:rdd_create'), {
+            'company': self.company.pk, 'subject': 'Novo', 'description': 'Processo',
+        }, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        thread = ReverseDueDiligence.objects.get(subject='Novo')
+        self.assertEqual(response.json(), {'message': thread.messages.get().pk, 'url': thread.get_absolute_url()})
@@ -0,0 +1,174 @@
+from unittest import mock
+
+from django.core.exceptions import PermissionDenied
+from django.test import TestCase
+
+from customers import workflow
+from customers.models import Notification, StatusControl, StatusTransition
+from customers.workflow import Department, Result, apply_transition
+
+from .helpers import make_company, make_user
+
+
+class WorkflowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = make_user('cliente')
+        cls.compliance = make_user('compliance', 'Compliance')
+        cls.finance = make_user('financeiro', 'Financeiro')
+        cls.trading = make_user('trading', 'Trading')
+        cls.supplies = make_user('suprimentos', 'Suprimentos')
+
+    def setUp(self):
+        self.company = make_company(self.client_user)
+
+    def status(self):
+        return StatusControl.objects.get(company=self.company)
+
+    def run_action(self, department, action, user, params=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return apply_transition(self.company, department, action, user, params)
+
+    def test_requirements_met_releases_both_departments(self):
+        sc = self.status()
+        self.assertTrue(sc.min_requirements_met)
+        self.assertEqual(sc.pending_owner, 'NONE')
+
+    def test_compliance_then_finance_reaches_trading(self):
+        result = self.run_action(Department.COMPLIANCE, 'approve', self.compliance)
+        self.assertEqual(result.level, 'success')
+        self.assertEqual(self.status().pending_owner, 'FINANCE')
+
+        self.run_action(Department.FINANCE, 'approve', self.finance)
+        sc = self.status()
+        self.assertTrue(sc.compliance_qualified and sc.treasury_qualified)
+        self.assertEqual(sc.pending_owner, 'TRADING')
+
+    def test_finance_then_compliance_reaches_trading(self):
+        self.run_action(Department.FINANCE, 'approve', self.finance)
+        self.assertEqual(self.status().pending_owner, 'COMPLIANCE')
+        self.run_action(Department.COMPLIANCE, 'approve', self.compliance)
+        self.assertEqual(self.status().pending_owner, 'TRADING')
+
+    def test_compliance_reject_closes_pendency(self):
+        self.run_action(Department.COMPLIANCE, 'reject', self.compliance)
+        sc = self.status()
+        self.assertFalse(sc.compliance_qualified)
+        self.assertFalse(sc.is_pending)
+        self.assertEqual(sc.pending_owner, 'NONE')
+
+    def test_finance_reject_requires_risk(self):
+        result = self.run_action(Department.FINANCE, 'reject', self.finance, {'risk': '  '})
+        self.assertEqual(result.level, 'error')
+        self.assertFalse(StatusTransition.objects.filter(department=Department.FINANCE).exists())
+
+        result = self.run_action(Department.FINANCE, 'reject', self.finance, {'risk': 'Alto'})
+        self.assertEqual(result.level, 'warning')
+        sc = self.status()
+        self.assertEqual(sc.treasury_risk, 'Alto')
+        self.assertEqual(sc.pending_details, 'Financeiro reprovado. Risco: Alto')
+
+    def test_trading_blocked_without_compliance(self):
+        for action in ('approve', 'reject'):
+            result = self.run_action(Department.TRADING, action, self.trading)
+            self.assertEqual(result, Result('error', workflow.DEPARTMENTS[Department.TRADING].blocked))
+        self.assertFalse(self.status().trading_qualified)
+
+    def test_trading_approve_and_reject(self):
+        self.run_action(Department.COMPLIANCE, 'approve', self.compliance)
+        self.run_action(Department.TRADING, 'approve', self.trading)
+        self.assertTrue(self.status().trading_qualified)
+
+        self.run_action(Department.TRADING, 'reject', self.trading, {'reason': 'Sem limite'})
+        sc = self.status()
+        self.assertFalse(sc.trading_qualified)
+        self.assertEqual(sc.trading_reject_reason, 'Sem limite')
+        self.assertIn('Motivo: Sem limite', sc.pending_details)
+
+    def test_final_analysis_and_sap_registration(self):
+        result = self.run_action(Department.FINAL_ANALYSIS, 'approve', self.trading)
+        self.assertEqual(result, Result('error', workflow.DEPARTMENTS[Department.FINAL_ANALYSIS].blocked))
+
+        self.run_action(Department.COMPLIANCE, 'approve', self.compliance)
+        self.run_action(Department.FINAL_ANALYSIS, 'approve', self.trading)
+        self.assertEqual(self.status().pending_owner, 'SUPRIMENTOS')
+
+        self.run_action(Department.SUPRIMENTOS, 'register', self.supplies)
+        sc = self.status()
+        self.assertTrue(sc.client_onboarding_finished)
+        self.assertEqual(sc.pending_owner, 'NONE')
+
+    def test_final_analysis_reject(self):
+        self.run_action(Department.COMPLIANCE, 'approve', self.compliance)
+        self.run_action(Department.FINAL_ANALYSIS, 'reject', self.trading)
+        sc = self.status()
+        self.assertFalse(sc.is_pending)
+        self.assertEqual(sc.pending_details, 'Cliente não cadastrado (Análise Final).')
+
+    def test_unknown_action_is_invalid(self):
+        result = self.run_action(Department.SUPRIMENTOS, 'approve', self.supplies)
+        self.assertEqual(result.level, 'error')
+
+    def test_min_requirements_gate(self):
+        company = make_company(self.client_user, cnpj='')
+        result = apply_transition(company, Department.COMPLIANCE, 'approve', self.compliance)
+        self.assertEqual(result, Result('error', workflow.DEPARTMENTS[Department.COMPLIANCE].min_requirements))
+        self.assertEqual(StatusControl.objects.get(company=company).pending_owner, 'USER')
+
+    def test_permission_denied_for_other_groups(self):
+        with self.assertRaises(PermissionDenied):
+            apply_transition(self.company, Department.FINANCE, 'approve', self.compliance)
+        with self.assertRaises(PermissionDenied):
+            apply_transition(self.company, Department.COMPLIANCE, 'approve', self.client_user)
+
+    def test_notifies_company_owner_after_commit(self):
+        self.run_action(Department.COMPLIANCE, 'approve', self.compliance)
+        self.assertTrue(Notification.objects.filter(
+            recipient=self.client_user, message=f'Compliance validado para {self.company.full_company_name}',
+        ).exists())
+
+    def test_lost_race_is_retried_against_the_new_state(self):
+        # Financeiro aprova entre a leitura do Compliance e o seu UPDATE
+        matches = workflow._matches
+        raced = []
+
+        def racing_matches(rule, status_control):
+            if not raced and rule.department == Department.COMPLIANCE:
+                raced.append(True)
+                apply_transition(self.company, Department.FINANCE, 'approve', self.finance)
+            return matches(rule, status_control)
+
+        with mock.patch.object(workflow, '_matches', racing_matches):
+            result = self.run_action(Department.COMPLIANCE, 'approve', self.compliance)
+
+        self.assertEqual(result.level, 'success')
+        sc = self.status()
+        self.assertTrue(sc.compliance_qualified and sc.treasury_qualified)
+        self.assertEqual(sc.pending_owner, 'TRADING')
+        owners = list(StatusTransition.objects.filter(
+            department__in=[Department.COMPLIANCE, Department.FINANCE],
+        ).order_by('pk').values_list('department', 'from_owner', 'to_owner'))
+        self.assertEqual(owners, [
+            (Department.FINANCE, 'NONE', 'COMPLIANCE'),
+            (Department.COMPLIANCE, 'COMPLIANCE', 'TRADING'),
+        ])
+
+    def test_gives_up_after_max_attempts(self):
+        with mock.patch.object(workflow, '_matches', return_value=True), \
+                mock.patch('customers.workflow.StatusControl.objects.filter') as filter_:
+            filter_.return_value.update.return_value = 0
+            result = apply_transition(self.company, Department.COMPLIANCE, 'approve', self.compliance)
+        self.assertEqual(result.level, 'error')
+        self.assertEqual(filter_.return_value.update.call_count, workflow.MAX_ATTEMPTS)
+
+    def test_requirements_edit_keeps_decisions(self):
+        self.run_action(Department.COMPLIANCE, 'approve', self.compliance)
+        self.company.full_company_name = 'Alfa Comércio Ltda.'
+        self.company.save()
+        self.assertEqual(self.status().pending_owner, 'FINANCE')
+
+        self.company.cnpj = ''
+        self.company.save()
+        sc = self.status()
+        self.assertFalse(sc.min_requirements_met)
+        self.assertEqual(sc.pending_owner, 'USER')
@@ -0,0 +1,140 @@
+"""Workflow event log of StatusControl and its analytics rollups.
+
+Every change of a company's workflow state (department decisions and the
+minimum-requirements check) appends a :class:`StatusTransition` in the same
+transaction as the StatusControl update, via :func:`record_transition`.
+The same call updates two rollup tables with single-row increments:
+
+* ``PendingOwnerRollup``: how long the pendency stayed with each
+  ``pending_owner`` (stays, total and longest), per day the stay ended;
+* ``DecisionRollup``: decisions per day, department and outcome.
+
+``StatusControl.pending_since`` holds when the current owner got the
+pendency, so closing a stay needs no lookup in the history. SLA reports
+(:func:`owner_turnaround`, :func:`decisions_per_day`) read only the
+rollups; ``workflow_sla --rebuild`` recomputes them from the log.
+"""
+
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import DecisionRollup, PendingOwnerRollup, StatusControl, StatusTransition
+
+Department = StatusTransition.Department
+Decision = StatusTransition.Decision
+
+
+def _increment(model, keys, **changes):
+    """``UPDATE ... SET col = <expr>`` on the row of ``keys``, creating it first if needed."""
+    expressions = {field: expr for field, (expr, _) in changes.items()}
+    if model.objects.filter(**keys).update(**expressions):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **{field: initial for field, (_, initial) in changes.items()})
+    except IntegrityError:
+        # Outra transação criou a linha entre o UPDATE e o INSERT
+        model.objects.filter(**keys).update(**expressions)
+
+
+def _add_stay(day, owner, seconds):
+    _increment(
+        PendingOwnerRollup, {'day': day, 'pending_owner': owner},
+        stays=(F('stays') + 1, 1),
+        total_seconds=(F('total_seconds') + seconds, seconds),
+        max_seconds=(Greatest(F('max_seconds'), seconds), seconds),
+    )
+
+
+def _add_decision(day, department, decision):
+    _increment(DecisionRollup, {'day': day, 'department': department, 'decision': decision}, count=(F('count') + 1, 1))
+
+
+def record_transition(status_control, department, decision, from_owner, actor=None, now=None):
+    """Append the event for a StatusControl change already saved, and update the rollups.
+
+    Must run inside the transaction of the change; ``from_owner`` is the
+    ``pending_owner`` before it.
+    """
+    now = now or timezone.now()
+    to_owner = status_control.pending_owner
+    duration = None
+    if from_owner != to_owner:
+        duration = max(int((now - status_control.pending_since).total_seconds()), 0)
+        status_control.pending_since = now
+        StatusControl.objects.filter(pk=status_control.pk).update(pending_since=now)
+    event = StatusTransition.objects.create(
+        company_id=status_control.company_id,
+        department=department,
+        decision=decision,
+        from_owner=from_owner,
+        to_owner=to_owner,
+        duration_seconds=duration,
+        details=status_control.pending_details or '',
+        actor=actor if getattr(actor, 'is_authenticated', False) else None,
+        created_at=now,
+    )
+    day = timezone.localdate(now)
+    if duration is not None:
+        _add_stay(day, from_owner, duration)
+    _add_decision(day, department, decision)
+    return event
+
+
+def rebuild_rollups():
+    """Recompute both rollup tables from the event log; return ``(stays, decisions)`` rows written."""
+    stays = {}
+    decisions = {}
+    for event in StatusTransition.objects.order_by().values('created_at', 'department', 'decision', 'from_owner', 'duration_seconds').iterator():
+        day = timezone.localdate(event['created_at'])
+        key = (day, event['department'], event['decision'])
+        decisions[key] = decisions.get(key, 0) + 1
+        if event['duration_seconds'] is not None:
+            row = stays.setdefault((day, event['from_owner']), [0, 0, 0])
+            row[0] += 1
+            row[1] += event['duration_seconds']
+            row[2] = max(row[2], event['duration_seconds'])
+    with transaction.atomic():
+        PendingOwnerRollup.objects.all().delete()
+        DecisionRollup.objects.all().delete()
+        PendingOwnerRollup.objects.bulk_create([
+            PendingOwnerRollup(day=day, pending_owner=owner, stays=n, total_seconds=total, max_seconds=longest)
+            for (day, owner), (n, total, longest) in stays.items()
+        ], batch_size=500)
+        DecisionRollup.objects.bulk_create([
+            DecisionRollup(day=day, department=department, decision=decision, count=n)
+            for (day, department, decision), n in decisions.items()
+        ], batch_size=500)
+    return len(stays), len(decisions)
+
+
+def owner_turnaround(days=30, today=None):
+    """``{pending_owner: {'stays', 'avg_seconds', 'max_seconds'}}`` over the last ``days`` days."""
+    since = (today or timezone.localdate()) - timedelta(days=days - 1)
+    rows = (
+        PendingOwnerRollup.objects.filter(day__gte=since)
+        .values('pending_owner')
+        .annotate(stays_sum=Sum('stays'), seconds=Sum('total_seconds'), longest=Max('max_seconds'))
+        .order_by('pending_owner')
+    )
+    return {
+        row['pending_owner']: {
+            'stays': row['stays_sum'],
+            'avg_seconds': row['seconds'] / row['stays_sum'] if row['stays_sum'] else 0,
+            'max_seconds': row['longest'],
+        }
+        for row in rows
+    }
+
+
+def decisions_per_day(days=30, department=None, today=None):
+    """``[(day, department, decision, count)]`` over the last ``days`` days."""
+    since = (today or timezone.localdate()) - timedelta(days=days - 1)
+    queryset = DecisionRollup.objects.filter(day__gte=since)
+    if department:
+        queryset = queryset.filter(department=department)
+    return list(queryset.order_by('day', 'department', 'decision').values_list('day', 'department', 'decision', 'count'))
@@ -0,0 +1,302 @@
+"""Resumable, chunked uploads (the core of the tus 1.0 protocol).
+
+* ``POST uploads/`` with ``Upload-Length`` and ``Upload-Metadata`` (``key
+  base64value`` pairs separated by commas: ``target``, ``filename`` and the
+  fields of the target, e.g. ``company`` and ``document_type``) validates the
+  target, its fields (KYC documents go through the same form as the page),
+  permissions and ``UPLOAD_MAX_SIZE`` up front and returns the session URL in
+  ``Location``;
+* ``PATCH <url>`` with ``Upload-Offset`` and an
+  ``application/offset+octet-stream`` body appends a chunk;
+* ``HEAD <url>`` returns the ``Upload-Offset`` to resume from;
+* ``DELETE <url>`` abandons the upload.
+
+Chunks are appended to a staging file under ``CHUNKED_UPLOAD_DIR``; bytes
+received before a connection drops are kept. The file type is checked
+against the extension as soon as the first bytes arrive and the declared
+length is enforced on every chunk. A PATCH holds an exclusive lock on the
+staging file while it writes, so only one request appends at a time. When
+the last byte arrives the staging file is streamed into the target model's
+FileField (KYCDocument, EvaluationRecord, FinalAnalysisAttachment or an RDD
+message attachment).
+
+The browser side is ``static/js/chunked-upload.js``, used by the KYC document
+and RDD pages.
+"""
+
+import base64
+import binascii
+import fcntl
+import os
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files import File
+from django.db import transaction
+from django.forms import modelform_factory
+from django.utils import timezone
+
+from .forms import KYCDocumentForm
+from .models import (
+    Company, EvaluationRecord, FinalAnalysisAttachment, KYCDocument,
+    ReverseDueDiligenceAttachment, ReverseDueDiligenceMessage, UploadSession,
+)
+from .permissions import has_group, is_internal_user
+
+TUS_VERSION = '1.0.0'
+WRITE_CHUNK_SIZE = 64 * 1024
+
+# Assinaturas (magic numbers) aceitas por extensão
+SIGNATURES = {
+    '.pdf': (b'%PDF-',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+}
+SNIFF_LENGTH = max(len(sig) for sigs in SIGNATURES.values() for sig in sigs)
+
+
+class UploadError(Exception):
+    """Request rejected; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_metadata(header):
+    metadata = {}
+    for pair in filter(None, (part.strip() for part in (header or '').split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode('utf-8') if value else ''
+        except (binascii.Error, UnicodeDecodeError):
+            raise UploadError('Upload-Metadata inválido.')
+    return metadata
+
+
+def staging_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, str(session.pk))
+
+
+def _company(user, metadata, allowed):
+    try:
+        company = Company.objects.only('pk', 'created_by_id').get(pk=int(metadata.get('company', '')))
+    except (ValueError, Company.DoesNotExist):
+        raise UploadError('Empresa inválida.')
+    if not allowed(user, company):
+        raise PermissionDenied("Você não tem permissão para enviar arquivos para esta empresa.")
+    return company
+
+
+# --- Destinos: validação dos metadados (na criação) e criação do objeto (no último byte) ---
+# Campos do KYCDocumentForm exceto o arquivo: o upload passa pelas mesmas validações do formulário
+KYCDocumentMetadataForm = modelform_factory(
+    KYCDocument, form=KYCDocumentForm, fields=['document_type', 'description', 'is_recommended'],
+)
+
+
+def _form_errors(form):
+    return ' '.join(error for errors in form.errors.values() for error in errors)
+
+
+def _prepare_kyc_document(user, metadata):
+    company = _company(user, metadata, lambda u, c: is_internal_user(u) or c.created_by_id == u.id)
+    form = KYCDocumentMetadataForm(data={field: metadata.get(field, '') for field in KYCDocumentMetadataForm.base_fields})
+    if not form.is_valid():
+        raise UploadError(_form_errors(form))
+    return {
+        'company_id': company.pk,
+        'document_type': form.cleaned_data['document_type'],
+        'description': form.cleaned_data['description'] or None,
+        'is_recommended': form.cleaned_data['is_recommended'],
+    }
+
+
+def _attach_kyc_document(user, data, file):
+    return KYCDocument.objects.create(file=file, uploaded_by=user, **data)
+
+
+def _prepare_evaluation_record(user, metadata):
+    company = _company(user, metadata, lambda u, c: has_group(u, 'Equipe'))
+    try:
+        evaluation_date = date.fromisoformat(metadata.get('evaluation_date', ''))
+    except ValueError:
+        raise UploadError('Data da avaliação inválida (use AAAA-MM-DD).')
+    return {'company_id': company.pk, 'evaluation_date': evaluation_date.isoformat(), 'notes': metadata.get('notes') or None}
+
+
+def _attach_evaluation_record(user, data, file):
+    return EvaluationRecord.objects.create(file=file, created_by=user, **data)
+
+
+def _prepare_final_analysis_attachment(user, metadata):
+    company = _company(user, metadata, lambda u, c: has_group(u, 'Trading'))
+    return {'company_id': company.pk, 'notes': metadata.get('notes') or None}
+
+
+def _attach_final_analysis_attachment(user, data, file):
+    return FinalAnalysisAttachment.objects.create(file=file, uploaded_by=user, **data)
+
+
+def _prepare_rdd_message(user, metadata):
+    try:
+        message = ReverseDueDiligenceMessage.objects.select_related('thread__company').get(pk=int(metadata.get('message', '')))
+    except (ValueError, ReverseDueDiligenceMessage.DoesNotExist):
+        raise UploadError('Mensagem inválida.')
+    thread = message.thread
+    if not is_internal_user(user) and user.id not in (thread.created_by_id, thread.company.created_by_id):
+        raise PermissionDenied("Você não tem acesso a este RDD.")
+    if message.author_id != user.id:
+        raise PermissionDenied("Só o autor pode anexar arquivos à mensagem.")
+    return {'message_id': message.pk}
+
+
+def _attach_rdd_message(user, data, file):
+    return ReverseDueDiligenceAttachment.objects.create(file=file, uploaded_by=user, **data)
+
+
+TARGETS = {
+    'kyc_document': (_prepare_kyc_document, _attach_kyc_document),
+    'evaluation_record': (_prepare_evaluation_record, _attach_evaluation_record),
+    'final_analysis_attachment': (_prepare_final_analysis_attachment, _attach_final_analysis_attachment),
+    'rdd_message': (_prepare_rdd_message, _attach_rdd_message),
+}
+
+
+def create_session(user, length, metadata):
+    """Validate the upload up front and open its staging file."""
+    target = metadata.get('target')
+    if target not in TARGETS:
+        raise UploadError('Destino do upload inválido.')
+    filename = os.path.basename((metadata.get('filename') or '').replace('\\', '/'))
+    if os.path.splitext(filename)[1].lower() not in SIGNATURES:
+        raise UploadError('Tipo de arquivo não suportado. Envie PDF ou imagem (JPG/PNG).', status=415)
+    try:
+        length = int(length)
+    except (TypeError, ValueError):
+        raise UploadError('Upload-Length inválido.')
+    if length <= 0:
+        raise UploadError('Upload-Length inválido.')
+    if length > settings.UPLOAD_MAX_SIZE:
+        raise UploadError('Arquivo muito grande.', status=413)
+
+    data = TARGETS[target][0](user, metadata)
+    session = UploadSession.objects.create(
+        created_by=user,
+        target=target,
+        metadata=data,
+        filename=filename,
+        length=length,
+        expires_at=timezone.now() + timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS),
+    )
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(staging_path(session), 'wb').close()
+    return session
+
+
+def _check_signature(session, path):
+    with open(path, 'rb') as fh:
+        head = fh.read(SNIFF_LENGTH)
+    signatures = SIGNATURES[os.path.splitext(session.filename)[1].lower()]
+    return any(head.startswith(sig) for sig in signatures)
+
+
+def append_chunk(session, offset, stream):
+    """Append the request body at ``offset``; finishes the upload on the last byte.
+
+    The bytes written before a dropped connection are kept, so the client
+    resumes from the offset returned by HEAD. The staging file is locked for
+    the whole request and the offset is read again under the lock, so a
+    concurrent or retried PATCH never writes over bytes being received.
+    """
+    if session.status != UploadSession.Status.OPEN:
+        raise UploadError('Upload já concluído.', status=409)
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        raise UploadError('Upload-Offset inválido.')
+    if offset != session.offset:
+        raise UploadError('Upload-Offset não confere com o recebido.', status=409)
+
+    path = staging_path(session)
+    try:
+        fh = open(path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Upload não encontrado.', status=404)
+    with fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Outro envio deste upload está em andamento.', status=423)
+        # Outro envio pode ter avançado o upload entre a leitura da sessão e o lock
+        current = UploadSession.objects.filter(pk=session.pk).values_list('offset', 'status').first()
+        if current is None or current[1] != UploadSession.Status.OPEN:
+            raise UploadError('Upload já concluído.', status=409)
+        if current[0] != offset:
+            session.offset = current[0]
+            raise UploadError('Upload-Offset não confere com o recebido.', status=409)
+
+        position = offset
+        too_large = False
+        try:
+            fh.seek(offset)
+            while True:
+                chunk = stream.read(WRITE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if position + len(chunk) > session.length:
+                    too_large = True
+                    break
+                fh.write(chunk)
+                position += len(chunk)
+            fh.truncate(position)
+        finally:
+            # Guarda o progresso mesmo se a conexão cair no meio do bloco
+            if position != offset:
+                fh.flush()
+                UploadSession.objects.filter(pk=session.pk, offset=offset).update(
+                    offset=position, updated_at=timezone.now(),
+                )
+                session.offset = position
+
+        if too_large:
+            raise UploadError('O envio ultrapassa o Upload-Length declarado.', status=413)
+        if offset < SNIFF_LENGTH <= position or (offset < SNIFF_LENGTH and position == session.length):
+            if not _check_signature(session, path):
+                abort(session)
+                raise UploadError('O conteúdo não corresponde ao tipo do arquivo.', status=415)
+        if position == session.length:
+            finish(session)
+    return session
+
+
+def finish(session):
+    """Create the target object from the staging file (streamed, never read whole)."""
+    path = staging_path(session)
+    attach = TARGETS[session.target][1]
+    with open(path, 'rb') as fh, transaction.atomic():
+        obj = attach(session.created_by, session.metadata, File(fh, name=session.filename))
+        session.status = UploadSession.Status.COMPLETED
+        session.object_id = obj.pk
+        session.save(update_fields=['status', 'object_id', 'updated_at'])
+    os.remove(path)
+    return obj
+
+
+def abort(session):
+    path = staging_path(session)
+    if os.path.exists(path):
+        os.remove(path)
+    session.delete()
+
+
+def prune_expired(now=None):
+    """Delete expired sessions (and their staging files); returns how many."""
+    expired = UploadSession.objects.filter(expires_at__lt=now or timezone.now())
+    count = 0
+    for session in expired.iterator():
+        abort(session)
+        count += 1
+    return count
@@ -16,10 +16,16 @@ from .views import (
     ShareholderCreateView, ShareholderUpdateView, ShareholderDeleteView,
 )
 from .views_docs import KYCDocumentCreateView, KYCDocumentUpdateView, KYCDocumentDeleteView
+from .views_media import kyc_document_file, evaluation_record_file, final_analysis_attachment_file, rdd_attachment_file
+from .views_media import kyc_document_thumbnail, evaluation_record_thumbnail, final_analysis_attachment_thumbnail, company_dossier
+from .views_uploads import upload_create, upload_detail
+from .views_events import rdd_events, notification_events
 from .views import PriorBusinessRelationshipCreateView, PriorBusinessRelationshipUpdateView, PriorBusinessRelationshipDeleteView
 from .views import EvaluationRecordUploadView
 from .views import CompanyEvaluationUpdateView
 from .views import ReverseDueDiligenceCreateView, ReverseDueDiligenceDetailView, ReverseDueDiligenceListView
+from .views import NotificationInboxView, notification_open, notifications_mark_all_read
+from .views import PartySearchView, company_screening
 from .views import compliance_decision, finance_decision, trading_decision, final_analysis_decision, suprimentos_register_sap, FinalAnalysisAttachmentUploadView, final_analysis_attachment_approve
 
 # IMPORTANTE: Importar ONBOARDING_STEP_SLUGS de customers.utils
@@ -86,6 +92,19 @@ urlpatterns = [
     path('onboarding/<int:pk>/documents/<int:doc_pk>/edit/', KYCDocumentUpdateView.as_view(), name='kyc_document_edit'),
     path('onboarding/<int:pk>/documents/<int:doc_pk>/delete/', KYCDocumentDeleteView.as_view(), name='kyc_document_delete'),
 
+    # Download autenticado dos arquivos enviados (X-Accel-Redirect / X-Sendfile / FileResponse)
+    path('files/kyc/<int:pk>/', kyc_document_file, name='kyc_document_file'),
+    path('files/evaluations/<int:pk>/', evaluation_record_file, name='evaluation_record_file'),
+    path('files/final-analysis/<int:pk>/', final_analysis_attachment_file, name='final_analysis_attachment_file'),
+    path('files/rdd/<int:pk>/', rdd_attachment_file, name='rdd_attachment_file'),
+    path('files/kyc/<int:pk>/thumbnail/', kyc_document_thumbnail, name='kyc_document_thumbnail'),
+    path('files/evaluations/<int:pk>/thumbnail/', evaluation_record_thumbnail, name='evaluation_record_thumbnail'),
+    path('files/final-analysis/<int:pk>/thumbnail/', final_analysis_attachment_thumbnail, name='final_analysis_attachment_thumbnail'),
+
+    # Upload retomável em blocos (protocolo tus: POST cria, PATCH envia, HEAD consulta)
+    path('uploads/', upload_create, name='upload_create'),
+    path('uploads/<uuid:upload_id>/', upload_detail, name='upload_detail'),
+
     # Rota de redirecionamento para a primeira etapa do onboarding de uma empresa existente.
     # Útil se alguém acessar /customers/onboarding/<id_da_empresa>/ sem um slug de etapa.
     # Acessível via /customers/onboarding/<id_da_empresa>/start/
@@ -98,6 +117,22 @@ urlpatterns = [
     path('rdd/', ReverseDueDiligenceListView.as_view(), name='rdd_list'),
     path('rdd/new/', ReverseDueDiligenceCreateView.as_view(), name='rdd_create'),
     path('rdd/<int:pk>/', ReverseDueDiligenceDetailView.as_view(), name='rdd_detail'),
+    path('rdd/<int:pk>/events/', rdd_events, name='rdd_events'),
+
+    # Notificações
+    path('notifications/', NotificationInboxView.as_view(), name='notification_inbox'),
+    path('notifications/events/', notification_events, name='notification_events'),
+    path('notifications/read-all/', notifications_mark_all_read, name='notifications_mark_all_read'),
+    path('notifications/<int:pk>/open/', notification_open, name='notification_open'),
+
+    # Busca de partes relacionadas (pessoas/entidades) em todas as empresas
+    path('parties/', PartySearchView.as_view(), name='party_search'),
+
+    # Dossiê completo (arquivos + manifesto) em ZIP gerado sob demanda
+    path('<int:pk>/dossier.zip', company_dossier, name='company_dossier'),
+
+    # Triagem de sanções sob demanda
+    path('<int:pk>/screening/', company_screening, name='company_screening'),
 
     # Compliance actions
     path('<int:pk>/compliance/<str:decision>/', compliance_decision, name='compliance_decision'),
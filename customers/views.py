@@ -1,5 +1,6 @@
 # customers/views.py
 
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.views.generic import CreateView, UpdateView, ListView
@@ -10,17 +11,19 @@ from django.views.generic import DetailView
 from django.views.generic import TemplateView
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import AccessMixin, LoginRequiredMixin # Importar este se estiver usando o StaffRequiredMixin
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ImproperlyConfigured
 from django.contrib import messages
 from django.utils.translation import gettext as _
 from django.contrib.auth.views import LogoutView
+from django.views.decorators.http import require_POST
+from django.utils.http import url_has_allowed_host_and_scheme
 from datetime import date, timedelta
 
 # Importar modelos e formulários que não são parte do FORM_MODEL_MAPPING diretamente
 from .models import Company, IndividualContact, KYCDocument, \
     BusinessInformation, OwnershipManagementInfo, ComplianceInformation, \
     InvestigationsSanctionsInfo, BankingInformation, CertificationInformation, \
-    ComplianceAnalysis, StatusControl, ReverseDueDiligence, ReverseDueDiligenceMessage, Notification, ReverseDueDiligenceAttachment, \
+    ComplianceAnalysis, ReverseDueDiligence, ReverseDueDiligenceMessage, Notification, ReverseDueDiligenceAttachment, \
     ManagementAndKeyEmployees, BoardOfDirectors, UltimateBeneficialOwner, MajorShareholder, GovernmentOfficialInteraction # Certifique-se de importar todos os modelos OneToOneField
 from .forms import CompanyForm, IndividualContactForm, KYCDocumentForm, \
     BusinessInformationForm, OwnershipManagementInfoForm, ComplianceInformationForm, \
@@ -36,10 +39,37 @@ from .models import EvaluationRecord, FinalAnalysisAttachment
 from .forms import EvaluationRecordForm
 from .forms_evaluation import CompanyEvaluationForm
 from .forms import ReverseDueDiligenceCreateForm, ReverseDueDiligenceMessageForm, PriorBusinessRelationshipForm
-from django.contrib.auth.models import Group
-from .models import PriorBusinessRelationship, BusinessInformation
-from .permissions import is_internal_user, can_start_onboarding
-from django.db.models import Q
+from .models import PriorBusinessRelationship, BusinessInformation, StoredFile
+from .permissions import is_internal_user, can_start_onboarding, has_group, get_group_names
+from .progress import visible_steps, progress_for_company, stored_progress
+from .kpis import company_scope, dashboard_kpis
+from .search import search_companies
+from .parties import search_parties
+from .screening import screen_company
+from .ownership import ownership_report
+from .storage import content_hash
+from .documents import attach_previews
+from .notifications import notify_group, notify_user, mark_read, unread_count, unread_queryset
+from .rdd import mark_thread_read, message_page, thread_counts, with_unread
+from .workflow import Department, apply_transition, authorize
+from django.db.models import Q, Exists, OuterRef, Prefetch
+
+
+def with_row_flags(queryset):
+    """Annotate what the company listings read per row, so a page costs a fixed number of queries.
+
+    ``has_ownership`` feeds ``Company.min_requirements_met()`` and the latest
+    final-analysis attachment is prefetched into ``latest_final_analysis_attachments``.
+    """
+    return queryset.annotate(
+        has_ownership=Exists(OwnershipManagementInfo.objects.filter(company=OuterRef('pk'))),
+    ).prefetch_related(
+        Prefetch(
+            'final_analysis_attachments',
+            queryset=FinalAnalysisAttachment.objects.order_by('-uploaded_at')[:1],
+            to_attr='latest_final_analysis_attachments',
+        ),
+    )
 
 
 # --- Mixin de Permissão para Equipe (se você for usar a segurança na view) ---
@@ -47,7 +77,7 @@ from django.db.models import Q
 class StaffRequiredMixin(AccessMixin):
     """Verify that the current user is logged in and is a staff member (belongs to 'Equipe' group)."""
     def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated or not request.user.groups.filter(name='Equipe').exists():
+        if not request.user.is_authenticated or not has_group(request.user, 'Equipe'):
             from django.core.exceptions import PermissionDenied
             raise PermissionDenied("Você não tem permissão para acessar esta etapa.")
         return super().dispatch(request, *args, **kwargs)
@@ -148,7 +178,7 @@ class CompanyOnboardingStepView(LoginRequiredMixin, View): # Mantenha assim se a
             try:
                 if Model == Company and hasattr(form_obj, 'fields'):
                     setattr(form_obj, 'user', request.user)
-                    if not request.user.groups.filter(name='Equipe').exists():
+                    if not has_group(request.user, 'Equipe'):
                         for _fname in ['evaluation_periodicity', 'last_evaluation_date', 'next_evaluation_date']:
                             if _fname in form_obj.fields:
                                 form_obj.fields[_fname].widget = forms.HiddenInput()
@@ -185,7 +215,7 @@ class CompanyOnboardingStepView(LoginRequiredMixin, View): # Mantenha assim se a
 
         # --- Verificação de Permissão na View (Se você optar por ativá-la) ---
         restricted_steps = ['compliance_analysis', 'status_control']
-        if step_slug in restricted_steps and not request.user.groups.filter(name='Equipe').exists():
+        if step_slug in restricted_steps and not has_group(request.user, 'Equipe'):
             raise PermissionDenied("Você não tem permissão para acessar esta etapa diretamente.")
 
         form, _ = self.get_form_and_instance(company, step_slug, request=request) # Passa request para o get_form_and_instance
@@ -213,7 +243,7 @@ class CompanyOnboardingStepView(LoginRequiredMixin, View): # Mantenha assim se a
 
         # --- Verificação de Permissão na View para POST (Se você optar por ativá-la) ---
         restricted_steps = ['compliance_analysis', 'status_control']
-        if step_slug in restricted_steps and not request.user.groups.filter(name='Equipe').exists():
+        if step_slug in restricted_steps and not has_group(request.user, 'Equipe'):
             raise PermissionDenied("Você não tem permissão para submeter dados para esta etapa.")
 
         form, instance_for_form = self.get_form_and_instance(company, step_slug, request=request) # Passa request para o get_form_and_instance
@@ -260,7 +290,13 @@ class CompanyOnboardingStepView(LoginRequiredMixin, View): # Mantenha assim se a
             if step_slug == 'banking_information':
                 try:
                     bank_cert_file = request.FILES.get('bank_certificate_file')
-                    if bank_cert_file:
+                    # Reenvio do mesmo comprovante (mesmo SHA-256) não cria outro documento
+                    if bank_cert_file and not StoredFile.objects.filter(
+                        blob__sha256=content_hash(bank_cert_file),
+                        name__in=KYCDocument.objects.filter(
+                            company=company, document_type='BANK_CERTIFICATE'
+                        ).values('file'),
+                    ).exists():
                         KYCDocument.objects.create(
                             company=company,
                             document_type='BANK_CERTIFICATE',
@@ -297,7 +333,7 @@ class CompanyOnboardingStepView(LoginRequiredMixin, View): # Mantenha assim se a
                 next_step_slug = list(ONBOARDING_STEPS.keys())[next_step_index]
                 # Pular abas restritas se o usuário não tiver permissão
                 restricted_steps = ['compliance_analysis', 'status_control'] # Replicar aqui para clareza
-                while next_step_slug in restricted_steps and not request.user.groups.filter(name='Equipe').exists() and next_step_index < len(ONBOARDING_STEPS):
+                while next_step_slug in restricted_steps and not has_group(request.user, 'Equipe') and next_step_index < len(ONBOARDING_STEPS):
                     next_step_index += 1
                     if next_step_index < len(ONBOARDING_STEPS):
                         next_step_slug = list(ONBOARDING_STEPS.keys())[next_step_index]
@@ -332,56 +368,14 @@ class CompanyOnboardingStepView(LoginRequiredMixin, View): # Mantenha assim se a
         all_steps_keys = list(ONBOARDING_STEPS.keys())
         current_step_index = all_steps_keys.index(current_step_key)
         
-        completed_steps = 0
-        completed_steps_set = set()
-
-        is_staff_member = self.request.user.groups.filter(name='Equipe').exists()
-        
-        # Filtra as etapas visíveis para o cálculo do progresso
-        visible_steps_for_progress = []
-        for slug, title in ONBOARDING_STEPS.items():
-            if (slug == 'compliance_analysis' or slug == 'status_control') and not is_staff_member:
-                continue # Pula esta etapa se for restrita e o usuário não for da equipe
-            visible_steps_for_progress.append(slug)
-
+        is_staff_member = has_group(self.request.user, 'Equipe')
 
-        for step_slug in visible_steps_for_progress: # Itera apenas sobre as etapas visíveis
-            mapping = FORM_MODEL_MAPPING.get(step_slug)
-            if not mapping: continue
-
-            Model = mapping['model']
-            is_step_complete = False
-            
-            # Lógica para verificar a conclusão da etapa
-            if Model == Company:
-                if company.full_company_name and company.registered_business_address:
-                    is_step_complete = True
-            elif Model == KYCDocument:
-                if KYCDocument.objects.filter(company=company).exists():
-                    is_step_complete = True
-            elif Model == IndividualContact:
-                if IndividualContact.objects.filter(company=company).exists():
-                    is_step_complete = True
-            else:
-                # Para OneToOneFields, verifica se a instância relacionada existe
-                # (já que get_or_create pode ter criado um objeto vazio)
-                # Você pode adicionar mais validações aqui se um objeto vazio não for "completo"
-                try:
-                    related_instance = Model.objects.get(company=company)
-                    # Considerar a etapa como completa se o objeto existe e possui dados críticos,
-                    # ou apenas se o objeto existe. Depende da sua definição de "completo".
-                    # Por simplicidade, assumimos que existir é o suficiente para o progresso.
-                    # Exemplo mais robusto: if related_instance.some_required_field: is_step_complete = True
-                    is_step_complete = True 
-                except Model.DoesNotExist:
-                    is_step_complete = False
-
-            if is_step_complete:
-                completed_steps += 1
-                completed_steps_set.add(step_slug)
-
-        total_steps = len(visible_steps_for_progress) # Total de etapas VISÍVEIS
-        progress_percentage = (completed_steps / total_steps) * 100 if total_steps > 0 else 0
+        # Etapas visíveis e progresso calculados em uma única consulta
+        visible_steps_for_progress = visible_steps(is_staff_member)
+        progress = progress_for_company(company, is_staff_member)
+        completed_steps = progress.completed_count
+        completed_steps_set = progress.completed_steps
+        total_steps = progress.total_steps # Total de etapas VISÍVEIS
 
         raw_page_title = ONBOARDING_STEPS.get(current_step_key, "Onboarding Step")
         display_page_title = raw_page_title.replace("Company Information", "General Information")
@@ -404,11 +398,13 @@ class CompanyOnboardingStepView(LoginRequiredMixin, View): # Mantenha assim se a
             'all_steps': ONBOARDING_STEPS, # Passa todas as etapas para o template, a visibilidade será controlada no HTML
             'completed_steps': completed_steps,
             'total_steps': total_steps, # O total de etapas VISÍVEIS para o cálculo de progresso
-            'progress_percentage': round(progress_percentage),
+            'progress_percentage': progress.percentage,
             'page_title': display_page_title,
             'completed_steps_set': completed_steps_set,
             'is_staff_member': is_staff_member, # ESSENCIAL para controlar a visibilidade no template
             'previous_step_slug': previous_step_slug,
+            # Documentos da etapa Add Documents com miniatura/páginas/texto (customers/documents.py)
+            'kyc_documents': attach_previews(company.kyc_documents.select_related('uploaded_by')) if current_step_key == 'add_documents' else [],
             'next_step_slug': next_step_slug,
         }
     
@@ -426,10 +422,10 @@ class CompanyDetailView(LoginRequiredMixin, DetailView):
         context['current_step_key'] = None
         # Visibilidade de abas restritas
         user = self.request.user
-        is_staff_member = user.groups.filter(name='Equipe').exists()
+        is_staff_member = has_group(user, 'Equipe')
         context['is_staff_member'] = is_staff_member
         # Grupos do usuário (para controles de ação no template)
-        context['user_groups'] = self.request.user.groups.values_list('name', flat=True)
+        context['user_groups'] = get_group_names(self.request.user)
         context['compliance_group_name'] = 'Compliance'
         context['financeiro_group_name'] = 'Financeiro'
         context['trading_group_name'] = 'Trading'
@@ -437,50 +433,23 @@ class CompanyDetailView(LoginRequiredMixin, DetailView):
 
         # Cálculo de progresso (mesma lógica base do onboarding)
         company = context['company']
-        visible_steps_for_progress = []
-        for slug, _title in ONBOARDING_STEPS.items():
-            if (slug == 'compliance_analysis' or slug == 'status_control') and not is_staff_member:
-                continue
-            visible_steps_for_progress.append(slug)
-
-        completed_steps = 0
-        completed_steps_set = set()
-        for step_slug in visible_steps_for_progress:
-            mapping = FORM_MODEL_MAPPING.get(step_slug)
-            if not mapping:
-                continue
-            Model = mapping['model']
-
-            is_step_complete = False
-            if Model == Company:
-                if company.full_company_name and company.registered_business_address:
-                    is_step_complete = True
-            elif Model == KYCDocument:
-                if KYCDocument.objects.filter(company=company).exists():
-                    is_step_complete = True
-            elif Model == IndividualContact:
-                if IndividualContact.objects.filter(company=company).exists():
-                    is_step_complete = True
-            else:
-                try:
-                    mapping['model'].objects.get(company=company)
-                    is_step_complete = True
-                except mapping['model'].DoesNotExist:
-                    is_step_complete = False
-
-            if is_step_complete:
-                completed_steps += 1
-                completed_steps_set.add(step_slug)
-
-        total_steps = len(visible_steps_for_progress)
-        progress_percentage = (completed_steps / total_steps) * 100 if total_steps > 0 else 0
-        context['progress_percentage'] = round(progress_percentage)
-        context['completed_steps_set'] = completed_steps_set
+        progress = progress_for_company(company, is_staff_member)
+        context['progress_percentage'] = progress.percentage
+        context['completed_steps_set'] = progress.completed_steps
         # Histórico de avaliações
         try:
-            context['evaluation_records'] = EvaluationRecord.objects.filter(company=company).order_by('-evaluation_date', '-created_at')
+            context['evaluation_records'] = attach_previews(
+                EvaluationRecord.objects.filter(company=company).select_related('created_by').order_by('-evaluation_date', '-created_at')
+            )
         except Exception:
             context['evaluation_records'] = []
+        # Documentos KYC com miniatura, páginas e trecho do texto
+        context['kyc_documents'] = attach_previews(company.kyc_documents.select_related('uploaded_by'))
+        # Ocorrências da triagem de sanções (apenas equipe interna)
+        context['is_internal'] = is_internal_user(user)
+        if context['is_internal']:
+            context['screening_hits'] = company.screening_hits.all()
+            context['ownership'] = ownership_report(company.pk)
         # Form de avaliação (para edição inline por Equipe)
         try:
             context['evaluation_form'] = CompanyEvaluationForm(instance=company)
@@ -492,7 +461,7 @@ class CompanyDetailView(LoginRequiredMixin, DetailView):
 class EvaluationRecordUploadView(LoginRequiredMixin, View):
     def post(self, request, pk):
         company = get_object_or_404(Company, pk=pk)
-        if not request.user.groups.filter(name='Equipe').exists():
+        if not has_group(request.user, 'Equipe'):
             raise PermissionDenied("Você não tem permissão para anexar avaliações.")
         form = EvaluationRecordForm(request.POST, request.FILES)
         if form.is_valid():
@@ -509,7 +478,7 @@ class EvaluationRecordUploadView(LoginRequiredMixin, View):
 class CompanyEvaluationUpdateView(LoginRequiredMixin, View):
     def post(self, request, pk):
         company = get_object_or_404(Company, pk=pk)
-        if not request.user.groups.filter(name='Equipe').exists():
+        if not has_group(request.user, 'Equipe'):
             raise PermissionDenied("Você não tem permissão para editar avaliações.")
         form = CompanyEvaluationForm(request.POST, instance=company)
         if form.is_valid():
@@ -522,31 +491,16 @@ class CompanyEvaluationUpdateView(LoginRequiredMixin, View):
 
 # --- Reverse Due Diligence (RDD) ---
 def _notify_group(group_name, message, url=None, rdd=None):
-    try:
-        from django.contrib.auth.models import Group
-        group = Group.objects.get(name=group_name)
-    except Exception:
-        return
-    for u in group.user_set.all():
-        Notification.objects.create(
-            recipient=u,
-            message=message,
-            url=url,
-            rdd=rdd,
-            audience=Notification.Audience.INTERNAL,
-        )
+    notify_group(group_name, message, url=url, rdd=rdd)
 
 
 def _notify_user(user, message, url=None, rdd=None):
-    if user:
-        audience = Notification.Audience.INTERNAL if is_internal_user(user) else Notification.Audience.CLIENT
-        Notification.objects.create(
-            recipient=user,
-            message=message,
-            url=url,
-            rdd=rdd,
-            audience=audience,
-        )
+    notify_user(user, message, url=url, rdd=rdd)
+
+
+def _wants_json(request):
+    # static/js/chunked-upload.js envia o formulário sem o anexo e o sobe em blocos depois
+    return 'application/json' in request.headers.get('Accept', '')
 
 
 class ReverseDueDiligenceCreateView(LoginRequiredMixin, View):
@@ -573,7 +527,11 @@ class ReverseDueDiligenceCreateView(LoginRequiredMixin, View):
                 ReverseDueDiligenceAttachment.objects.create(message=first_msg, file=attachment, uploaded_by=request.user)
             _notify_group('Equipe', f'Novo RDD: {rdd.subject}', url=rdd.get_absolute_url(), rdd=rdd)
             messages.success(request, _("Sua solicitação de Due Diligence Reversa foi enviada."))
+            if _wants_json(request):
+                return JsonResponse({'message': first_msg.pk, 'url': rdd.get_absolute_url()})
             return redirect(rdd.get_absolute_url())
+        if _wants_json(request):
+            return JsonResponse({'errors': form.errors}, status=400)
         context = {'form': form, 'is_internal': is_internal_user(request.user), 'can_create_company': can_start_onboarding(request.user)}
         return render(request, self.template_name, context)
 
@@ -582,19 +540,35 @@ class ReverseDueDiligenceDetailView(LoginRequiredMixin, View):
     template_name = 'customers/rdd_detail.html'
 
     def _get_thread(self, request, pk):
-        rdd = get_object_or_404(ReverseDueDiligence, pk=pk)
+        rdd = get_object_or_404(ReverseDueDiligence.objects.select_related('company'), pk=pk)
         if is_internal_user(request.user):
             return rdd
         if rdd.created_by_id != request.user.id and rdd.company.created_by_id != request.user.id:
             raise PermissionDenied("Você não tem acesso a este RDD.")
         return rdd
 
+    def _context(self, request, rdd, form):
+        # Uma página de mensagens (autor via join, anexos em uma consulta) e os totais em cache
+        thread_messages, older_cursor = message_page(rdd, before=request.GET.get('before'))
+        return {
+            'rdd': rdd,
+            'form': form,
+            'thread_messages': thread_messages,
+            'older_cursor': older_cursor,
+            'counts': thread_counts(rdd.pk),
+            'is_internal': is_internal_user(request.user),
+            'can_create_company': can_start_onboarding(request.user),
+        }
+
     def get(self, request, pk):
         rdd = self._get_thread(request, pk)
         form = ReverseDueDiligenceMessageForm()
-        Notification.objects.filter(recipient=request.user, rdd=rdd, is_read=False).update(is_read=True)
-        is_internal = is_internal_user(request.user)
-        return render(request, self.template_name, {'rdd': rdd, 'form': form, 'is_internal': is_internal, 'can_create_company': can_start_onboarding(request.user)})
+        mark_thread_read(request.user, rdd)
+        # Só as não lidas deste RDD (índice recipient/rdd/is_read): o UPDATE roda apenas quando há
+        # alguma, inclusive as que não vêm com mensagem nova e não movem o cursor (ex.: "RDD reaberto")
+        if unread_queryset(request.user).filter(rdd=rdd).exists():
+            mark_read(request.user, rdd=rdd)
+        return render(request, self.template_name, self._context(request, rdd, form))
 
     def post(self, request, pk):
         rdd = self._get_thread(request, pk)
@@ -636,18 +610,20 @@ class ReverseDueDiligenceDetailView(LoginRequiredMixin, View):
             attachment = form.cleaned_data.get('attachment')
             if attachment:
                 ReverseDueDiligenceAttachment.objects.create(message=msg, file=attachment, uploaded_by=request.user)
-            from django.utils import timezone
-            rdd.last_message_at = timezone.now()
             if is_internal:
                 if rdd.status != 'CLOSED':
                     rdd.status = 'RESPONDED'
                 _notify_user(rdd.created_by, f'Resposta ao RDD: {rdd.subject}', url=rdd.get_absolute_url(), rdd=rdd)
             else:
                 _notify_group('Equipe', f'Nova mensagem no RDD: {rdd.subject}', url=rdd.get_absolute_url(), rdd=rdd)
-            rdd.save(update_fields=['last_message_at', 'status'])
+            rdd.save(update_fields=['status'])
             messages.success(request, _("Mensagem enviada."))
+            if _wants_json(request):
+                return JsonResponse({'message': msg.pk, 'url': rdd.get_absolute_url()})
             return redirect(rdd.get_absolute_url())
-        return render(request, self.template_name, {'rdd': rdd, 'form': form, 'is_internal': is_internal, 'can_create_company': can_start_onboarding(request.user)})
+        if _wants_json(request):
+            return JsonResponse({'errors': form.errors}, status=400)
+        return render(request, self.template_name, self._context(request, rdd, form))
 
 
 class DashboardView(LoginRequiredMixin, TemplateView):
@@ -661,7 +637,7 @@ class ReverseDueDiligenceListView(LoginRequiredMixin, ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        qs = ReverseDueDiligence.objects.all().select_related('company', 'created_by')
+        qs = with_unread(ReverseDueDiligence.objects.all(), self.request.user).select_related('company', 'created_by', 'last_author')
         is_internal = is_internal_user(self.request.user)
         status = self.request.GET.get('status')
         if not is_internal:
@@ -677,6 +653,68 @@ class ReverseDueDiligenceListView(LoginRequiredMixin, ListView):
         ctx['current_status'] = self.request.GET.get('status') or ''
         return ctx
 
+# --- Caixa de entrada de notificações ---
+class NotificationInboxView(LoginRequiredMixin, ListView):
+    model = Notification
+    template_name = 'customers/notifications.html'
+    context_object_name = 'notifications'
+    paginate_by = 20
+
+    def get_queryset(self):
+        qs = Notification.objects.filter(recipient=self.request.user)
+        if self.request.GET.get('status') == 'unread':
+            qs = qs.filter(is_read=False)
+        return qs.order_by('-created_at')
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['is_internal'] = is_internal_user(self.request.user)
+        ctx['can_create_company'] = can_start_onboarding(self.request.user)
+        ctx['current_status'] = self.request.GET.get('status') or ''
+        ctx['unread_notification_count'] = unread_count(self.request.user)
+        return ctx
+
+
+@login_required
+def notification_open(request, pk):
+    """Mark a notification as read and follow its link."""
+    notification = get_object_or_404(Notification, pk=pk, recipient=request.user)
+    if not notification.is_read:
+        mark_read(request.user, pk=notification.pk)
+    url = notification.url
+    if url and url_has_allowed_host_and_scheme(url, allowed_hosts={request.get_host()}):
+        return redirect(url)
+    return redirect('customers:notification_inbox')
+
+
+@login_required
+@require_POST
+def notifications_mark_all_read(request):
+    updated = mark_read(request.user)
+    if updated:
+        messages.success(request, _("Notificações marcadas como lidas."))
+    return redirect('customers:notification_inbox')
+
+
+class PartySearchView(LoginRequiredMixin, TemplateView):
+    """Busca de pessoas/entidades (contatos, UBOs, conselho, diretoria, acionistas) agrupadas por empresa."""
+    template_name = 'customers/party_search.html'
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated and not is_internal_user(request.user):
+            raise PermissionDenied(_("Você não tem permissão para acessar esta página."))
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        ctx['query'] = query
+        ctx['results'] = search_parties(query) if query else []
+        ctx['is_internal'] = True
+        ctx['can_create_company'] = can_start_onboarding(self.request.user)
+        return ctx
+
+
 # --- Reinserir DashboardView completo após a lista RDD ---
 class DashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'customers/dashboard.html'
@@ -684,35 +722,6 @@ class DashboardView(LoginRequiredMixin, TemplateView):
     def _is_internal(self, user):
         return is_internal_user(user)
 
-    def _step_completed(self, company, slug, is_internal):
-        mapping = FORM_MODEL_MAPPING.get(slug)
-        if not mapping:
-            return False
-        Model = mapping['model']
-        if Model == Company:
-            return bool(company.full_company_name and company.registered_business_address)
-        from .models import KYCDocument, IndividualContact
-        if Model.__name__ == 'KYCDocument':
-            return KYCDocument.objects.filter(company=company).exists()
-        if Model.__name__ == 'IndividualContact':
-            return IndividualContact.objects.filter(company=company).exists()
-        try:
-            mapping['model'].objects.get(company=company)
-            return True
-        except mapping['model'].DoesNotExist:
-            return False
-
-    def _visible_steps(self, is_internal):
-        if is_internal:
-            return list(ONBOARDING_STEPS.keys())
-        return [s for s in ONBOARDING_STEPS.keys() if s not in ('compliance_analysis', 'status_control')]
-
-    def _company_progress(self, company, is_internal):
-        steps = self._visible_steps(is_internal)
-        completed = [s for s in steps if self._step_completed(company, s, is_internal)]
-        pct = round((len(completed) / len(steps) * 100) if steps else 0)
-        return pct, completed
-
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         user = self.request.user
@@ -720,43 +729,23 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         ctx['is_internal'] = is_internal
         ctx['can_create_company'] = can_start_onboarding(user)
 
-        qs = Company.objects.all() if is_internal else Company.objects.filter(created_by=user)
+        qs = company_scope(user, is_internal)
 
-        total = qs.count()
-        from .models import StatusControl
-        sc_qs = StatusControl.objects.filter(company__in=qs)
-        completed = sc_qs.filter(client_onboarding_finished=True).count()
-        pending = sc_qs.filter(is_pending=True).count()
-
-        trading_pending = sc_qs.filter(trading_qualified=False).count()
-        compliance_pending = sc_qs.filter(compliance_qualified=False).count()
-        treasury_pending = sc_qs.filter(treasury_qualified=False).count()
-        # Suprimentos: pendências ativas atribuídas a SUPRIMENTOS
-        try:
-            suprimentos_pending = sc_qs.filter(is_pending=True, pending_owner='SUPRIMENTOS').count()
-        except Exception:
-            suprimentos_pending = 0
+        # Todos os contadores em uma única consulta agregada (com cache opcional)
+        kpis = dashboard_kpis(user, is_internal)
 
         recent = qs.order_by('-created_at')[:5]
 
-        progress_values = []
-        for c in qs[:50]:
-            pct, _ = self._company_progress(c, is_internal)
-            progress_values.append(pct)
-        avg_progress = round(sum(progress_values) / len(progress_values)) if progress_values else 0
-
         pending_items = []
         if not is_internal:
-            steps = self._visible_steps(False)
             for c in qs:
-                for s in steps:
-                    if not self._step_completed(c, s, False):
-                        pending_items.append({
-                            'company': c,
-                            'next_step_slug': s,
-                            'next_step_title': ONBOARDING_STEPS.get(s, s).title(),
-                        })
-                        break
+                progress = stored_progress(c, False)
+                if progress.next_step:
+                    pending_items.append({
+                        'company': c,
+                        'next_step_slug': progress.next_step,
+                        'next_step_title': progress.next_step_title,
+                    })
 
         evaluation_due_companies = []
         evaluation_upcoming_companies = []
@@ -773,17 +762,17 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         if is_internal:
             audience_filters.append(Notification.Audience.INTERNAL)
         try:
+            # Só as colunas exibidas; ordem do índice parcial (audience, -created_at) dos não lidos
             notification_qs = Notification.objects.filter(
                 is_read=False,
                 audience__in=audience_filters,
-            )
-            if is_internal:
-                unread_notifications = notification_qs[:20]
-            else:
-                company_ids = list(qs.values_list('pk', flat=True))
-                unread_notifications = notification_qs.filter(
-                    Q(recipient=user) | Q(rdd__company_id__in=company_ids)
-                )[:20]
+            ).only('id', 'message', 'url', 'count', 'created_at').order_by('-created_at')
+            if not is_internal:
+                # Empresas do usuário como subconsulta, sem materializar os ids
+                notification_qs = notification_qs.filter(
+                    Q(recipient=user) | Q(rdd__company__in=qs.values('pk'))
+                )
+            unread_notifications = list(notification_qs[:20])
         except Exception:
             unread_notifications = []
         rdd_open_threads = None
@@ -797,15 +786,8 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             pass
 
         ctx.update({
-            'total_companies': total,
-            'completed_count': completed,
-            'pending_flag_count': pending,
-            'trading_pending': trading_pending,
-            'compliance_pending': compliance_pending,
-            'treasury_pending': treasury_pending,
-            'suprimentos_pending': suprimentos_pending,
+            **kpis,
             'recent_companies': recent,
-            'avg_progress': avg_progress,
             'pending_items': pending_items,
             'ONBOARDING_STEPS': ONBOARDING_STEPS,
             'evaluation_due_companies': evaluation_due_companies,
@@ -813,9 +795,11 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             'unread_notifications': unread_notifications,
             'rdd_open_threads': rdd_open_threads,
             'rdd_my_threads': rdd_my_threads,
+            'unread_notification_count': unread_count(user),
         })
 
         # Pendências de requisitos mínimos por usuário (não-interno)
+        qs = qs.annotate(has_ownership=Exists(OwnershipManagementInfo.objects.filter(company=OuterRef('pk'))))
         try:
             if not is_internal:
                 min_pending = []
@@ -1334,7 +1318,9 @@ class CompanyListView(LoginRequiredMixin, ListView):
         """
         # CORREÇÃO CRÍTICA: 'status_control' é o nome correto do related_name
         # conforme indicado pelo seu traceback de FieldError.
-        queryset = super().get_queryset().select_related('status_control', 'created_by').prefetch_related('final_analysis_attachments')
+        queryset = with_row_flags(
+            super().get_queryset().select_related('status_control', 'status_control__last_updated_by', 'created_by')
+        )
 
         # Filtros rápidos via querystring (?status=...&area=...&q=...)
         status = self.request.GET.get('status')  # valores: 'pendente' | 'concluido'
@@ -1370,13 +1356,10 @@ class CompanyListView(LoginRequiredMixin, ListView):
             else:
                 queryset = queryset.filter(status_control__pending_owner='SUPRIMENTOS')
 
-        # Filtro de busca por nome/endereço
+        # Busca indexada (nome, nomes anteriores, aliases, CNPJ, VAT, registro, endereço)
         if q:
-            from django.db.models import Q as _Q
-            queryset = queryset.filter(
-                _Q(full_company_name__icontains=q) |
-                _Q(registered_business_address__icontains=q)
-            )
+            queryset = search_companies(queryset, q)
+            return queryset.order_by('-search_rank', '-created_at')
 
         # Ordenar as empresas, por exemplo, da mais recente para a mais antiga
         queryset = queryset.order_by('-created_at')
@@ -1392,7 +1375,7 @@ class CompanyListView(LoginRequiredMixin, ListView):
         
         # Obtém uma lista simples dos nomes dos grupos aos quais o usuário logado pertence.
         # Isso será usado no template para exibir/ocultar colunas.
-        context['user_groups'] = self.request.user.groups.values_list('name', flat=True)
+        context['user_groups'] = get_group_names(self.request.user)
 
         # Define os nomes dos grupos correspondentes às colunas de flag no fluxograma.
         # Estes nomes DEVEM corresponder EXATAMENTE aos nomes dos grupos criados no Django Admin.
@@ -1418,248 +1401,36 @@ class CompanyListView(LoginRequiredMixin, ListView):
         return context
 
 
-# --- Compliance actions ---
+# --- Decisões do fluxo de aprovação (tabela em customers/workflow.py) ---
 from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
 
 
-@login_required
-@require_POST
-def compliance_decision(request, pk, decision):
-    """Approve or reject Compliance on the company list screen.
-
-    - Only users in group 'Compliance' can act
-    - Only when minimum requirements are met can approve/reject
-    """
-    user = request.user
-    if not user.groups.filter(name='Compliance').exists():
-        raise PermissionDenied("Você não tem permissão para validar Compliance.")
-
-    company = get_object_or_404(Company, pk=pk)
-
-    # Gate by minimum requirements
-    if not company.min_requirements_met():
-        messages.error(request, _("Requisitos mínimos não atendidos. Peça ao cliente para completar os dados."))
-        return redirect('customers:company_list')
-
-    # Update StatusControl
-    from .models import StatusControl
-    sc, created = StatusControl.objects.get_or_create(company=company)
-
-    if decision == 'approve':
-        # Require at least one approved final analysis attachment
-        if False and FinalAnalysisAttachment.objects.filter(company=company, approved=True).exists():
-            messages.error(request, _("Envie e aprove um anexo da análise final antes de aprovar."))
-            return redirect('customers:company_list')
-        sc.compliance_qualified = True
-        sc.is_pending = True
-        # Se Financeiro já aprovou, liberar Análise Final (Trading)
-        if sc.treasury_qualified:
-            sc.pending_owner = 'TRADING'
-            sc.pending_details = 'Compliance e Financeiro aprovados. Aguardando análise final (Trading).'
-        else:
-            sc.pending_owner = 'FINANCE'
-            sc.pending_details = 'Compliance aprovado. Aguardando decisão do Financeiro.'
-        sc.last_updated_by = user
-        sc.save(update_fields=['compliance_qualified', 'is_pending', 'pending_owner', 'pending_details', 'last_updated_by', 'updated_at'])
-        _notify_user(company.created_by, f"Compliance validado para {company.full_company_name}", url=reverse('customers:company_detail', kwargs={'pk': company.pk}))
-        messages.success(request, _("Compliance aprovado."))
-
-    elif decision == 'reject':
-        sc.compliance_qualified = False
-        # Encerrar processo: cliente não cadastrado
-        sc.is_pending = False
-        sc.pending_owner = 'NONE'
-        sc.pending_details = 'Cliente não cadastrado (Compliance).'
-        sc.last_updated_by = user
-        sc.save(update_fields=['compliance_qualified', 'is_pending', 'pending_owner', 'pending_details', 'last_updated_by', 'updated_at'])
-        _notify_user(company.created_by, f"Compliance não aprovado para {company.full_company_name}", url=reverse('customers:company_detail', kwargs={'pk': company.pk}))
-        messages.warning(request, _("Compliance não aprovado."))
-    else:
-        messages.error(request, _("Ação inválida."))
-
-    return redirect('customers:company_list')
-
-
-@login_required
-@require_POST
-def finance_decision(request, pk, decision):
-    """Approve or reject Financeiro (Tesouraria) on the company list screen.
-
-    - Only users in group 'Financeiro' can act
-    - Only after Compliance approved
-    - On rejection, 'risk' (text) is required
-    """
-    user = request.user
-    if not user.groups.filter(name='Financeiro').exists():
-        raise PermissionDenied("Você não tem permissão para aprovar Financeiro.")
-
-    company = get_object_or_404(Company, pk=pk)
-    sc, created = StatusControl.objects.get_or_create(company=company)
-
-    # Gate: precisa dos requisitos mínimos
-    if not company.min_requirements_met():
-        messages.error(request, _("Requisitos mínimos não atendidos."))
-        return redirect('customers:company_list')
-
-    if decision == 'approve':
-        sc.treasury_qualified = True
-        sc.is_pending = True
-        # Se Compliance já aprovou, liberar Análise Final (Trading)
-        if sc.compliance_qualified:
-            sc.pending_owner = 'TRADING'
-            sc.pending_details = 'Compliance e Financeiro aprovados. Aguardando análise final (Trading).'
-        else:
-            sc.pending_owner = 'COMPLIANCE'
-            sc.pending_details = 'Financeiro aprovado. Aguardando decisão do Compliance.'
-        sc.last_updated_by = user
-        sc.save(update_fields=['treasury_qualified', 'pending_owner', 'is_pending', 'pending_details', 'last_updated_by', 'updated_at'])
-        _notify_user(company.created_by, f"Financeiro aprovado para {company.full_company_name}", url=reverse('customers:company_detail', kwargs={'pk': company.pk}))
-        messages.success(request, _("Financeiro aprovado."))
-
-    elif decision == 'reject':
-        risk = request.POST.get('risk', '').strip()
-        if not risk:
-            messages.error(request, _("Informe o risco para reprovação do Financeiro."))
-            return redirect('customers:company_list')
-        sc.treasury_qualified = False
-        sc.pending_owner = 'FINANCE'
-        sc.is_pending = True
-        sc.treasury_risk = risk
-        sc.pending_details = f'Financeiro reprovado. Risco: {risk}'
-        sc.last_updated_by = user
-        sc.save(update_fields=['treasury_qualified', 'pending_owner', 'is_pending', 'treasury_risk', 'pending_details', 'last_updated_by', 'updated_at'])
-        _notify_user(company.created_by, f"Financeiro reprovado para {company.full_company_name}", url=reverse('customers:company_detail', kwargs={'pk': company.pk}))
-        messages.warning(request, _("Financeiro não aprovado."))
-    else:
-        messages.error(request, _("Ação inválida."))
-
-    return redirect('customers:company_list')
-
-
-@login_required
-@require_POST
-def trading_decision(request, pk, decision):
-    """Enable or reject Trading on the company list screen.
-
-    - Only users in group 'Trading' can act
-    - Requires Compliance and Financeiro approved
-    - Rejection can include optional reason
-    """
-    user = request.user
-    if not user.groups.filter(name='Trading').exists():
-        raise PermissionDenied("Você não tem permissão para habilitar Trading.")
-
-    company = get_object_or_404(Company, pk=pk)
-    sc, created = StatusControl.objects.get_or_create(company=company)
-
-    # Gate: precisa de Compliance aprovado (Financeiro pode estar reprovado)
-    if not sc.compliance_qualified:
-        messages.error(request, _("Aguardando aprovação de Compliance."))
-        return redirect('customers:company_list')
-
-    if decision == 'approve':
-        sc.trading_qualified = True
-        # Após habilitar Trading, direcionar para Análise Final
-        sc.pending_owner = 'TRADING'
-        sc.is_pending = True
-        sc.client_onboarding_finished = False
-        sc.pending_details = 'Trading habilitado. Aguardando análise final.'
-        sc.last_updated_by = user
-        sc.save(update_fields=['trading_qualified', 'pending_owner', 'is_pending', 'client_onboarding_finished', 'pending_details', 'last_updated_by', 'updated_at'])
-        _notify_user(company.created_by, f"Trading habilitado para {company.full_company_name}", url=reverse('customers:company_detail', kwargs={'pk': company.pk}))
-        messages.success(request, _("Trading habilitado."))
-    elif decision == 'reject':
-        reason = request.POST.get('reason', '').strip()
-        sc.trading_qualified = False
-        # Encerrar processo: cliente não cadastrado
-        sc.pending_owner = 'NONE'
-        sc.is_pending = False
-        sc.trading_reject_reason = reason or None
-        sc.pending_details = 'Cliente não cadastrado (Trading).' + (f' Motivo: {reason}' if reason else '')
-        sc.last_updated_by = user
-        sc.save(update_fields=['trading_qualified', 'pending_owner', 'is_pending', 'trading_reject_reason', 'pending_details', 'last_updated_by', 'updated_at'])
-        _notify_user(company.created_by, f"Trading não habilitado para {company.full_company_name}", url=reverse('customers:company_detail', kwargs={'pk': company.pk}))
-        messages.warning(request, _("Trading não habilitado."))
-    else:
-        messages.error(request, _("Ação inválida."))
-
-    return redirect('customers:company_list')
-
-
-@login_required
-@require_POST
-def final_analysis_decision(request, pk, decision):
-    """Trading final analysis: approve or reject after Compliance/Financeiro or Trading habilitado.
-
-    - Only users in group 'Trading' can act
-    - Approve: routes to Suprimentos (pending_owner='SUPRIMENTOS')
-    - Reject: ends process as 'Cliente não cadastrado'
-    """
-    user = request.user
-    if not user.groups.filter(name='Trading').exists():
-        raise PermissionDenied("Você não tem permissão para análise final.")
-
-    company = get_object_or_404(Company, pk=pk)
-    sc, created = StatusControl.objects.get_or_create(company=company)
-
-    # Must have min requirements and at least Compliance approved
-    if not company.min_requirements_met() or not sc.compliance_qualified:
-        messages.error(request, _("Pré-requisitos não atendidos para análise final."))
+def _workflow_view(department, action=None, doc=''):
+    """POST view running a StatusControl transition (see customers/workflow.py) and back to the list."""
+    @login_required
+    @require_POST
+    def view(request, pk, decision=action):
+        authorize(department, request.user)
+        company = get_object_or_404(Company, pk=pk)
+        result = apply_transition(company, department, decision, request.user, request.POST)
+        getattr(messages, result.level)(request, result.message)
         return redirect('customers:company_list')
+    view.__doc__ = doc
+    return view
 
-    if decision == 'approve':
-        if False and not FinalAnalysisAttachment.objects.filter(company=company, approved=True).exists():
-            messages.error(request, _("Envie e aprove um anexo da análise final antes de aprovar."))
-            return redirect('customers:company_list')
-        sc.is_pending = True
-        sc.pending_owner = 'SUPRIMENTOS'
-        sc.pending_details = 'Análise final aprovada. Registrar no SAP.'
-        sc.last_updated_by = user
-        sc.save(update_fields=['is_pending', 'pending_owner', 'pending_details', 'last_updated_by', 'updated_at'])
-        messages.success(request, _("Análise final aprovada. Encaminhado para Suprimentos."))
-    elif decision == 'reject':
-        sc.is_pending = False
-        sc.pending_owner = 'NONE'
-        sc.pending_details = 'Cliente não cadastrado (Análise Final).'
-        sc.last_updated_by = user
-        sc.save(update_fields=['is_pending', 'pending_owner', 'pending_details', 'last_updated_by', 'updated_at'])
-        messages.warning(request, _("Análise final reprovada. Cliente não cadastrado."))
-    else:
-        messages.error(request, _("Ação inválida."))
-
-    return redirect('customers:company_list')
-
-
-@login_required
-@require_POST
-def suprimentos_register_sap(request, pk):
-    """Suprimentos: marcar cadastro no SAP como concluído.
 
-    - Only users in group 'Suprimentos' can act
-    - Sets onboarding finished, clears pending
-    """
-    user = request.user
-    if not user.groups.filter(name='Suprimentos').exists():
-        raise PermissionDenied("Você não tem permissão para registrar no SAP.")
-
-    company = get_object_or_404(Company, pk=pk)
-    sc, created = StatusControl.objects.get_or_create(company=company)
-
-    sc.client_onboarding_finished = True
-    sc.is_pending = False
-    sc.pending_owner = 'NONE'
-    sc.pending_details = 'Cadastrado no SAP.'
-    sc.last_updated_by = user
-    sc.save(update_fields=['client_onboarding_finished', 'is_pending', 'pending_owner', 'pending_details', 'last_updated_by', 'updated_at'])
-    messages.success(request, _("Cadastro no SAP confirmado."))
-    return redirect('customers:company_list')
+compliance_decision = _workflow_view(Department.COMPLIANCE, doc="Approve or reject Compliance on the company list screen.")
+finance_decision = _workflow_view(Department.FINANCE, doc="Approve or reject Financeiro (Tesouraria); rejection requires 'risk'.")
+trading_decision = _workflow_view(Department.TRADING, doc="Enable or reject Trading; rejection may include 'reason'.")
+final_analysis_decision = _workflow_view(Department.FINAL_ANALYSIS, doc="Trading final analysis: approve (to Suprimentos) or reject.")
+suprimentos_register_sap = _workflow_view(Department.SUPRIMENTOS, 'register', doc="Suprimentos: marcar cadastro no SAP como concluído.")
 
 
 class FinalAnalysisAttachmentUploadView(LoginRequiredMixin, View):
     def post(self, request, pk):
         user = request.user
-        if not user.groups.filter(name='Trading').exists():
+        if not has_group(user, 'Trading'):
             raise PermissionDenied("Você não tem permissão para enviar anexos de análise final.")
         company = get_object_or_404(Company, pk=pk)
         f = request.FILES.get('file')
@@ -1672,12 +1443,31 @@ class FinalAnalysisAttachmentUploadView(LoginRequiredMixin, View):
         return redirect('customers:company_list')
 
 
+@login_required
+@require_POST
+def company_screening(request, pk):
+    """Screen the company and its UBOs/board/shareholders against the sanctions list now."""
+    if not is_internal_user(request.user):
+        raise PermissionDenied("Você não tem permissão para triar sanções.")
+    company = get_object_or_404(Company, pk=pk)
+    try:
+        matches = screen_company(company)
+    except (ImproperlyConfigured, OSError, ValueError):
+        messages.error(request, _("Lista de sanções indisponível. Verifique SANCTIONS_WATCHLIST_PATH."))
+        return redirect('customers:company_detail', pk=company.pk)
+    if matches:
+        messages.warning(request, _("Triagem concluída: %(count)d ocorrência(s) na lista de sanções.") % {'count': len(matches)})
+    else:
+        messages.success(request, _("Triagem concluída: nenhuma ocorrência na lista de sanções."))
+    return redirect('customers:company_detail', pk=company.pk)
+
+
 @login_required
 @require_POST
 def final_analysis_attachment_approve(request, pk):
     """Approve a final analysis attachment (Trading only)."""
     user = request.user
-    if not user.groups.filter(name='Trading').exists():
+    if not has_group(user, 'Trading'):
         raise PermissionDenied("Você não tem permissão para aprovar anexos de análise final.")
     att = get_object_or_404(FinalAnalysisAttachment, pk=pk)
     att.approved = True
@@ -0,0 +1,91 @@
+"""Server-Sent Events streams (served by the ASGI application, ``app.asgi``).
+
+``rdd/<pk>/events/`` pushes the new messages and attachments of a Reverse
+Due Diligence thread; ``notifications/events/`` pushes the user's new
+notifications. Events come from :mod:`customers.events`; while waiting the
+stream only sends a comment every ``EVENTS_HEARTBEAT`` seconds to keep
+proxies from closing it, and it ends after ``EVENTS_STREAM_MAX_SECONDS`` so
+the browser reconnects (and permissions are checked again).
+
+Only the ASGI server streams. Under WSGI (``manage.py runserver``, gunicorn
+sync workers) Django reads an async iterator to the end before sending
+anything, so each stream would hang for ``EVENTS_STREAM_MAX_SECONDS`` and
+then arrive in one block. There the endpoints answer ``204 No Content``,
+which tells ``EventSource`` not to reconnect; the pages keep working
+without live updates.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+
+from .events import format_sse, get_backend, rdd_channel, user_channel
+from .models import ReverseDueDiligence
+from .permissions import is_internal_user
+
+
+async def _event_stream(channels):
+    subscription = get_backend().subscribe(channels)
+    heartbeat = float(getattr(settings, 'EVENTS_HEARTBEAT', 15))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + float(getattr(settings, 'EVENTS_STREAM_MAX_SECONDS', 300))
+    try:
+        yield f"retry: {int(getattr(settings, 'EVENTS_RETRY_MS', 3000))}\n\n"
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(subscription.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield format_sse(message)
+    finally:
+        subscription.close()
+
+
+def _sse_response(channels):
+    response = StreamingHttpResponse(_event_stream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _streaming_unavailable(request):
+    """204 outside the ASGI server (the stream could not be sent as it is produced)."""
+    if isinstance(request, ASGIRequest):
+        return None
+    return HttpResponse(status=204)
+
+
+def _check_rdd_access(user, pk):
+    rdd = ReverseDueDiligence.objects.select_related('company').filter(pk=pk).first()
+    if rdd is None:
+        raise Http404("RDD não encontrado.")
+    if not is_internal_user(user) and user.id not in (rdd.created_by_id, rdd.company.created_by_id):
+        raise PermissionDenied("Você não tem acesso a este RDD.")
+
+
+@require_safe
+@login_required
+async def rdd_events(request, pk):
+    """New messages and attachments of an RDD thread."""
+    if (response := _streaming_unavailable(request)) is not None:
+        return response
+    user = await request.auser()
+    await sync_to_async(_check_rdd_access)(user, pk)
+    return _sse_response([rdd_channel(pk)])
+
+
+@require_safe
+@login_required
+async def notification_events(request):
+    """New notifications of the logged-in user."""
+    if (response := _streaming_unavailable(request)) is not None:
+        return response
+    user = await request.auser()
+    return _sse_response([user_channel(user.pk)])
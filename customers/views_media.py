@@ -0,0 +1,183 @@
+"""Authenticated downloads of uploaded files.
+
+Each file model has its own route; the view applies the portal's rules
+(internal users see everything, clients only the files of their own
+companies/RDDs) and then hands the transfer to the front web server:
+
+* ``MEDIA_ACCEL_REDIRECT = 'nginx'``: ``X-Accel-Redirect`` to
+  ``MEDIA_ACCEL_PREFIX`` + name (an ``internal`` location aliasing MEDIA_ROOT);
+* ``MEDIA_ACCEL_REDIRECT = 'sendfile'``: ``X-Sendfile`` with the absolute path
+  (Apache mod_xsendfile, lighttpd).
+
+Without a proxy the file goes out as a ``FileResponse`` (``wsgi.file_wrapper``
+/ sendfile where the server supports it), with ``ETag``/``If-None-Match`` and
+single ``Range`` requests.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import require_safe
+
+from .dossier import iter_dossier
+from .models import (
+    Company, EvaluationRecord, FilePreview, FinalAnalysisAttachment, KYCDocument, ReverseDueDiligenceAttachment, StoredFile,
+)
+from .permissions import is_internal_user
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+# --- Regras de acesso por modelo (usuário interno sempre pode) ---
+def _owns_kyc_document(user, doc):
+    return doc.company.created_by_id == user.id
+
+
+def _owns_rdd_attachment(user, attachment):
+    thread = attachment.message.thread
+    return thread.created_by_id == user.id or thread.company.created_by_id == user.id
+
+
+def _internal_only(user, obj):
+    return False
+
+
+def _etag(fieldfile, stat):
+    # No armazenamento por conteúdo o SHA-256 já é um validador forte
+    sha256 = StoredFile.objects.filter(name=fieldfile.name).values_list('blob__sha256', flat=True).first()
+    return quote_etag(sha256 or f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def _accel_response(fieldfile, content_type, disposition):
+    mode = getattr(settings, 'MEDIA_ACCEL_REDIRECT', '')
+    if mode == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(fieldfile.name)
+    elif mode == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = fieldfile.path
+    else:
+        return None
+    response['Content-Disposition'] = disposition
+    return response
+
+
+def _range_iterator(fh, start, length):
+    try:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def serve_file(request, fieldfile):
+    """Response delivering ``fieldfile``; permissions must already be checked."""
+    if not fieldfile:
+        raise Http404("Arquivo não encontrado.")
+    filename = os.path.basename(fieldfile.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    disposition = f"inline; filename*=UTF-8''{quote(filename)}"
+
+    response = _accel_response(fieldfile, content_type, disposition)
+    if response is not None:
+        response['Cache-Control'] = 'private, no-transform'
+        return response
+
+    try:
+        stat = os.stat(fieldfile.path)
+    except OSError:
+        raise Http404("Arquivo não encontrado.")
+    etag = _etag(fieldfile, stat)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    match = _RANGE_RE.match(request.headers.get('Range', ''))
+    # If-Range com outro validador: o arquivo mudou, devolve-o inteiro
+    if match and request.headers.get('If-Range', etag) == etag:
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        elif last:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = 0, -1
+        if start > end or start >= size:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        byte_range = (start, end)
+
+    fh = open(fieldfile.path, 'rb')
+    if byte_range is None:
+        response = FileResponse(fh, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_range_iterator(fh, start, end - start + 1), content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Content-Disposition'] = disposition
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-transform'
+    return response
+
+
+def _protected_download(queryset, can_access, thumbnail=False):
+    @require_safe
+    @login_required
+    def view(request, pk):
+        obj = get_object_or_404(queryset, pk=pk)
+        if not is_internal_user(request.user) and not can_access(request.user, obj):
+            raise PermissionDenied("Você não tem permissão para acessar este arquivo.")
+        if thumbnail:
+            # Miniatura gerada por customers/documents.py
+            preview = FilePreview.objects.filter(name=obj.file.name).only('thumbnail').first()
+            return serve_file(request, preview.thumbnail if preview else None)
+        return serve_file(request, obj.file)
+    return view
+
+
+_kyc_documents = KYCDocument.objects.select_related('company')
+kyc_document_file = _protected_download(_kyc_documents, _owns_kyc_document)
+kyc_document_thumbnail = _protected_download(_kyc_documents, _owns_kyc_document, thumbnail=True)
+evaluation_record_file = _protected_download(EvaluationRecord.objects.all(), _internal_only)
+evaluation_record_thumbnail = _protected_download(EvaluationRecord.objects.all(), _internal_only, thumbnail=True)
+final_analysis_attachment_file = _protected_download(FinalAnalysisAttachment.objects.all(), _internal_only)
+final_analysis_attachment_thumbnail = _protected_download(FinalAnalysisAttachment.objects.all(), _internal_only, thumbnail=True)
+rdd_attachment_file = _protected_download(
+    ReverseDueDiligenceAttachment.objects.select_related('message__thread__company'), _owns_rdd_attachment,
+)
+
+
+@require_safe
+@login_required
+def company_dossier(request, pk):
+    """Complete dossier of a company (files + manifest) as a ZIP streamed on the fly."""
+    if not is_internal_user(request.user):
+        raise PermissionDenied("Você não tem permissão para exportar o dossiê.")
+    company = get_object_or_404(Company, pk=pk)
+    response = StreamingHttpResponse(iter_dossier(company), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="dossie-{company.pk}.zip"'
+    response['Cache-Control'] = 'private, no-store'
+    # Evita que o nginx acumule a resposta inteira antes de repassá-la
+    response['X-Accel-Buffering'] = 'no'
+    return response
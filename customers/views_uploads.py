@@ -0,0 +1,62 @@
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods, require_POST
+
+from .models import UploadSession
+from .uploads import TUS_VERSION, UploadError, abort, append_chunk, create_session, parse_metadata
+
+
+def _tus_response(status=204, session=None, message=None):
+    response = HttpResponse(message or '', status=status, content_type='text/plain; charset=utf-8')
+    response['Tus-Resumable'] = TUS_VERSION
+    response['Cache-Control'] = 'no-store'
+    if session is not None:
+        response['Upload-Offset'] = str(session.offset)
+        response['Upload-Length'] = str(session.length)
+        if session.status == UploadSession.Status.COMPLETED:
+            response['Upload-Object-Id'] = str(session.object_id)
+    return response
+
+
+@login_required
+@require_POST
+def upload_create(request):
+    """Open a resumable upload (tus ``POST``)."""
+    try:
+        session = create_session(
+            request.user,
+            request.headers.get('Upload-Length'),
+            parse_metadata(request.headers.get('Upload-Metadata')),
+        )
+    except UploadError as exc:
+        return _tus_response(exc.status, message=str(exc))
+    response = _tus_response(201, session)
+    response['Location'] = reverse('customers:upload_detail', kwargs={'upload_id': session.pk})
+    return response
+
+
+@login_required
+@require_http_methods(['HEAD', 'PATCH', 'DELETE'])
+def upload_detail(request, upload_id):
+    """Status (HEAD), next chunk (PATCH) or cancellation (DELETE) of the user's own upload."""
+    session = get_object_or_404(UploadSession, pk=upload_id, created_by=request.user)
+    if session.expires_at < timezone.now():
+        abort(session)
+        raise Http404("Upload expirado.")
+
+    if request.method == 'HEAD':
+        return _tus_response(200, session)
+    if request.method == 'DELETE':
+        abort(session)
+        return _tus_response(204)
+
+    if request.content_type != 'application/offset+octet-stream':
+        return _tus_response(415, session, 'Content-Type deve ser application/offset+octet-stream.')
+    try:
+        append_chunk(session, request.headers.get('Upload-Offset'), request)
+    except UploadError as exc:
+        return _tus_response(exc.status, session if exc.status != 415 else None, str(exc))
+    return _tus_response(204, session)
@@ -0,0 +1,261 @@
+"""Approval workflow of StatusControl as a declarative transition table.
+
+:data:`DEPARTMENTS` says who may act (group) and what must hold for the
+company before any of its actions; :data:`RULES` lists, for each
+department and action, the alternatives ``when`` (current StatusControl
+columns, ``pending_owner`` included) -> ``set`` (new column values), with
+the client notification and the feedback message. The table is checked and
+indexed once at import (:data:`TRANSITIONS`).
+
+:func:`apply_transition` picks the first rule whose ``when`` matches the
+row it read and writes it with one conditional ``UPDATE ... WHERE
+pending_owner = <read> AND <when>``. If another decision changed the row in
+between (e.g. Compliance and Financeiro approving at the same time) the
+UPDATE matches nothing, so the row is read again and the rule chosen anew.
+The minimum-requirements signal (customers/signals.py) writes with the same
+conditional UPDATE, so neither path overwrites the other. The
+StatusTransition event goes in the same transaction and notifications are
+sent after commit.
+"""
+
+from functools import partial
+from typing import NamedTuple, Optional
+
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import StatusControl, StatusTransition
+from .notifications import notify_user
+from .permissions import has_group
+from .transitions import record_transition
+
+Department = StatusTransition.Department
+Decision = StatusTransition.Decision
+
+# Tentativas quando outra decisão altera o StatusControl entre a leitura e o UPDATE
+MAX_ATTEMPTS = 3
+
+
+class DepartmentRules(NamedTuple):
+    role: str
+    denied: str
+    # Mensagem quando nenhuma regra se aplica ao estado atual
+    blocked: str
+    # Company.min_requirements_met() exigido antes de qualquer ação (mensagem se não atendido)
+    min_requirements: Optional[str] = None
+
+
+class Rule(NamedTuple):
+    department: str
+    action: str
+    decision: str
+    set: dict
+    message: tuple
+    when: dict = {}
+    notify: str = ''
+    # Campo do POST obrigatório e a mensagem quando ausente
+    required: tuple = ()
+
+
+class Result(NamedTuple):
+    level: str
+    message: str
+
+
+DEPARTMENTS = {
+    Department.COMPLIANCE: DepartmentRules(
+        role='Compliance',
+        denied="Você não tem permissão para validar Compliance.",
+        blocked=_("Ação inválida."),
+        min_requirements=_("Requisitos mínimos não atendidos. Peça ao cliente para completar os dados."),
+    ),
+    Department.FINANCE: DepartmentRules(
+        role='Financeiro',
+        denied="Você não tem permissão para aprovar Financeiro.",
+        blocked=_("Ação inválida."),
+        min_requirements=_("Requisitos mínimos não atendidos."),
+    ),
+    Department.TRADING: DepartmentRules(
+        role='Trading',
+        denied="Você não tem permissão para habilitar Trading.",
+        blocked=_("Aguardando aprovação de Compliance."),
+    ),
+    Department.FINAL_ANALYSIS: DepartmentRules(
+        role='Trading',
+        denied="Você não tem permissão para análise final.",
+        blocked=_("Pré-requisitos não atendidos para análise final."),
+        min_requirements=_("Pré-requisitos não atendidos para análise final."),
+    ),
+    Department.SUPRIMENTOS: DepartmentRules(
+        role='Suprimentos',
+        denied="Você não tem permissão para registrar no SAP.",
+        blocked=_("Ação inválida."),
+    ),
+}
+
+
+def _trading_reject_details(params):
+    reason = params.get('reason', '')
+    return 'Cliente não cadastrado (Trading).' + (f' Motivo: {reason}' if reason else '')
+
+
+RULES = [
+    # --- Compliance (em paralelo com o Financeiro) ---
+    Rule(
+        Department.COMPLIANCE, 'approve', Decision.APPROVE,
+        when={'treasury_qualified': True},
+        set={'compliance_qualified': True, 'is_pending': True, 'pending_owner': 'TRADING',
+             'pending_details': 'Compliance e Financeiro aprovados. Aguardando análise final (Trading).'},
+        notify="Compliance validado para {company}", message=('success', _("Compliance aprovado.")),
+    ),
+    Rule(
+        Department.COMPLIANCE, 'approve', Decision.APPROVE,
+        when={'treasury_qualified': False},
+        set={'compliance_qualified': True, 'is_pending': True, 'pending_owner': 'FINANCE',
+             'pending_details': 'Compliance aprovado. Aguardando decisão do Financeiro.'},
+        notify="Compliance validado para {company}", message=('success', _("Compliance aprovado.")),
+    ),
+    Rule(
+        Department.COMPLIANCE, 'reject', Decision.REJECT,
+        set={'compliance_qualified': False, 'is_pending': False, 'pending_owner': 'NONE',
+             'pending_details': 'Cliente não cadastrado (Compliance).'},
+        notify="Compliance não aprovado para {company}", message=('warning', _("Compliance não aprovado.")),
+    ),
+    # --- Financeiro ---
+    Rule(
+        Department.FINANCE, 'approve', Decision.APPROVE,
+        when={'compliance_qualified': True},
+        set={'treasury_qualified': True, 'is_pending': True, 'pending_owner': 'TRADING',
+             'pending_details': 'Compliance e Financeiro aprovados. Aguardando análise final (Trading).'},
+        notify="Financeiro aprovado para {company}", message=('success', _("Financeiro aprovado.")),
+    ),
+    Rule(
+        Department.FINANCE, 'approve', Decision.APPROVE,
+        when={'compliance_qualified': False},
+        set={'treasury_qualified': True, 'is_pending': True, 'pending_owner': 'COMPLIANCE',
+             'pending_details': 'Financeiro aprovado. Aguardando decisão do Compliance.'},
+        notify="Financeiro aprovado para {company}", message=('success', _("Financeiro aprovado.")),
+    ),
+    Rule(
+        Department.FINANCE, 'reject', Decision.REJECT,
+        required=('risk', _("Informe o risco para reprovação do Financeiro.")),
+        set={'treasury_qualified': False, 'is_pending': True, 'pending_owner': 'FINANCE',
+             'treasury_risk': lambda p: p['risk'], 'pending_details': lambda p: f"Financeiro reprovado. Risco: {p['risk']}"},
+        notify="Financeiro reprovado para {company}", message=('warning', _("Financeiro não aprovado.")),
+    ),
+    # --- Trading (exige Compliance; o Financeiro pode estar reprovado) ---
+    Rule(
+        Department.TRADING, 'approve', Decision.APPROVE,
+        when={'compliance_qualified': True},
+        set={'trading_qualified': True, 'is_pending': True, 'pending_owner': 'TRADING', 'client_onboarding_finished': False,
+             'pending_details': 'Trading habilitado. Aguardando análise final.'},
+        notify="Trading habilitado para {company}", message=('success', _("Trading habilitado.")),
+    ),
+    Rule(
+        Department.TRADING, 'reject', Decision.REJECT,
+        when={'compliance_qualified': True},
+        set={'trading_qualified': False, 'is_pending': False, 'pending_owner': 'NONE',
+             'trading_reject_reason': lambda p: p.get('reason') or None, 'pending_details': _trading_reject_details},
+        notify="Trading não habilitado para {company}", message=('warning', _("Trading não habilitado.")),
+    ),
+    # --- Análise final (Trading) ---
+    Rule(
+        Department.FINAL_ANALYSIS, 'approve', Decision.APPROVE,
+        when={'compliance_qualified': True},
+        set={'is_pending': True, 'pending_owner': 'SUPRIMENTOS', 'pending_details': 'Análise final aprovada. Registrar no SAP.'},
+        message=('success', _("Análise final aprovada. Encaminhado para Suprimentos.")),
+    ),
+    Rule(
+        Department.FINAL_ANALYSIS, 'reject', Decision.REJECT,
+        when={'compliance_qualified': True},
+        set={'is_pending': False, 'pending_owner': 'NONE', 'pending_details': 'Cliente não cadastrado (Análise Final).'},
+        message=('warning', _("Análise final reprovada. Cliente não cadastrado.")),
+    ),
+    # --- Suprimentos ---
+    Rule(
+        Department.SUPRIMENTOS, 'register', Decision.REGISTER,
+        set={'client_onboarding_finished': True, 'is_pending': False, 'pending_owner': 'NONE', 'pending_details': 'Cadastrado no SAP.'},
+        message=('success', _("Cadastro no SAP confirmado.")),
+    ),
+]
+
+
+def _compile(rules):
+    """Validate the table against StatusControl and index it by (department, action)."""
+    fields = {f.name for f in StatusControl._meta.concrete_fields}
+    owners = {value for value, _label in StatusControl.PENDING_OWNER_CHOICES}
+    table = {}
+    for rule in rules:
+        if rule.department not in DEPARTMENTS or rule.decision not in Decision.values:
+            raise ImproperlyConfigured(f"Regra de workflow inválida: {rule.department}/{rule.action}")
+        unknown = (set(rule.when) | set(rule.set)) - fields
+        if unknown:
+            raise ImproperlyConfigured(f"Campos desconhecidos em {rule.department}/{rule.action}: {sorted(unknown)}")
+        for values in (rule.when, rule.set):
+            if 'pending_owner' in values and values['pending_owner'] not in owners:
+                raise ImproperlyConfigured(f"pending_owner inválido em {rule.department}/{rule.action}: {values['pending_owner']}")
+        table.setdefault((rule.department, rule.action), []).append(rule)
+    return {key: tuple(value) for key, value in table.items()}
+
+
+TRANSITIONS = _compile(RULES)
+
+
+def authorize(department, user):
+    rules = DEPARTMENTS[department]
+    if not has_group(user, rules.role):
+        raise PermissionDenied(rules.denied)
+
+
+def _matches(rule, status_control):
+    return all(getattr(status_control, field) == value for field, value in rule.when.items())
+
+
+def _notify(company, text):
+    notify_user(
+        company.created_by, text.format(company=company.full_company_name),
+        url=reverse('customers:company_detail', kwargs={'pk': company.pk}),
+    )
+
+
+def apply_transition(company, department, action, user, params=None):
+    """Run ``action`` of ``department`` on the company's StatusControl; return the feedback ``Result``."""
+    authorize(department, user)
+    department_rules = DEPARTMENTS[department]
+    if department_rules.min_requirements and not company.min_requirements_met():
+        return Result('error', department_rules.min_requirements)
+    candidates = TRANSITIONS.get((department, action))
+    if not candidates:
+        return Result('error', _("Ação inválida."))
+    params = {key: (params.get(key) or '').strip() for key in ('risk', 'reason')} if params is not None else {}
+
+    StatusControl.objects.get_or_create(company=company)
+    for _attempt in range(MAX_ATTEMPTS):
+        status_control = StatusControl.objects.get(company=company)
+        rule = next((r for r in candidates if _matches(r, status_control)), None)
+        if rule is None:
+            return Result('error', department_rules.blocked)
+        if rule.required and not params.get(rule.required[0]):
+            return Result('error', rule.required[1])
+
+        now = timezone.now()
+        values = {field: value(params) if callable(value) else value for field, value in rule.set.items()}
+        values.update(last_updated_by=user, updated_at=now)
+        previous_owner = status_control.pending_owner
+        with transaction.atomic():
+            updated = StatusControl.objects.filter(
+                pk=status_control.pk, pending_owner=previous_owner, **rule.when,
+            ).update(**values)
+            if not updated:
+                # Outra decisão venceu a corrida: relê o estado e escolhe a regra de novo
+                continue
+            for field, value in values.items():
+                setattr(status_control, field, value)
+            record_transition(status_control, department, rule.decision, previous_owner, user, now=now)
+            if rule.notify:
+                transaction.on_commit(partial(_notify, company, rule.notify))
+        return Result(*rule.message)
+    return Result('error', _("O status foi alterado por outra pessoa. Tente novamente."))
@@ -0,0 +1,185 @@
+// Upload retomável em blocos (protocolo tus, customers/uploads.py)
+// Uso: <form data-chunked-upload="kyc_document|rdd_message" data-upload-url="{% url 'customers:upload_create' %}">
+//   kyc_document: o arquivo e os campos do formulário sobem juntos como um upload; data-metadata (JSON,
+//                 ex.: {"company": 1}) completa os metadados e data-success-url é aberto ao final.
+//   rdd_message:  o formulário é enviado sem o anexo (Accept: application/json), a view responde
+//                 {"message": id, "url": ...} e o anexo sobe depois para essa mensagem.
+// Sem fetch, sem arquivo ou com extensão que a API não aceita, o formulário segue pelo envio normal.
+
+(function () {
+  var CHUNK_SIZE = 5 * 1024 * 1024;
+  var MAX_RETRIES = 5;
+  var TUS_VERSION = '1.0.0';
+  var EXTENSIONS = ['.pdf', '.png', '.jpg', '.jpeg'];
+
+  function csrfToken(form) {
+    var input = form.querySelector('input[name="csrfmiddlewaretoken"]');
+    return input ? input.value : '';
+  }
+
+  function b64(text) {
+    return btoa(unescape(encodeURIComponent(String(text))));
+  }
+
+  function encodeMetadata(metadata) {
+    return Object.keys(metadata).map(function (key) {
+      return metadata[key] === '' ? key : key + ' ' + b64(metadata[key]);
+    }).join(',');
+  }
+
+  function supports(file) {
+    var name = (file.name || '').toLowerCase();
+    return EXTENSIONS.some(function (ext) { return name.endsWith(ext); });
+  }
+
+  function wait(ms) {
+    return new Promise(function (resolve) { setTimeout(resolve, ms); });
+  }
+
+  async function failure(response) {
+    var text = await response.text();
+    var error = new Error(text || ('Falha no envio (HTTP ' + response.status + ').'));
+    error.status = response.status;
+    return error;
+  }
+
+  function retryable(status) {
+    // 409: offset desatualizado; 423: outro envio em andamento; 5xx: falha do servidor
+    return status === 409 || status === 423 || status >= 500;
+  }
+
+  // Envia o arquivo em blocos e retorna o id do objeto criado (Upload-Object-Id)
+  async function upload(file, metadata, options) {
+    options = options || {};
+    var headers = {'Tus-Resumable': TUS_VERSION, 'X-CSRFToken': options.csrfToken || ''};
+    var created = await fetch(options.url, {
+      method: 'POST',
+      credentials: 'same-origin',
+      headers: Object.assign({}, headers, {
+        'Upload-Length': String(file.size),
+        'Upload-Metadata': encodeMetadata(Object.assign({filename: file.name}, metadata)),
+      }),
+    });
+    if (created.status !== 201) throw await failure(created);
+    var location = created.headers.get('Location');
+    var offset = 0;
+    var failures = 0;
+    while (true) {
+      var response;
+      try {
+        response = await fetch(location, {
+          method: 'PATCH',
+          credentials: 'same-origin',
+          headers: Object.assign({}, headers, {
+            'Upload-Offset': String(offset),
+            'Content-Type': 'application/offset+octet-stream',
+          }),
+          body: file.slice(offset, offset + CHUNK_SIZE),
+        });
+      } catch (networkError) {
+        response = null;
+      }
+      if (response && response.status === 204) {
+        failures = 0;
+        offset = parseInt(response.headers.get('Upload-Offset'), 10);
+        if (options.onProgress) options.onProgress(offset, file.size);
+        var objectId = response.headers.get('Upload-Object-Id');
+        if (objectId) return objectId;
+        continue;
+      }
+      if (response && !retryable(response.status)) throw await failure(response);
+      if (++failures > MAX_RETRIES) {
+        throw response ? await failure(response) : new Error('Falha de conexão no envio do arquivo.');
+      }
+      // Retoma do que o servidor já recebeu (os bytes de um bloco interrompido são mantidos)
+      await wait(1000 * failures);
+      try {
+        var head = await fetch(location, {method: 'HEAD', credentials: 'same-origin', headers: headers});
+        if (head.ok) {
+          offset = parseInt(head.headers.get('Upload-Offset'), 10);
+          if (head.headers.get('Upload-Object-Id')) return head.headers.get('Upload-Object-Id');
+        } else if (!retryable(head.status)) {
+          throw await failure(head);
+        }
+      } catch (error) {
+        if (error.status) throw error;
+      }
+    }
+  }
+
+  function formErrors(data) {
+    var errors = (data && data.errors) || {};
+    return Object.keys(errors).map(function (field) { return errors[field].join(' '); }).join(' ');
+  }
+
+  function setup(form) {
+    var target = form.dataset.chunkedUpload;
+    var input = form.querySelector('input[type="file"]');
+    var button = form.querySelector('[type="submit"]');
+    var status = form.querySelector('[data-upload-status]');
+    if (!input) return;
+
+    function show(text, isError) {
+      if (!status) return;
+      status.textContent = text;
+      status.className = 'small ' + (isError ? 'text-danger' : 'text-muted');
+    }
+
+    function progress(sent, total) {
+      show('Enviando arquivo... ' + Math.floor(sent * 100 / total) + '%');
+    }
+
+    async function run(file) {
+      var options = {url: form.dataset.uploadUrl, csrfToken: csrfToken(form), onProgress: progress};
+      var data = new FormData(form);
+      data.delete(input.name);
+      data.delete('csrfmiddlewaretoken');
+      if (target === 'kyc_document') {
+        var metadata = JSON.parse(form.dataset.metadata || '{}');
+        metadata.target = target;
+        data.forEach(function (value, key) { metadata[key] = value; });
+        // Checkbox desmarcado não entra no FormData
+        form.querySelectorAll('input[type="checkbox"]').forEach(function (box) {
+          metadata[box.name] = box.checked ? 'true' : 'false';
+        });
+        await upload(file, metadata, options);
+        window.location.href = form.dataset.successUrl;
+        return;
+      }
+      var posted = await fetch(form.action || window.location.href, {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: {'Accept': 'application/json', 'X-CSRFToken': options.csrfToken},
+        body: data,
+      });
+      var result = await posted.json().catch(function () { return null; });
+      if (!posted.ok) {
+        throw new Error(formErrors(result) || ('Falha no envio (HTTP ' + posted.status + ').'));
+      }
+      try {
+        await upload(file, {target: target, message: result.message}, options);
+      } catch (error) {
+        // A mensagem já foi gravada: só o anexo falhou
+        show('Mensagem enviada, mas o anexo não: ' + error.message, true);
+        setTimeout(function () { window.location.href = result.url; }, 4000);
+        return;
+      }
+      window.location.href = result.url;
+    }
+
+    form.addEventListener('submit', function (event) {
+      var file = input.files && input.files[0];
+      if (!file || !supports(file) || !window.fetch) return;
+      event.preventDefault();
+      if (button) button.disabled = true;
+      progress(0, file.size || 1);
+      run(file).catch(function (error) {
+        show(error.message, true);
+        if (button) button.disabled = false;
+      });
+    });
+  }
+
+  window.ChunkedUpload = {upload: upload, supports: supports};
+  document.querySelectorAll('form[data-chunked-upload]').forEach(setup);
+})();